@@ -1,35 +1,82 @@
 import time
 import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
 import requests
 
+from src.config import FX_API_URL, FX_HTTP_TIMEOUT
+from src.tools.deadline import Deadline, DeadlineExceeded, timeout_for
+from src.tools.fee_rules_tool import compute_fees
+
 logger = logging.getLogger(__name__)
 
 # Small in-memory cache to reduce API calls
 _RATE_CACHE = {}  # (from,to) -> (rate, expires_at)
 
+# Single-flight per currency pair: on a cache miss only one thread calls the
+# live API, concurrent requests for the same pair wait for its result.
+_FLIGHTS_LOCK = threading.Lock()
+_FLIGHTS: Dict[Tuple[str, str], "_Flight"] = {}
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _single_flight(
+    key: Tuple[str, str], fn: Callable[[], Tuple[float, str]], deadline: Optional[Deadline] = None
+) -> Tuple[float, str]:
+    with _FLIGHTS_LOCK:
+        flight = _FLIGHTS.get(key)
+        leader = flight is None
+        if leader:
+            flight = _FLIGHTS[key] = _Flight()
+
+    if not leader:
+        if not flight.done.wait(None if deadline is None else deadline.remaining()):
+            raise DeadlineExceeded("Request deadline exceeded waiting for a live FX rate")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = fn()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _FLIGHTS_LOCK:
+            del _FLIGHTS[key]
+        flight.done.set()
+
 
 class FXRateAgent:
     def __init__(self):
         self.cache_ttl_seconds = 300  # 5 min cache
 
     def _get_cached_rate(self, from_cur: str, to_cur: str):
-        key = (from_cur, to_cur)
-        if key in _RATE_CACHE:
-            rate, exp = _RATE_CACHE[key]
-            if time.time() < exp:
-                return rate
+        hit = _RATE_CACHE.get((from_cur, to_cur))  # single atomic read, no check-then-get
+        if hit is not None and time.time() < hit[1]:
+            return hit[0]
         return None
 
     def _set_cached_rate(self, from_cur: str, to_cur: str, rate: float):
         key = (from_cur, to_cur)
         _RATE_CACHE[key] = (rate, time.time() + self.cache_ttl_seconds)
 
-    def _fetch_live_rate(self, from_cur: str, to_cur: str) -> float:
+    def _fetch_live_rate(self, from_cur: str, to_cur: str, timeout: float = FX_HTTP_TIMEOUT) -> float:
         # exchangerate.host (no key) – can sometimes fail depending on network / service
-        url = "https://api.exchangerate.host/convert"
+        url = FX_API_URL
         params = {"from": from_cur, "to": to_cur, "amount": 1}
 
-        r = requests.get(url, params=params, timeout=15)
+        r = requests.get(url, params=params, timeout=timeout)
         r.raise_for_status()
         data = r.json()
 
@@ -48,7 +95,41 @@ class FXRateAgent:
             return 83.0
         return 1.0
 
-    def handle(self, amount_local: float, local_currency: str, home_currency: str):
+    def _resolve_rate(self, from_cur: str, to_cur: str, deadline: Optional[Deadline] = None) -> Tuple[float, str]:
+        # Another flight may have filled the cache while we queued up
+        cached = self._get_cached_rate(from_cur, to_cur)
+        if cached is not None:
+            return cached, "cache"
+
+        # 2) Try live with retry, within what is left of the request's budget
+        last_err = None
+        for attempt in range(2):  # 2 attempts
+            try:
+                timeout = timeout_for(deadline, FX_HTTP_TIMEOUT, "live FX call")
+            except DeadlineExceeded as e:
+                last_err = e
+                break
+            try:
+                rate = self._fetch_live_rate(from_cur, to_cur, timeout=timeout)
+                self._set_cached_rate(from_cur, to_cur, rate)
+                return rate, "exchangerate.host-live"
+            except Exception as e:
+                last_err = e
+                if attempt == 0 and (deadline is None or deadline.remaining() > 0.7):
+                    time.sleep(0.7)
+
+        # 3) Fallback to mock ONLY if live fails
+        rate = self._mock_rate(from_cur, to_cur)
+        logger.warning("Live FX failed, using mock rate for %s -> %s: %s (%s)", from_cur, to_cur, rate, last_err)
+        return rate, "mock-fx"
+
+    def handle(
+        self,
+        amount_local: float,
+        local_currency: str,
+        home_currency: str,
+        deadline: Optional[Deadline] = None,
+    ):
         from_cur = (local_currency or "").upper()
         to_cur = (home_currency or "").upper()
 
@@ -58,29 +139,20 @@ class FXRateAgent:
             rate = cached
             provider = "cache"
         else:
-            # 2) Try live with retry
-            provider = "exchangerate.host-live"
-            rate = None
-            last_err = None
-            for attempt in range(2):  # 2 attempts
-                try:
-                    rate = self._fetch_live_rate(from_cur, to_cur)
-                    self._set_cached_rate(from_cur, to_cur, rate)
-                    break
-                except Exception as e:
-                    last_err = e
-                    time.sleep(0.7)
-
-            # 3) Fallback to mock ONLY if live fails
-            if rate is None:
-                provider = "mock-fx"
-                rate = self._mock_rate(from_cur, to_cur)
-                logger.warning("Live FX failed, using mock rate for %s -> %s: %s (%s)", from_cur, to_cur, rate, last_err)
+            try:
+                rate, provider = _single_flight(
+                    (from_cur, to_cur), lambda: self._resolve_rate(from_cur, to_cur, deadline), deadline
+                )
+            except DeadlineExceeded as e:
+                # out of time behind another request's live call: same fallback as a failed call
+                rate, provider = self._mock_rate(from_cur, to_cur), "mock-fx"
+                logger.warning("Using mock rate for %s -> %s: %s", from_cur, to_cur, e)
 
         # Apply a simple markup + fixed network fee like before
         base_home = float(amount_local) * float(rate)
-        markup_home = 0.03 * base_home
-        network_fee_home = 11.0
+        fees = compute_fees(base_home)
+        markup_home = fees["markup_home"]
+        network_fee_home = fees["network_fee_home"]
         total_home = base_home + markup_home + network_fee_home
 
         notes = "Live FX rate from exchangerate.host with standard markup." if provider != "mock-fx" else "Mock FX fallback (live failed)."
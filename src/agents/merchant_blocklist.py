@@ -0,0 +1,306 @@
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional, Set
+
+from src.config import MERCHANT_BLOCKLIST_PATH
+
+logger = logging.getLogger(__name__)
+
+_blake2b = hashlib.blake2b
+
+# Index file: fixed header + sorted fixed-width records (NUL padded UTF-8).
+#   magic(8) | record_width u32 | count u64 | reserved(12)
+_INDEX_MAGIC = b"QRBLIDX1"
+_BLOOM_MAGIC = b"QRBLBLM1"
+_HEADER = struct.Struct("<8sIQ12x")  # 32 bytes
+_BLOOM_HEADER = struct.Struct("<8sQIQ4x")  # magic | m bits | k | n -> 32 bytes
+
+
+def _clean_ids(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        mid = line.strip()
+        if mid and not mid.startswith("#"):
+            yield mid
+
+
+def build_blocklist_index(src_path: str, out_path: str) -> int:
+    """
+    Build a sorted fixed-width index from a text file (one merchant ID per
+    line, '#' comments allowed). Returns the number of unique IDs.
+    """
+    with open(src_path, "r", encoding="utf-8") as f:
+        ids = sorted({mid.encode("utf-8") for mid in _clean_ids(f)})
+
+    width = max((len(b) for b in ids), default=1)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as out:
+        out.write(_HEADER.pack(_INDEX_MAGIC, width, len(ids)))
+        for b in ids:
+            out.write(b.ljust(width, b"\0"))
+    os.replace(tmp_path, out_path)
+    return len(ids)
+
+
+class BloomFilter:
+    """
+    Plain bit-array Bloom filter with double hashing over one blake2b digest.
+    """
+
+    __slots__ = ("m", "k", "n", "bits")
+
+    def __init__(self, m: int, k: int, bits: Optional[bytearray] = None, n: int = 0):
+        self.m = max(8, m)
+        self.k = max(1, k)
+        self.n = n
+        self.bits = bits if bits is not None else bytearray((self.m + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, n: int, fp_rate: float = 0.01) -> "BloomFilter":
+        n = max(1, n)
+        m = int(math.ceil(-n * math.log(fp_rate) / (math.log(2) ** 2)))
+        k = max(1, int(round(m / n * math.log(2))))
+        return cls(m, k)
+
+    def _positions(self, key: bytes):
+        d = _blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:], "little") | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def add(self, key: bytes) -> None:
+        bits = self.bits
+        for p in self._positions(key):
+            bits[p >> 3] |= 1 << (p & 7)
+        self.n += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        # Inlined _positions with early exit: most clean keys miss on the
+        # first probe or two.
+        d = _blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:], "little") | 1
+        bits, m = self.bits, self.m
+        for i in range(self.k):
+            p = (h1 + i * h2) % m
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    def expected_fp_rate(self) -> float:
+        if not self.n:
+            return 0.0
+        return (1 - math.exp(-self.k * self.n / self.m)) ** self.k
+
+    def save(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_BLOOM_HEADER.pack(_BLOOM_MAGIC, self.m, self.k, self.n))
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BloomFilter":
+        with open(path, "rb") as f:
+            magic, m, k, n = _BLOOM_HEADER.unpack(f.read(_BLOOM_HEADER.size))
+            if magic != _BLOOM_MAGIC:
+                raise ValueError(f"Not a bloom file: {path}")
+            bits = bytearray((m + 7) // 8)
+            if f.readinto(bits) != len(bits):
+                raise ValueError(f"Truncated bloom file: {path}")
+        return cls(m, k, bits=bits, n=n)
+
+
+class MerchantBlocklist:
+    """
+    Bad-merchant list for millions of IDs.
+
+    - The full list is a memory-mapped sorted index (binary search, pages
+      pulled in by the OS only when touched).
+    - A Bloom filter sits in front of it, so a clean merchant is almost
+      always rejected with k bit probes and no index access.
+    - Deltas (+ID / -ID lines) are applied in memory on top of the index;
+      rebuild the index offline to fold them in.
+    """
+
+    def __init__(self, index_path: str, fp_rate: float = 0.01):
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._added: Set[bytes] = set()
+        self._removed: Set[bytes] = set()
+
+        self._file = open(index_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < _HEADER.size:
+            raise ValueError(f"Blocklist index too small: {index_path}")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.width, self.count = _HEADER.unpack_from(self._mm, 0)
+        if magic != _INDEX_MAGIC or size < _HEADER.size + self.width * self.count:
+            raise ValueError(f"Invalid blocklist index: {index_path}")
+
+        self.bloom = self._load_or_build_bloom(fp_rate)
+
+        # counters for stats()
+        self.lookups = 0
+        self.bloom_rejects = 0
+        self.bloom_false_positives = 0
+        self.hits = 0
+
+    @classmethod
+    def from_path(cls, path: str, fp_rate: float = 0.01) -> "MerchantBlocklist":
+        """
+        Open an index file, or a text list (building '<path>.idx' next to it
+        when missing or older than the text file).
+        """
+        with open(path, "rb") as f:
+            is_index = f.read(len(_INDEX_MAGIC)) == _INDEX_MAGIC
+        if is_index:
+            return cls(path, fp_rate=fp_rate)
+
+        index_path = path + ".idx"
+        if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(path):
+            n = build_blocklist_index(path, index_path)
+            logger.info("Built blocklist index %s (%d merchants)", index_path, n)
+        return cls(index_path, fp_rate=fp_rate)
+
+    def _load_or_build_bloom(self, fp_rate: float) -> BloomFilter:
+        bloom_path = self.index_path + ".bloom"
+        try:
+            if os.path.getmtime(bloom_path) >= os.path.getmtime(self.index_path):
+                bloom = BloomFilter.load(bloom_path)
+                if bloom.n == self.count:
+                    return bloom
+        except (OSError, ValueError):
+            pass
+
+        bloom = BloomFilter.for_capacity(self.count, fp_rate)
+        for i in range(self.count):
+            bloom.add(self._record(i))
+        try:
+            bloom.save(bloom_path)
+        except OSError as e:
+            logger.warning("Could not cache blocklist bloom filter: %s", e)
+        return bloom
+
+    def _record(self, i: int) -> bytes:
+        off = _HEADER.size + i * self.width
+        return self._mm[off:off + self.width].rstrip(b"\0")
+
+    def _in_index(self, key: bytes) -> bool:
+        if len(key) > self.width:
+            return False
+        padded = key.ljust(self.width, b"\0")
+        mm, width, base = self._mm, self.width, _HEADER.size
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            off = base + mid * width
+            rec = mm[off:off + width]
+            if rec < padded:
+                lo = mid + 1
+            elif rec > padded:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def contains(self, merchant_id: str) -> bool:
+        key = merchant_id.encode("utf-8")
+        self.lookups += 1
+
+        if key not in self.bloom:
+            self.bloom_rejects += 1
+            return False
+
+        if key in self._removed:
+            found = False
+        elif key in self._added:
+            found = True
+        else:
+            found = self._in_index(key)
+
+        if found:
+            self.hits += 1
+        else:
+            self.bloom_false_positives += 1
+        return found
+
+    __contains__ = contains
+
+    # ---------- Deltas ----------
+    def add(self, merchant_id: str) -> None:
+        key = merchant_id.encode("utf-8")
+        with self._lock:
+            self._removed.discard(key)
+            if key not in self._added:
+                self._added.add(key)
+                self.bloom.add(key)
+
+    def remove(self, merchant_id: str) -> None:
+        key = merchant_id.encode("utf-8")
+        with self._lock:
+            self._added.discard(key)
+            self._removed.add(key)
+
+    def apply_delta(self, lines: Iterable[str]) -> Dict[str, int]:
+        """
+        Apply '+ID' (or bare 'ID') additions and '-ID' removals.
+        """
+        added = removed = 0
+        for line in _clean_ids(lines):
+            if line.startswith("-"):
+                self.remove(line[1:].strip())
+                removed += 1
+            else:
+                self.add(line[1:].strip() if line.startswith("+") else line)
+                added += 1
+        return {"added": added, "removed": removed}
+
+    def apply_delta_file(self, path: str) -> Dict[str, int]:
+        with open(path, "r", encoding="utf-8") as f:
+            return self.apply_delta(f)
+
+    # ---------- Introspection ----------
+    def stats(self) -> Dict[str, Any]:
+        negatives = self.bloom_rejects + self.bloom_false_positives
+        delta_bytes = sum(len(k) for k in self._added) + sum(len(k) for k in self._removed)
+        return {
+            "entries": self.count,
+            "delta_added": len(self._added),
+            "delta_removed": len(self._removed),
+            "bloom_bits": self.bloom.m,
+            "bloom_hashes": self.bloom.k,
+            "bloom_bytes": len(self.bloom.bits),
+            "index_mapped_bytes": len(self._mm),
+            "delta_bytes_approx": delta_bytes,
+            "expected_fp_rate": round(self.bloom.expected_fp_rate(), 6),
+            "observed_fp_rate": round(self.bloom_false_positives / negatives, 6) if negatives else 0.0,
+            "lookups": self.lookups,
+            "hits": self.hits,
+        }
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+
+_default_blocklist: Optional[MerchantBlocklist] = None
+_default_loaded = False
+
+
+def default_blocklist() -> Optional[MerchantBlocklist]:
+    """Shared blocklist from MERCHANT_BLOCKLIST_PATH, or None when unset."""
+    global _default_blocklist, _default_loaded
+    if not _default_loaded:
+        _default_loaded = True
+        if MERCHANT_BLOCKLIST_PATH:
+            try:
+                _default_blocklist = MerchantBlocklist.from_path(MERCHANT_BLOCKLIST_PATH)
+            except (OSError, ValueError) as e:
+                logger.error("Could not load merchant blocklist %s: %s", MERCHANT_BLOCKLIST_PATH, e)
+    return _default_blocklist
@@ -1,8 +1,16 @@
-from src.tools.decode_qr_image_tool import decode_qr_image
+from typing import Optional
+
+from src.tools.deadline import Deadline
+from src.tools.decode_qr_image_tool import decode_qr_image, decode_qr_image_bytes
 
 class QRImageAgent:
-    def handle(self, image_path: str) -> str:
-        payload = decode_qr_image(image_path)
+    def handle(self, image_path: str, deadline: Optional[Deadline] = None) -> str:
+        return self._normalize(decode_qr_image(image_path, deadline))
+
+    def handle_bytes(self, data: bytes, deadline: Optional[Deadline] = None) -> str:
+        return self._normalize(decode_qr_image_bytes(data, deadline))
+
+    def _normalize(self, payload) -> str:
         if not isinstance(payload, str):
             payload = str(payload)
 
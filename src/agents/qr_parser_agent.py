@@ -1,6 +1,23 @@
+import itertools
 import re
 import uuid
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
+
+from src.tools.emvco_tlv_tool import emvco_payload_end, is_emvco_payload, parse_emvco
+
+# Compiled once; the multi-QR path runs these per item.
+_PART_RE = re.compile(r"[^,\n]+")
+_EMVCO_PREFIX = "000201"
+_AMOUNT_RE = re.compile(r"[-+]?\d+(\.\d+)?")
+
+# qr_id: random per-process prefix + sequential counter. Same 32-hex shape
+# as uuid4().hex, unique across restarts, but no urandom call per item.
+_QR_ID_PREFIX = uuid.uuid4().hex[:16]
+_QR_ID_COUNTER = itertools.count(1)
+
+
+def _next_qr_id() -> str:
+    return f"{_QR_ID_PREFIX}{next(_QR_ID_COUNTER):016x}"
 
 
 class QRParserAgent:
@@ -8,6 +25,7 @@ class QRParserAgent:
     Parses one or multiple QR payloads.
 
     Supported formats:
+    - EMVCo merchant-presented TLV (UPI/BharatQR, PromptPay, PayNow, SGQR, ...)
     - QR:JP:JPY:1500
     - QR:JP:JPY:1500,QR:US:USD:12
     - newline separated
@@ -15,35 +33,83 @@ class QRParserAgent:
     """
 
     def handle(self, payload: str) -> Dict[str, Any]:
-        payload = (payload or "").strip()
-
-        # Optional hardening: if payload looks like a python list repr
-        # e.g. "['QR:JP:JPY:1500']" or '["QR:JP:JPY:1500","QR:US:USD:12"]'
-        if payload.startswith("[") and payload.endswith("]"):
-            payload = payload[1:-1].strip()
-            payload = payload.replace('"', "").replace("'", "")
-
-        # Split into parts by commas/newlines
-        parts = re.split(r"[,\n]+", payload)
-        parts = [p.strip() for p in parts if p.strip()]
-
-        items: List[Dict[str, Any]] = []
-        for p in parts:
-            items.append(self._parse_single(p))
+        items: List[Dict[str, Any]] = list(self.iter_items(payload))
 
         # Single
         if len(items) == 1:
+            if "error" in items[0]:
+                raise ValueError(items[0]["error"])
             return items[0]
 
         # Multiple
         return {"multiple": True, "count": len(items), "items": items}
 
+    def iter_items(self, payload: str) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield one parsed item per QR in the payload, in order.
+
+        Walks the input once with a compiled pattern and never builds the
+        full list of parts, so memory stays flat for very large pastes.
+        An item that fails to parse is yielded as
+        {"error": ..., "raw_fields": {"raw": ...}, "qr_id": ...}
+        and parsing carries on with the next one.
+        """
+        payload = payload or ""
+        start, end = 0, len(payload)
+        while start < end and payload[start].isspace():
+            start += 1
+        while end > start and payload[end - 1].isspace():
+            end -= 1
+
+        # Optional hardening: if payload looks like a python list repr
+        # e.g. "['QR:JP:JPY:1500']" or '["QR:JP:JPY:1500","QR:US:USD:12"]'
+        list_repr = end - start >= 2 and payload[start] == "[" and payload[end - 1] == "]"
+        if list_repr:
+            start, end = start + 1, end - 1
+
+        # Split into parts by commas/newlines. An EMVCo payload is taken
+        # whole by walking its TLV lengths, since its values (e.g. merchant
+        # name) may contain commas.
+        pos = start
+        while pos < end:
+            m = _PART_RE.search(payload, pos, end)
+            if m is None:
+                break
+            pos = m.end()
+            part_start = m.start()
+            while part_start < pos and (payload[part_start].isspace() or (list_repr and payload[part_start] in "'\"")):
+                part_start += 1
+            if payload.startswith(_EMVCO_PREFIX, part_start, end):
+                emvco_end = emvco_payload_end(payload, part_start, end)
+                if emvco_end > 0:
+                    pos = emvco_end
+                    yield self._parse_item(payload[part_start:emvco_end])
+                    continue
+
+            part = m.group(0).strip()
+            if list_repr:
+                part = part.strip("'\" ")
+            if not part:
+                continue
+            yield self._parse_item(part)
+
+    def _parse_item(self, part: str) -> Dict[str, Any]:
+        try:
+            return self._parse_single(part)
+        except ValueError as e:
+            return {"error": str(e), "raw_fields": {"raw": part}, "qr_id": _next_qr_id()}
+
     def _parse_single(self, payload: str) -> Dict[str, Any]:
         """
-        Parse single QR: QR:JP:JPY:1500
+        Parse single QR: EMVCo TLV or QR:JP:JPY:1500
         """
         payload = payload.strip()
 
+        if is_emvco_payload(payload):
+            item = parse_emvco(payload)
+            item["qr_id"] = _next_qr_id()
+            return item
+
         parts = payload.split(":")
         if len(parts) != 4 or parts[0].strip().upper() != "QR":
             raise ValueError(f"Invalid QR payload format: {payload}")
@@ -55,7 +121,7 @@ class QRParserAgent:
         # Hardening: sometimes amount comes like "1500']" or "1500 "
         # extract first float-looking number
         amount_raw = amount_raw.strip()
-        m = re.search(r"[-+]?\d+(\.\d+)?", amount_raw)
+        m = _AMOUNT_RE.search(amount_raw)
         if not m:
             raise ValueError(f"Invalid amount in QR payload: {payload}")
         amount = float(m.group(0))
@@ -66,5 +132,5 @@ class QRParserAgent:
             "currency": currency,
             "amount": amount,
             "raw_fields": {"raw": payload},
-            "qr_id": uuid.uuid4().hex,
+            "qr_id": _next_qr_id(),
         }
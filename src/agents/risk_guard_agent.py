@@ -2,12 +2,29 @@ from src.agents.risk_scorer import RiskScorer
 
 
 class RiskGuardAgent:
-    def __init__(self, memory=None):
-        self.scorer = RiskScorer(memory=memory)
+    def __init__(self, memory=None, blocklist=None):
+        self.scorer = RiskScorer(memory=memory, blocklist=blocklist)
 
-    def handle(self, merchant_id: str, country: str, amount: float):
+    def handle(self, merchant_id: str, country: str, amount: float, user_id: str = "", velocity=None):
         return self.scorer.evaluate(
             merchant_id=merchant_id,
             country=country,
             amount=amount,
+            user_id=user_id,
+            velocity=velocity,
         )
+
+    def handle_many(self, items, user_id: str = "", velocities=None):
+        """
+        Score parsed QR items (multi-QR) in one batch; same results as
+        handle() per item followed by add_recent_merchant().
+        """
+        batch = self.scorer.evaluate_many(
+            [it["amount"] for it in items],
+            [it["country"] for it in items],
+            [it["merchant_id"] for it in items],
+            user_id=user_id,
+            velocity=velocities,
+            repeats_seen=True,
+        )
+        return batch.to_dicts(explain="all")
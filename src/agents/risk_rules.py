@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_right
+from typing import Any, Dict, Optional, Tuple
+
+from src.config import RISK_RULES_PATH
+
+logger = logging.getLogger(__name__)
+
+
+# Built-in rules (same behaviour as the original hardcoded scorer). A rule
+# file only needs the sections it wants to override.
+DEFAULT_RULES: Dict[str, Any] = {
+    "amount": [
+        {"min": 0, "score": 5},
+        {"min": 1000, "score": 20, "reason": "Moderate amount (>= 1000)."},
+        {"min": 5000, "score": 40, "reason": "High amount (>= 5000)."},
+    ],
+    "country": {
+        "default_score": 5,
+        "scores": {"TH": 25, "EU": 25, "RU": 25, "BR": 25, "NG": 25},
+        "reason": "Unfamiliar/high-fraud country pattern: {country}.",
+    },
+    "merchant": {
+        "unseen_score": 20,
+        "unseen_reason": "Merchant not seen in your recent history.",
+        "seen_score": 5,
+        "seen_reason": "Merchant seen recently (familiar).",
+        "unavailable_score": 10,
+        "unavailable_reason": "Merchant history unavailable; using baseline merchant score.",
+    },
+    "blocklist": {
+        "score": 100,
+        "reason": "Merchant is on the bad-merchant list.",
+    },
+    "velocity": {
+        "scans_per_minute": [
+            {"min": 5, "score": 10, "reason": "Elevated scan velocity: {value} scans in the last minute."},
+            {"min": 10, "score": 25, "reason": "Very high scan velocity: {value} scans in the last minute."},
+        ],
+        # spend is windowed per currency, so thresholds are too; "*" would
+        # apply to any currency without its own rows
+        "spend_per_hour": {
+            "USD": [{"min": 1000, "score": 20, "reason": "High spend in the last hour: {value:.2f} {currency}."}],
+            "EUR": [{"min": 1000, "score": 20, "reason": "High spend in the last hour: {value:.2f} {currency}."}],
+            "SGD": [{"min": 1300, "score": 20, "reason": "High spend in the last hour: {value:.2f} {currency}."}],
+            "THB": [{"min": 35000, "score": 20, "reason": "High spend in the last hour: {value:.2f} {currency}."}],
+            "INR": [{"min": 80000, "score": 20, "reason": "High spend in the last hour: {value:.2f} {currency}."}],
+            "JPY": [{"min": 150000, "score": 20, "reason": "High spend in the last hour: {value:.2f} {currency}."}],
+        },
+        "distinct_merchants_per_day": [
+            {"min": 20, "score": 15, "reason": "Many distinct merchants today: {value}."},
+        ],
+    },
+    "levels": [
+        {"min": 0, "level": "low"},
+        {"min": 31, "level": "medium"},
+        {"min": 66, "level": "high"},
+    ],
+}
+
+
+class Tiers:
+    """
+    Sorted breakpoints -> (score, reason). index() is one bisect; values
+    below the first breakpoint get index -1 (no match).
+    """
+
+    __slots__ = ("breaks", "scores", "reasons")
+
+    def __init__(self, rows, clamp_low: bool):
+        rows = sorted(rows, key=lambda r: float(r["min"]))
+        self.breaks = tuple(float(r["min"]) for r in rows)
+        self.scores = tuple(float(r["score"]) for r in rows)
+        self.reasons = tuple(r.get("reason") for r in rows)
+        if clamp_low and self.breaks:
+            # anything below the first tier falls into it
+            self.breaks = (float("-inf"),) + self.breaks[1:]
+
+    def index(self, value: float) -> int:
+        return bisect_right(self.breaks, value) - 1
+
+
+class CompiledRules:
+    """
+    Immutable decision table built from a rule spec. Scoring reads it
+    without allocating beyond the reasons it appends.
+    """
+
+    __slots__ = (
+        "amount", "country_scores", "country_default", "merchant", "blocklist",
+        "velocity", "spend_per_hour", "level_breaks", "level_names", "version",
+    )
+
+    def __init__(self, spec: Dict[str, Any], version: str = "builtin"):
+        merged = dict(DEFAULT_RULES)
+        merged.update(spec or {})
+
+        self.amount = Tiers(merged["amount"], clamp_low=True)
+
+        country = merged["country"]
+        template = country.get("reason") or DEFAULT_RULES["country"]["reason"]
+        default_score = float(country.get("default_score", 0))
+        # country -> (score, precomputed reason or None)
+        self.country_scores: Dict[str, Tuple[float, Optional[str]]] = {}
+        for code, score in (country.get("scores") or {}).items():
+            code = str(code).upper()
+            score = float(score)
+            reason = template.format(country=code) if score > default_score else None
+            self.country_scores[code] = (score, reason)
+        self.country_default = default_score
+
+        merchant = dict(DEFAULT_RULES["merchant"])
+        merchant.update(merged["merchant"] or {})
+        for key in ("unseen_score", "seen_score", "unavailable_score"):
+            merchant[key] = float(merchant[key])
+        self.merchant = merchant
+
+        blocklist = dict(DEFAULT_RULES["blocklist"])
+        blocklist.update(merged["blocklist"] or {})
+        self.blocklist = (float(blocklist["score"]), blocklist["reason"])
+
+        velocity = dict(DEFAULT_RULES["velocity"])
+        velocity.update(merged["velocity"] or {})
+        spend = velocity.pop("spend_per_hour", None) or {}
+        if not isinstance(spend, dict):
+            spend = {"*": spend}  # older flat tier list: applies to every currency
+        # currency -> tiers; a currency with no rows (and no "*") is not scored
+        self.spend_per_hour: Dict[str, Tiers] = {
+            str(code).upper(): Tiers(rows, clamp_low=False) for code, rows in spend.items() if rows
+        }
+        self.velocity = tuple(
+            (feature, Tiers(rows, clamp_low=False)) for feature, rows in velocity.items() if rows
+        )
+
+        levels = sorted(merged["levels"], key=lambda r: float(r["min"]))
+        if not levels:
+            raise ValueError("Risk rules need at least one level")
+        self.level_breaks = (float("-inf"),) + tuple(float(r["min"]) for r in levels[1:])
+        self.level_names = tuple(str(r["level"]) for r in levels)
+
+        self.version = version
+
+    def level_for(self, score: float) -> str:
+        return self.level_names[bisect_right(self.level_breaks, score) - 1]
+
+
+def compile_rules(spec: Dict[str, Any], version: str = "builtin") -> CompiledRules:
+    try:
+        return CompiledRules(spec, version=version)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid risk rules: {e}") from e
+
+
+class RuleSet:
+    """
+    Holds the current CompiledRules for a rule file and hot-swaps it when
+    the file changes.
+
+    get() is the hot path: it returns the current table and at most every
+    check_interval seconds stats the file. A changed file is compiled off
+    to the side and swapped in with a single reference assignment, so
+    readers never see a half-built table. A bad file is logged and the
+    previous rules stay active.
+    """
+
+    def __init__(self, path: Optional[str] = None, check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._current = compile_rules({})
+        self.reload()
+
+    def get(self) -> CompiledRules:
+        if self.path and time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        return self._current
+
+    def _maybe_reload(self) -> None:
+        if not self._lock.acquire(blocking=False):
+            return  # someone else is already checking
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                return
+            if mtime != self._mtime:
+                self._load(mtime)
+        finally:
+            self._lock.release()
+
+    def reload(self) -> CompiledRules:
+        """Force a reload from disk (no-op without a file)."""
+        if self.path and os.path.exists(self.path):
+            with self._lock:
+                self._load(os.stat(self.path).st_mtime)
+        return self._current
+
+    def _load(self, mtime: float) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                spec = json.load(f)
+            compiled = compile_rules(spec, version=f"{os.path.basename(self.path)}@{mtime:.0f}")
+        except Exception as e:
+            logger.error("Risk rules reload failed for %s, keeping current rules: %s", self.path, e)
+            self._mtime = mtime  # don't retry the same broken file every check
+            return
+        self._current = compiled
+        self._mtime = mtime
+        logger.info("Loaded risk rules %s", compiled.version)
+
+
+_default_rule_set: Optional[RuleSet] = None
+
+
+def default_rule_set() -> RuleSet:
+    """Process-wide RuleSet for RISK_RULES_PATH."""
+    global _default_rule_set
+    if _default_rule_set is None:
+        _default_rule_set = RuleSet(RISK_RULES_PATH)
+    return _default_rule_set
@@ -1,79 +1,337 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Sequence, Union
+
+from src.agents.risk_rules import CompiledRules, RuleSet, default_rule_set
 
 
 class RiskScorer:
     """
     Explainable risk scoring.
-    Score ranges:
+    Score ranges (default rules, see src/agents/risk_rules.py):
     - 0 to 30: low
     - 31 to 65: medium
     - 66+: high
+
+    Thresholds come from a compiled rule table. Pass a RuleSet (hot-reloaded
+    from a file) or CompiledRules; by default the shared RISK_RULES_PATH set
+    is used. An optional MerchantBlocklist flags known bad merchants.
     """
 
-    def __init__(self, memory=None):
+    def __init__(self, memory=None, rules=None, blocklist=None):
         self.memory = memory
+        self.rules = rules if rules is not None else default_rule_set()
+        self.blocklist = blocklist
 
-    def score_amount(self, amount: float, reasons: List[str]) -> float:
-        score = 0.0
-        if amount >= 5000:
-            score += 40
-            reasons.append("High amount (>= 5000).")
-        elif amount >= 1000:
-            score += 20
-            reasons.append("Moderate amount (>= 1000).")
-        else:
-            score += 5
-        return score
+    def _rules(self) -> CompiledRules:
+        rules = self.rules
+        return rules.get() if isinstance(rules, RuleSet) else rules
 
-    def score_country(self, country: str, reasons: List[str]) -> float:
-        score = 0.0
-        unfamiliar = {"TH", "EU", "RU", "BR", "NG"}  # sample set (adjust later)
-        if country.upper() in unfamiliar:
-            score += 25
-            reasons.append(f"Unfamiliar/high-fraud country pattern: {country.upper()}.")
-        else:
-            score += 5
+    def score_amount(self, amount: float, reasons: List[str], rules: Optional[CompiledRules] = None) -> float:
+        tiers = (rules or self._rules()).amount
+        i = tiers.index(amount)
+        reason = tiers.reasons[i]
+        if reason:
+            reasons.append(reason)
+        return tiers.scores[i]
+
+    def score_country(self, country: str, reasons: List[str], rules: Optional[CompiledRules] = None) -> float:
+        rules = rules or self._rules()
+        hit = rules.country_scores.get(country.upper())
+        if hit is None:
+            return rules.country_default
+        score, reason = hit
+        if reason:
+            reasons.append(reason)
         return score
 
-    def score_merchant(self, merchant_id: str, reasons: List[str]) -> float:
+    def score_merchant(
+        self,
+        merchant_id: str,
+        reasons: List[str],
+        user_id: str = "",
+        rules: Optional[CompiledRules] = None,
+    ) -> float:
         """
-        If merchant never seen before in recent history -> add risk.
+        If merchant never seen before in this user's recent history -> add risk.
         """
-        score = 0.0
-        if self.memory is None or not hasattr(self.memory, "get_recent_merchants"):
+        m = (rules or self._rules()).merchant
+        if self.memory is None:
             # memory not wired, keep safe default
-            reasons.append("Merchant history unavailable; using baseline merchant score.")
-            return 10.0
+            reasons.append(m["unavailable_reason"])
+            return m["unavailable_score"]
 
-        history = self.memory.get_recent_merchants()
-        seen = any(h["merchant_id"] == merchant_id for h in history)
+        if hasattr(self.memory, "has_recent_merchant"):
+            seen = self.memory.has_recent_merchant(merchant_id, user_id)
+        elif hasattr(self.memory, "get_recent_merchants"):
+            history = self.memory.get_recent_merchants()
+            seen = any(h["merchant_id"] == merchant_id for h in history)
+        else:
+            reasons.append(m["unavailable_reason"])
+            return m["unavailable_score"]
 
         if not seen:
-            score += 20
-            reasons.append("Merchant not seen in your recent history.")
-        else:
-            score += 5
-            reasons.append("Merchant seen recently (familiar).")
+            reasons.append(m["unseen_reason"])
+            return m["unseen_score"]
+        reasons.append(m["seen_reason"])
+        return m["seen_score"]
 
+    def score_blocklist(self, merchant_id: str, reasons: List[str], rules: Optional[CompiledRules] = None) -> float:
+        if self.blocklist is None or not self.blocklist.contains(merchant_id):
+            return 0.0
+        score, reason = (rules or self._rules()).blocklist
+        reasons.append(reason)
         return score
 
-    def evaluate(self, merchant_id: str, country: str, amount: float) -> Dict[str, Any]:
-        reasons: List[str] = []
+    def score_velocity(
+        self,
+        velocity: Optional[Dict[str, Any]],
+        reasons: List[str],
+        rules: Optional[CompiledRules] = None,
+    ) -> float:
+        """
+        Velocity features from VelocityTracker (None -> not tracked, no effect).
+        """
+        if not velocity:
+            return 0.0
+
+        rules = rules or self._rules()
+        currency = velocity.get("currency", "")
         score = 0.0
+        for feature, tiers in rules.velocity:
+            score += _velocity_tier(tiers, velocity.get(feature, 0), currency, reasons)
+        # spend is windowed per currency, so only that currency's thresholds apply
+        spend = rules.spend_per_hour.get(currency.upper()) or rules.spend_per_hour.get("*")
+        if spend is not None:
+            score += _velocity_tier(spend, velocity.get("spend_per_hour", 0), currency, reasons)
+        return score
 
-        score += self.score_amount(amount, reasons)
-        score += self.score_country(country, reasons)
-        score += self.score_merchant(merchant_id, reasons)
+    def evaluate(
+        self,
+        merchant_id: str,
+        country: str,
+        amount: float,
+        user_id: str = "",
+        velocity: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        rules = self._rules()  # one table for the whole evaluation, even mid-swap
+        reasons: List[str] = []
+        score = 0.0
 
-        if score >= 66:
-            level = "high"
-        elif score >= 31:
-            level = "medium"
-        else:
-            level = "low"
+        score += self.score_amount(amount, reasons, rules)
+        score += self.score_country(country, reasons, rules)
+        score += self.score_merchant(merchant_id, reasons, user_id, rules)
+        score += self.score_blocklist(merchant_id, reasons, rules)
+        score += self.score_velocity(velocity, reasons, rules)
 
-        return {
+        result = {
             "risk_score": float(score),
-            "risk_level": level,
+            "risk_level": rules.level_for(score),
             "reasons": reasons,
         }
+        if velocity:
+            result["velocity"] = velocity
+        return result
+
+    # -------------------------
+    # Batch (vectorized) scoring
+    # -------------------------
+    def evaluate_many(
+        self,
+        amounts: Sequence[float],
+        countries: Sequence[str],
+        merchant_ids: Sequence[str],
+        user_id: str = "",
+        velocity: Optional[Union[Dict[str, Any], Sequence[Optional[Dict[str, Any]]]]] = None,
+        repeats_seen: bool = False,
+    ) -> "BatchRiskResult":
+        """
+        Score columnar inputs in one NumPy pass.
+
+        Scores and levels are identical to calling evaluate() per row against
+        the same memory/rules state. velocity is one dict for every row or a
+        sequence with one per row. With repeats_seen, a merchant's later rows
+        score as familiar, as if each row were scored and then recorded with
+        add_recent_merchant (the multi-QR path). Reason strings are not
+        built here; BatchRiskResult produces them on demand per row.
+        """
+        import numpy as np  # lazy: only batch paths need NumPy
+
+        rules = self._rules()
+        amounts = np.asarray(amounts, dtype=np.float64)
+        n = len(amounts)
+        if len(countries) != n or len(merchant_ids) != n:
+            raise ValueError("amounts, countries and merchant_ids must have the same length")
+
+        # amount tiers: bisect_right == searchsorted(side="right")
+        amount_idx = np.searchsorted(np.asarray(rules.amount.breaks), amounts, side="right") - 1
+        score = np.asarray(rules.amount.scores, dtype=np.float64)[amount_idx]
+
+        # countries: one dict lookup per distinct value
+        country_uniq, country_inv = _factorize(countries, np)
+        country_uniq = [c.upper() for c in country_uniq]
+        country_score = np.array(
+            [rules.country_scores.get(c, (rules.country_default,))[0] for c in country_uniq],
+            dtype=np.float64,
+        )
+        score += country_score[country_inv]
+
+        # merchants: familiarity + blocklist, once per distinct merchant
+        merchant_list, merchant_inv = _factorize(merchant_ids, np)
+        m = rules.merchant
+        if self.memory is None or not (
+            hasattr(self.memory, "has_recent_merchant") or hasattr(self.memory, "get_recent_merchants")
+        ):
+            seen = None
+            score += m["unavailable_score"]
+        else:
+            if hasattr(self.memory, "has_recent_merchant"):
+                seen_u = [self.memory.has_recent_merchant(mid, user_id) for mid in merchant_list]
+            else:
+                recent = {h["merchant_id"] for h in self.memory.get_recent_merchants()}
+                seen_u = [mid in recent for mid in merchant_list]
+            seen = np.asarray(seen_u, dtype=bool)[merchant_inv]
+            if repeats_seen and n:
+                # every row after a merchant's first one (codes are 0..k-1)
+                first = np.unique(merchant_inv, return_index=True)[1]
+                seen |= np.arange(n) != first[merchant_inv]
+            score += np.where(seen, m["seen_score"], m["unseen_score"])
+
+        blocked = None
+        if self.blocklist is not None:
+            blocked_u = np.asarray([self.blocklist.contains(mid) for mid in merchant_list], dtype=bool)
+            blocked = blocked_u[merchant_inv]
+            score += np.where(blocked, rules.blocklist[0], 0.0)
+
+        # velocity is per user: one dict for every row, unless given per row
+        if velocity is None or isinstance(velocity, dict):
+            velocity_reasons: Any = []
+            score += self.score_velocity(velocity, velocity_reasons, rules)
+        else:
+            if len(velocity) != n:
+                raise ValueError("velocity must have one entry per row")
+            velocity_reasons = [[] for _ in range(n)]
+            score += np.fromiter(
+                (self.score_velocity(v, r, rules) for v, r in zip(velocity, velocity_reasons)),
+                dtype=np.float64,
+                count=n,
+            )
+
+        level_idx = np.searchsorted(np.asarray(rules.level_breaks), score, side="right") - 1
+
+        return BatchRiskResult(
+            rules=rules,
+            scores=score,
+            level_idx=level_idx,
+            amount_idx=amount_idx,
+            country_uniq=country_uniq,
+            country_inv=country_inv,
+            seen=seen,
+            blocked=blocked,
+            velocity=velocity,
+            velocity_reasons=velocity_reasons,
+        )
+
+
+def _velocity_tier(tiers, value: float, currency: str, reasons: List[str]) -> float:
+    i = tiers.index(value)
+    if i < 0:
+        return 0.0
+    reason = tiers.reasons[i]
+    if reason:
+        reasons.append(reason.format(value=value, currency=currency))
+    return tiers.scores[i]
+
+
+def _factorize(values: Sequence[str], np):
+    """
+    (distinct values in first-seen order, int index per row). A dict pass
+    is much cheaper than np.unique's string sort for low-cardinality columns.
+    """
+    codes: Dict[str, int] = {}
+    setdefault = codes.setdefault
+    inv = np.fromiter((setdefault(v, len(codes)) for v in values), dtype=np.intp, count=len(values))
+    return list(codes), inv
+
+
+class BatchRiskResult:
+    """
+    Output of RiskScorer.evaluate_many: score/level arrays plus what is
+    needed to rebuild any row's reasons lazily, in the scalar order.
+    """
+
+    __slots__ = (
+        "rules", "scores", "level_idx", "_amount_idx", "_country_uniq", "_country_inv",
+        "_seen", "_blocked", "_velocity", "_velocity_reasons", "_per_row_velocity",
+    )
+
+    def __init__(self, rules, scores, level_idx, amount_idx, country_uniq, country_inv,
+                 seen, blocked, velocity, velocity_reasons):
+        self.rules = rules
+        self.scores = scores
+        self.level_idx = level_idx
+        self._amount_idx = amount_idx
+        self._country_uniq = country_uniq
+        self._country_inv = country_inv
+        self._seen = seen
+        self._blocked = blocked
+        self._velocity = velocity
+        self._velocity_reasons = velocity_reasons
+        self._per_row_velocity = not (velocity is None or isinstance(velocity, dict))
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    @property
+    def levels(self) -> List[str]:
+        names = self.rules.level_names
+        return [names[i] for i in self.level_idx.tolist()]
+
+    def flagged(self):
+        """Row indices above the lowest risk level."""
+        import numpy as np
+        return np.nonzero(self.level_idx > 0)[0]
+
+    def reasons(self, i: int) -> List[str]:
+        rules = self.rules
+        reasons: List[str] = []
+
+        reason = rules.amount.reasons[self._amount_idx[i]]
+        if reason:
+            reasons.append(reason)
+
+        hit = rules.country_scores.get(self._country_uniq[self._country_inv[i]])
+        if hit is not None and hit[1]:
+            reasons.append(hit[1])
+
+        m = rules.merchant
+        if self._seen is None:
+            reasons.append(m["unavailable_reason"])
+        else:
+            reasons.append(m["seen_reason"] if self._seen[i] else m["unseen_reason"])
+
+        if self._blocked is not None and self._blocked[i]:
+            reasons.append(rules.blocklist[1])
+
+        reasons.extend(self._velocity_reasons[i] if self._per_row_velocity else self._velocity_reasons)
+        return reasons
+
+    def item(self, i: int, with_reasons: bool = True) -> Dict[str, Any]:
+        result = {
+            "risk_score": float(self.scores[i]),
+            "risk_level": self.rules.level_names[self.level_idx[i]],
+            "reasons": self.reasons(i) if with_reasons else [],
+        }
+        velocity = self._velocity[i] if self._per_row_velocity else self._velocity
+        if velocity:
+            result["velocity"] = velocity
+        return result
+
+    def to_dicts(self, explain: str = "flagged") -> List[Dict[str, Any]]:
+        """
+        explain: "all" -> reasons for every row, "flagged" -> only rows above
+        the lowest level, "none" -> no reasons.
+        """
+        rows = []
+        for i, lvl in enumerate(self.level_idx.tolist()):
+            with_reasons = explain == "all" or (explain == "flagged" and lvl > 0)
+            rows.append(self.item(i, with_reasons))
+        return rows
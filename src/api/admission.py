@@ -0,0 +1,137 @@
+# src/api/admission.py
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional
+
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.api.responses import FastJSONResponse
+from src.observability.metrics import metrics
+from src.tools.deadline import Deadline
+
+
+def parse_budgets(spec: str) -> Dict[str, float]:
+    """'/api/scan-text=8,/api/scan-images=0' -> {path: seconds}."""
+    budgets: Dict[str, float] = {}
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        path, sep, seconds = entry.partition("=")
+        if not sep or not path.strip().startswith("/"):
+            raise ValueError(f"Bad request budget entry {entry!r} (expected /path=seconds)")
+        budgets[path.strip()] = float(seconds)
+    return budgets
+
+
+class RequestBudgets:
+    """Time budget per path: an override from parse_budgets(), else the default. 0 = no deadline."""
+
+    def __init__(self, default: float, overrides: Optional[Dict[str, float]] = None):
+        self.default = default
+        self.overrides = dict(overrides or {})
+
+    def seconds(self, path: str) -> float:
+        return self.overrides.get(path, self.default)
+
+    def deadline(self, path: str) -> Optional[Deadline]:
+        seconds = self.seconds(path)
+        return Deadline(seconds) if seconds > 0 else None
+
+
+class InFlightLimiter:
+    """
+    Counts work that holds a threadpool worker: admitted HTTP requests and
+    WebSocket scans share the same `max_in_flight` slots (0 = unlimited).
+    Used from the event loop only, so no lock.
+    """
+
+    def __init__(self, max_in_flight: int = 0):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.rejected = 0
+
+    def try_acquire(self) -> bool:
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+
+class AdmissionControl:
+    """
+    ASGI middleware in front of the API.
+
+    - At most `max_in_flight` HTTP requests (plus WebSocket scans holding
+      a slot from the same limiter) run at once (0 = unlimited).
+      One more gets an immediate 503 with Retry-After instead of queueing
+      for a worker thread behind slow FX / Gemini calls. A streamed
+      response holds its slot until the stream ends. `exempt` paths
+      (health, metrics) and CORS preflights (OPTIONS) are never refused
+      or counted.
+    - Every HTTP request gets a Deadline for its path's budget, started on
+      arrival, in scope["state"]["deadline"] (see request_deadline()).
+
+    WebSocket connections pass through; the scan socket takes a slot from
+    the same `limiter` and starts a deadline per message instead.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        budgets: RequestBudgets,
+        max_in_flight: int = 0,
+        retry_after: int = 1,
+        exempt: Iterable[str] = ("/api/health", "/api/metrics"),
+        limiter: Optional[InFlightLimiter] = None,
+    ):
+        self.app = app
+        self.budgets = budgets
+        self.limiter = limiter or InFlightLimiter(max_in_flight)
+        self.retry_after = retry_after
+        self.exempt = frozenset(exempt)
+        metrics.register_gauge("admission.in_flight", lambda: self.limiter.in_flight)
+        metrics.register_gauge("admission.rejected", lambda: self.limiter.rejected)
+
+    @property
+    def in_flight(self) -> int:
+        return self.limiter.in_flight
+
+    @property
+    def rejected(self) -> int:
+        return self.limiter.rejected
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        scope.setdefault("state", {})["deadline"] = self.budgets.deadline(path)
+        if not self.limiter.max_in_flight or path in self.exempt or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        if not self.limiter.try_acquire():
+            response = FastJSONResponse(
+                {"success": False, "error": "Server is busy, retry shortly"},
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release()
+
+
+def request_deadline(conn: HTTPConnection) -> Optional[Deadline]:
+    """The deadline AdmissionControl attached to this request (None without a budget)."""
+    return conn.scope.get("state", {}).get("deadline")
@@ -1,5 +1,6 @@
+from dataclasses import dataclass, fields
 from pydantic import BaseModel
-from typing import Optional, Any, List, Dict
+from typing import Optional, Any, List, Dict, Union
 
 
 class TextScanRequest(BaseModel):
@@ -14,15 +15,6 @@ class ImageScanRequest(BaseModel):
     # We will accept files via FastAPI UploadFile instead of here
 
 
-class ScanResponse(BaseModel):
-    success: bool
-    message: str
-    session_id: str
-    qr_info: Dict[str, Any]
-    fx_result: Dict[str, Any]
-    risk_result: Dict[str, Any]
-
-
 class ErrorResponse(BaseModel):
     success: bool = False
     error: str
@@ -40,3 +32,181 @@ class HistoryItem(BaseModel):
 
 class HistoryResponse(BaseModel):
     items: List[HistoryItem]
+
+
+# -----------------------------
+# Scan responses
+# -----------------------------
+# Slotted dataclasses rather than pydantic models: the scan routes build
+# them from the orchestrator's dicts and hand them straight to orjson
+# (see responses.py), with no validation or jsonable_encoder pass. They
+# also document the response shape in the OpenAPI schema.
+
+def _pick(cls, data: Dict[str, Any]) -> Dict[str, Any]:
+    return {f.name: data[f.name] for f in fields(cls) if f.name in data}
+
+
+@dataclass(slots=True)
+class QrInfo:
+    merchant_id: str
+    country: str
+    currency: str
+    amount: float
+    raw_fields: Dict[str, Any]
+    qr_id: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QrInfo":
+        return cls(**_pick(cls, data))
+
+
+@dataclass(slots=True)
+class FxResult:
+    from_currency: str
+    to_currency: str
+    rate: float
+    base_home: float
+    markup_home: float
+    network_fee_home: float
+    total_home: float
+    notes: str = ""
+    provider: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FxResult":
+        return cls(**_pick(cls, data))
+
+
+@dataclass(slots=True)
+class Velocity:
+    scans_per_minute: int
+    spend_per_hour: float
+    currency: str
+    distinct_merchants_per_day: int
+
+
+@dataclass(slots=True)
+class RiskResult:
+    risk_score: float
+    risk_level: str
+    reasons: List[str]
+    velocity: Optional[Velocity] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RiskResult":
+        velocity = data.get("velocity")
+        return cls(
+            risk_score=data["risk_score"],
+            risk_level=data["risk_level"],
+            reasons=data.get("reasons") or [],
+            velocity=Velocity(**_pick(Velocity, velocity)) if velocity else None,
+        )
+
+
+@dataclass(slots=True)
+class ScanItem:
+    qr_info: QrInfo
+    fx_result: FxResult
+    risk_result: RiskResult
+
+
+@dataclass(slots=True)
+class ScanItemError:
+    qr_info: Dict[str, Any]  # {"error", "raw_fields", "qr_id"} from the parser
+    error: str
+
+
+@dataclass(slots=True)
+class ScanResponse:
+    session_id: str
+    user_country: Optional[str]
+    qr_info: QrInfo
+    fx_result: FxResult
+    risk_result: RiskResult
+    message: str
+    success: bool = True
+
+
+@dataclass(slots=True)
+class MultiScanResponse:
+    session_id: str
+    user_country: Optional[str]
+    count: int
+    items: List[Union[ScanItem, ScanItemError]]
+    total_home: float
+    message: str
+    errors: int = 0
+    multiple: bool = True
+    success: bool = True
+
+
+@dataclass(slots=True)
+class ScanErrorResponse:
+    session_id: str
+    user_country: Optional[str]
+    error: str
+    message: str
+    success: bool = False
+
+
+AnyScanResponse = Union[ScanResponse, MultiScanResponse, ScanErrorResponse]
+
+
+def _item(data: Dict[str, Any]) -> Union[ScanItem, ScanItemError]:
+    if "error" in data:
+        return ScanItemError(qr_info=data.get("qr_info") or {}, error=data["error"])
+    return ScanItem(
+        qr_info=QrInfo.from_dict(data["qr_info"]),
+        fx_result=FxResult.from_dict(data["fx_result"]),
+        risk_result=RiskResult.from_dict(data["risk_result"]),
+    )
+
+
+def to_scan_response(result: Dict[str, Any]) -> AnyScanResponse:
+    """Typed view of an orchestrator scan result (single, multi or error)."""
+    if "error" in result:
+        return ScanErrorResponse(
+            session_id=result.get("session_id", ""),
+            user_country=result.get("user_country"),
+            error=result["error"],
+            message=result.get("message", ""),
+        )
+    if result.get("multiple"):
+        items = [_item(it) for it in result.get("items") or []]
+        return MultiScanResponse(
+            session_id=result["session_id"],
+            user_country=result.get("user_country"),
+            count=result.get("count", len(items)),
+            items=items,
+            total_home=result.get("total_home", 0.0),
+            message=result.get("message", ""),
+            errors=result.get("errors", 0),
+        )
+    item = _item(result)
+    return ScanResponse(
+        session_id=result["session_id"],
+        user_country=result.get("user_country"),
+        qr_info=item.qr_info,
+        fx_result=item.fx_result,
+        risk_result=item.risk_result,
+        message=result.get("message", ""),
+    )
+
+
+@dataclass(slots=True)
+class BulkScanLine:
+    """One NDJSON line of /api/scan-images."""
+    file: str
+    ok: bool
+    result: Optional[AnyScanResponse] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BulkScanLine":
+        result = data.get("result")
+        return cls(
+            file=data["file"],
+            ok=data["ok"],
+            result=to_scan_response(result) if result is not None else None,
+            error=data.get("error"),
+        )
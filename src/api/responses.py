@@ -0,0 +1,39 @@
+import dataclasses
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; the stdlib encoder is used without it
+    orjson = None
+
+# Same leniency as the stdlib path: numpy scalars/arrays, non-str keys, and
+# str() for anything else orjson doesn't know.
+_ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def _default(obj: Any) -> Any:
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}
+    if hasattr(obj, "tolist"):  # numpy
+        return obj.tolist()
+    return str(obj)
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON for dicts, lists and the dataclass response models."""
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=_ORJSON_OPTIONS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson. Routes that return one directly also
+    skip FastAPI's jsonable_encoder pass over the content.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
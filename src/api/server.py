@@ -1,20 +1,93 @@
 import os
+import csv
+import io
+import itertools
+import json
+import logging
 import tempfile
-from typing import Optional, Dict, Any, List
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, Iterator
 
-from fastapi import FastAPI, UploadFile, File, Query
+from fastapi import FastAPI, UploadFile, File, Query, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 
+from src.api.admission import AdmissionControl, InFlightLimiter, RequestBudgets, parse_budgets, request_deadline
+from src.api.models import AnyScanResponse, BulkScanLine, to_scan_response
+from src.api.responses import FastJSONResponse, dumps
 from src.orchestration.orchestrator_agent import OrchestratorAgent
-from src.orchestration.session_manager import InMemorySessionService
-from src.orchestration.memory_manager import SimpleMemoryBank
+from src.orchestration.session_manager import InMemorySessionService, SharedSessionService
+from src.orchestration.memory_manager import SimpleMemoryBank, SharedMemoryBank
+from src.tools.bulk_image_tool import iter_upload_images
+from src.observability.metrics import metrics
+from src.persistence.history_archiver import HistoryArchiver
+from src.persistence.history_rollups import GLOBAL_SCOPE, HistoryRollups
+from src.persistence.history_store import HistoryStore
+from src.persistence.history_writer import HistoryWriter
+from src.persistence.profile_store import ProfileStore
+from src.persistence.state_backend import make_backend
+from src.tools.deadline import DeadlineExceeded
+from src.config import (
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_RETRY_AFTER,
+    HISTORY_DB_PATH,
+    HISTORY_MIGRATE_RAW,
+    PROFILE_DB_PATH,
+    QR_DECODER_WARMUP,
+    REQUEST_BUDGET_SECONDS,
+    REQUEST_BUDGETS,
+    STATE_BACKEND,
+    STATE_CACHE_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
 
 # -----------------------------
 # App init
 # -----------------------------
-app = FastAPI(title="QR Payment Agent API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if QR_DECODER_WARMUP:
+        try:
+            ms = orchestrator.decode_pool.start()  # every decode thread loads its detector now
+            logger.info("QR decode pool warm-up took %.1f ms", ms)
+        except Exception as e:
+            logger.warning("QR decode pool warm-up failed: %s", e)
+    sessions.start_sweeper()
+    if HISTORY_MIGRATE_RAW:
+        history_store.start_migration()
+    history_rollups.start()
+    history_archiver.start()  # no-op unless HISTORY_RETENTION_DAYS > 0
+    try:
+        yield
+    finally:
+        sessions.stop_sweeper()
+        orchestrator.decode_pool.shutdown()
+        history_writer.close()  # drains queued history rows
+        history_archiver.stop()
+        history_rollups.stop()
+        history_store.close()
+        if profile_store is not None:
+            profile_store.close()
+
+
+app = FastAPI(title="QR Payment Agent API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
+# Bounded in-flight requests (fast 503 beyond it) and a deadline per request
+request_budgets = RequestBudgets(REQUEST_BUDGET_SECONDS, parse_budgets(REQUEST_BUDGETS))
+# shared with the scan WebSocket: its scans use the same threadpool
+admission_limiter = InFlightLimiter(ADMISSION_MAX_IN_FLIGHT)
+app.add_middleware(
+    AdmissionControl,
+    budgets=request_budgets,
+    limiter=admission_limiter,
+    retry_after=ADMISSION_RETRY_AFTER,
+)
+# Added last so it is outermost: 503s from admission control still carry CORS headers
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # for dev; tighten later
@@ -23,12 +96,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-sessions = InMemorySessionService()
-memory = SimpleMemoryBank()
 
-# default user profile
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request: Request, exc: DeadlineExceeded) -> FastJSONResponse:
+    return FastJSONResponse({"success": False, "error": str(exc)}, status_code=504)
+
+state_backend = make_backend(STATE_BACKEND, cache_ttl=STATE_CACHE_TTL)
+if state_backend is not None:
+    # shared across workers (uvicorn --workers N)
+    sessions = SharedSessionService(state_backend)
+    memory = SharedMemoryBank(state_backend)  # profiles live in the shared backend too
+    profile_store = None
+    metrics.register_gauge("state_backend", state_backend.stats)
+else:
+    sessions = InMemorySessionService()
+    # profiles survive restarts; reads are served from an LRU cache
+    profile_store = ProfileStore(PROFILE_DB_PATH)
+    memory = SimpleMemoryBank(profiles=profile_store)
+    metrics.register_gauge("profiles", profile_store.stats)
+    metrics.register_gauge("sessions.live", lambda: len(sessions))
+    metrics.register_gauge("sessions.approx_bytes", lambda: sessions.approx_bytes)
+    metrics.register_gauge("sessions.expired", lambda: sessions.expired)
+    metrics.register_gauge("sessions.evicted", lambda: sessions.evicted)
+
+# default user profile (only if absent, so edits made through the API stick)
 DEFAULT_USER_ID = "user-123"
-memory.upsert_profile(DEFAULT_USER_ID, {
+memory.seed_profile(DEFAULT_USER_ID, {
     "home_currency": "INR",
     "preferred_card": "VISA",
     "risk_preference": "balanced",
@@ -36,6 +129,49 @@ memory.upsert_profile(DEFAULT_USER_ID, {
 
 orchestrator = OrchestratorAgent(sessions, memory)
 
+# Scan history: written behind the request by a batching background thread
+history_store = HistoryStore(HISTORY_DB_PATH)
+# Analytics rollups, refreshed in the background after every written batch
+history_rollups = HistoryRollups(history_store)
+history_writer = HistoryWriter(history_store, on_write=history_rollups.notify)
+history_archiver = HistoryArchiver(history_store, rollups=history_rollups)
+
+_RISK_ORDER = {"unknown": 0, "low": 1, "medium": 2, "high": 3, "critical": 4}
+
+
+def _record_history(user_id: str, mode: str, input_repr: str, result: Dict[str, Any]) -> None:
+    """
+    Queue a scan result for the history table (errors are not recorded).
+    Can block while the queue is full, so async handlers call it through
+    run_in_threadpool.
+    """
+    if result.get("multiple"):
+        items = [it for it in result.get("items") or [] if "fx_result" in it]
+        if not items:
+            return
+        levels = [it["risk_result"].get("risk_level") or "unknown" for it in items]
+        risk_level = max(levels, key=lambda lvl: _RISK_ORDER.get(lvl, 0))
+        home_currency = items[0]["fx_result"].get("to_currency")
+        total_home = result.get("total_home")
+    elif "fx_result" in result:
+        fx, risk = result["fx_result"], result.get("risk_result") or {}
+        risk_level = risk.get("risk_level")
+        home_currency = fx.get("to_currency")
+        total_home = fx.get("total_home")
+    else:
+        return
+
+    history_writer.submit(
+        user_id=user_id,
+        mode=mode,
+        input_repr=input_repr,
+        total_home=total_home,
+        home_currency=home_currency,
+        risk_level=risk_level,
+        note=result.get("message"),
+        raw_result=result,
+    )
+
 # -----------------------------
 # Request models
 # -----------------------------
@@ -52,6 +188,20 @@ class ScanImageRequest(BaseModel):
     user_country: Optional[str] = None  # 👈 NEW
 
 
+class ProfileRequest(BaseModel):
+    model_config = ConfigDict(extra="allow")  # free-form preferences are kept as given
+
+    home_currency: Optional[str] = Field(None, pattern=r"^[A-Za-z]{3}$")
+    preferred_card: Optional[str] = None
+    risk_preference: Optional[str] = None
+
+    def fields(self, exclude_unset: bool) -> Dict[str, Any]:
+        data = self.model_dump(exclude_unset=exclude_unset, exclude_none=exclude_unset)
+        if data.get("home_currency"):
+            data["home_currency"] = data["home_currency"].upper()
+        return data
+
+
 # -----------------------------
 # Routes
 # -----------------------------
@@ -60,24 +210,32 @@ def health():
     return {"ok": True}
 
 
-@app.post("/api/scan-text")
-def scan_text(req: ScanTextRequest) -> Dict[str, Any]:
+@app.get("/api/metrics")
+def get_metrics() -> Dict[str, Any]:
+    return metrics.snapshot()
+
+
+@app.post("/api/scan-text", response_model=AnyScanResponse)
+def scan_text(req: ScanTextRequest, request: Request) -> FastJSONResponse:
     result = orchestrator.handle_qr_scan(
         user_id=req.user_id,
         session_id=req.session_id or "",
         qr_payload=req.qr_payload,
         user_country=req.user_country,  # 👈 NEW
+        deadline=request_deadline(request),
     )
-    return result
+    _record_history(req.user_id, "text", req.qr_payload, result)
+    return FastJSONResponse(to_scan_response(result))
 
 
-@app.post("/api/scan-image")
+@app.post("/api/scan-image", response_model=AnyScanResponse)
 async def scan_image(
+    request: Request,
     user_id: str = Query(DEFAULT_USER_ID),
     session_id: str = Query(""),
     user_country: Optional[str] = Query(None),  # 👈 NEW
     file: UploadFile = File(...),
-) -> Dict[str, Any]:
+) -> FastJSONResponse:
     # save to temp file
     suffix = os.path.splitext(file.filename or "")[-1] or ".png"
     with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
@@ -86,13 +244,18 @@ async def scan_image(
         tmp.write(content)
 
     try:
-        result = orchestrator.handle_qr_image_scan(
+        # off the event loop: a blocking scan here would also stall admission control
+        result = await run_in_threadpool(
+            orchestrator.handle_qr_image_scan,
             user_id=user_id,
             session_id=session_id or "",
             image_path=tmp_path,
             user_country=user_country,  # 👈 NEW
+            deadline=request_deadline(request),
         )
-        return result
+        # submit() may block on a full history queue: keep it off the event loop too
+        await run_in_threadpool(_record_history, user_id, "image", file.filename or "upload", result)
+        return FastJSONResponse(to_scan_response(result))
     finally:
         try:
             os.remove(tmp_path)
@@ -100,14 +263,284 @@ async def scan_image(
             pass
 
 
+@app.post("/api/scan-images")
+def scan_images_bulk(
+    request: Request,
+    user_id: str = Query(DEFAULT_USER_ID),
+    session_id: str = Query(""),
+    user_country: Optional[str] = Query(None),
+    files: List[UploadFile] = File(...),
+) -> StreamingResponse:
+    """
+    Bulk scan: many multipart image files and/or zip archives of images.
+    Streams one NDJSON line per image as soon as it's processed; a bad
+    image only fails its own line.
+    """
+    def _images():
+        for f in files:
+            yield from iter_upload_images(f.filename or "upload", f.file)
+
+    def _lines() -> Iterator[bytes]:
+        for item in orchestrator.handle_bulk_image_scan(
+            user_id=user_id,
+            session_id=session_id or "",
+            images=_images(),
+            user_country=user_country,
+            deadline=request_deadline(request),
+        ):
+            if item.get("ok"):
+                _record_history(user_id, "image", item["file"], item["result"])
+            yield dumps(BulkScanLine.from_dict(item)) + b"\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+
+_ws_connections = 0
+_ws_scan_stat = metrics.latency("ws.scan_ms")
+metrics.register_gauge("ws.connections", lambda: _ws_connections)
+
+
+@app.websocket("/api/ws/scan")
+async def ws_scan(
+    websocket: WebSocket,
+    user_id: str = Query(DEFAULT_USER_ID),
+    session_id: str = Query(""),
+    user_country: Optional[str] = Query(None),
+):
+    """
+    Scan session over one WebSocket. Session and profile are resolved once
+    at connect (reconnect to pick up profile changes).
+
+    Client -> server, one scan per message:
+      text frame   {"qr_payload": "...", "id": <optional, echoed back>}
+      binary frame raw image bytes
+    Server -> client:
+      {"type": "ready", "session_id", "home_currency"}             once
+      {"type": "result", "seq", "id", "result": <scan response>}   FX + risk, before the LLM call
+      {"type": "explanation", "seq", "id", "message"}              follows each successful result
+      {"type": "error", "seq", "id", "error"}                      the session stays open
+    Scans are handled in order; the next message is read once the previous
+    explanation has been sent. Each scan has the /api/ws/scan request
+    budget, started when its message arrives, and holds an admission slot
+    until its explanation is sent; when none is free the scan gets an
+    error frame ("Server is busy") instead.
+    """
+    global _ws_connections
+    async def _send(frame: Dict[str, Any]) -> None:
+        await websocket.send_text(dumps(frame).decode("utf-8"))
+
+    await websocket.accept()
+    ctx = await run_in_threadpool(orchestrator.open_context, user_id, session_id, user_country)
+    await _send({"type": "ready", "session_id": ctx.session_id, "home_currency": ctx.home_currency})
+
+    _ws_connections += 1
+    seq = 0
+    try:
+        while True:
+            msg = await websocket.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            seq += 1
+            if not admission_limiter.try_acquire():  # same threadpool as HTTP requests
+                await _send({"type": "error", "seq": seq, "id": None, "error": "Server is busy, retry shortly"})
+                continue
+            try:
+                t0 = time.perf_counter()
+                ctx.deadline = request_budgets.deadline(websocket.url.path)  # each scan gets its own budget
+                msg_id = None
+                try:
+                    if msg.get("bytes") is not None:
+                        mode, input_repr = "image", f"ws-image-{seq}"
+                        qr_payload = await run_in_threadpool(orchestrator.decode_image_bytes, msg["bytes"], ctx.deadline)
+                        if not qr_payload:
+                            raise ValueError("No QR code found in image")
+                    else:
+                        body = json.loads(msg.get("text") or "")
+                        if not isinstance(body, dict):
+                            raise ValueError("Expected a JSON object")
+                        msg_id = body.get("id")
+                        mode, qr_payload = "text", str(body.get("qr_payload") or "")
+                        input_repr = qr_payload
+                    result = await run_in_threadpool(orchestrator.score, ctx, qr_payload)
+                except (ValueError, DeadlineExceeded) as e:  # ValueError includes malformed JSON
+                    await _send({"type": "error", "seq": seq, "id": msg_id, "error": str(e)})
+                    continue
+                except Exception as e:
+                    logger.exception("WebSocket scan failed")
+                    await _send({"type": "error", "seq": seq, "id": msg_id, "error": str(e)})
+                    continue
+
+                needs_explanation = "message" not in result
+                if needs_explanation:
+                    result["message"] = ""
+                await _send({"type": "result", "seq": seq, "id": msg_id, "result": to_scan_response(result)})
+                _ws_scan_stat.observe((time.perf_counter() - t0) * 1000)
+                if not needs_explanation:
+                    continue  # empty input / nothing parsed: the result carries its message
+
+                result["message"] = await run_in_threadpool(orchestrator.explain, ctx, qr_payload.strip(), result)
+                await run_in_threadpool(_record_history, user_id, mode, input_repr, result)
+                await _send({"type": "explanation", "seq": seq, "id": msg_id, "message": result["message"]})
+            finally:
+                admission_limiter.release()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _ws_connections -= 1
+
+
 @app.get("/api/history")
-def history(user_id: str = Query(DEFAULT_USER_ID), session_id: str = Query("")) -> Dict[str, Any]:
-    # If your session manager supports it, return actual history.
-    # Otherwise, return empty list to avoid breaking UI.
-    state = sessions.get_session(session_id) if session_id else None
-    if not state:
-        return {"user_id": user_id, "session_id": session_id, "history": []}
-    return {"user_id": user_id, "session_id": state.session_id, "history": state.history}
+def history(
+    user_id: str = Query(DEFAULT_USER_ID),
+    session_id: str = Query(""),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    risk_level: Optional[str] = Query(None, description="Comma-separated, e.g. medium,high"),
+    currency: Optional[str] = Query(None, description="Scanned (local) currency, e.g. JPY"),
+    date_from: Optional[str] = Query(None, description="YYYY-MM-DD or ISO datetime, inclusive"),
+    date_to: Optional[str] = Query(None, description="YYYY-MM-DD or ISO datetime, inclusive"),
+) -> Dict[str, Any]:
+    """
+    With session_id: that session's conversation turns.
+    Otherwise: the user's persisted scan history, newest first. Pass the
+    returned next_cursor back as `cursor` for the next page. Scans still in
+    the write-behind queue (a few ms old) show up on a later read.
+    """
+    if session_id:
+        state = sessions.get_session(session_id)
+        if not state:
+            return {"user_id": user_id, "session_id": session_id, "history": []}
+        return {"user_id": user_id, "session_id": state.session_id, "history": state.history}
+
+    levels = [lvl.strip().lower() for lvl in risk_level.split(",") if lvl.strip()] if risk_level else None
+    try:
+        rows, next_cursor = history_store.page(
+            user_id,
+            limit=limit,
+            cursor=cursor,
+            risk_levels=levels,
+            currency=currency,
+            date_from=date_from,
+            date_to=date_to,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    items = [
+        {
+            "id": r["id"],
+            "timestamp": r["created_at"],
+            "mode": r["mode"],
+            "input_repr": r["input_repr"],
+            "home_currency": r["home_currency"],
+            "local_currency": r["local_currency"],
+            "total_home": r["total_home"],
+            "risk_level": r["risk_level"],
+            "note": r["note"],
+        }
+        for r in rows
+    ]
+    return {"user_id": user_id, "items": items, "next_cursor": next_cursor}
+
+
+_EXPORT_FIELDS = [
+    "id", "created_at", "user_id", "mode", "input_repr", "total_home", "home_currency", "local_currency",
+    "risk_level", "note",
+]
+_EXPORT_CHUNK_ROWS = 500
+
+
+@app.get("/api/history/export")
+def export_history(
+    user_id: Optional[str] = Query(None, description="Omit for all users"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    include_raw: bool = Query(False, description="NDJSON only: include the full stored result"),
+) -> StreamingResponse:
+    """
+    Stream history rows oldest first as NDJSON or CSV. Rows are read in
+    keyset batches and sent in chunks, so memory is flat at any size.
+    """
+    rows = history_store.iter_rows(
+        user_id=user_id,
+        date_from=date_from,
+        date_to=date_to,
+        with_raw=include_raw and format == "ndjson",
+    )
+    try:
+        first = next(rows, None)  # bad dates fail here, before the 200 is sent
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = itertools.chain([first], rows) if first is not None else iter(())
+
+    def _ndjson() -> Iterator[str]:
+        for chunk in iter(lambda: list(itertools.islice(rows, _EXPORT_CHUNK_ROWS)), []):
+            yield "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in chunk)
+
+    def _csv() -> Iterator[str]:
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=_EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for chunk in iter(lambda: list(itertools.islice(rows, _EXPORT_CHUNK_ROWS)), []):
+            writer.writerows(chunk)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
+
+    name = f"history-{user_id or 'all'}.{format}"
+    return StreamingResponse(
+        _csv() if format == "csv" else _ndjson(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
+
+
+@app.get("/api/analytics")
+def analytics(
+    user_id: Optional[str] = Query(None, description="Omit for all users"),
+    days: int = Query(30, ge=1, le=366),
+    top: int = Query(10, ge=1, le=100),
+) -> Dict[str, Any]:
+    """
+    Spend per day/currency, risk-level counts and all-time top merchants,
+    from the rollup tables only. Rows written since the last background
+    refresh show up once it has run; this read only wakes it.
+    """
+    history_rollups.notify()
+    return history_rollups.summary(user_id or GLOBAL_SCOPE, days=days, top=top)
+
+
+@app.get("/api/profiles/{user_id}")
+def get_profile(user_id: str) -> Dict[str, Any]:
+    profile = memory.find_profile(user_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"No profile for user {user_id!r}")
+    return {"user_id": user_id, "profile": profile}
+
+
+@app.put("/api/profiles/{user_id}")
+def put_profile(user_id: str, req: ProfileRequest) -> Dict[str, Any]:
+    """Create or replace the whole profile."""
+    profile = {k: v for k, v in req.fields(exclude_unset=False).items() if v is not None}
+    memory.replace_profile(user_id, profile)
+    return {"user_id": user_id, "profile": profile}
+
+
+@app.patch("/api/profiles/{user_id}")
+def patch_profile(user_id: str, req: ProfileRequest) -> Dict[str, Any]:
+    """Merge the given fields into the profile (creating it if needed)."""
+    memory.upsert_profile(user_id, req.fields(exclude_unset=True))
+    return {"user_id": user_id, "profile": memory.find_profile(user_id)}
+
+
+@app.delete("/api/profiles/{user_id}")
+def delete_profile(user_id: str) -> Dict[str, Any]:
+    if not memory.delete_profile(user_id):
+        raise HTTPException(status_code=404, detail=f"No profile for user {user_id!r}")
+    return {"ok": True, "user_id": user_id}
 
 
 @app.post("/api/clear-history")
@@ -116,6 +549,6 @@ def clear_history(user_id: str = Query(DEFAULT_USER_ID), session_id: str = Query
     if session_id:
         state = sessions.get_session(session_id)
         if state:
-            state.history = []
+            state.clear_history()
             sessions.update_session(state)
     return {"ok": True, "user_id": user_id, "session_id": session_id}
@@ -8,3 +8,66 @@ HOME_CURRENCY = os.getenv("HOME_CURRENCY", "INR")
 
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Bulk image scan: parallel decode workers
+BULK_DECODE_WORKERS = int(os.getenv("BULK_DECODE_WORKERS", "4"))
+
+# Load OpenCV and warm a QR detector at API startup (set 0 for text-only deployments)
+QR_DECODER_WARMUP = os.getenv("QR_DECODER_WARMUP", "1") == "1"
+
+# Risk rule file (JSON), hot-reloaded on change; built-in defaults if missing
+RISK_RULES_PATH = os.getenv("RISK_RULES_PATH", "data/risk_rules.json")
+
+# Bad-merchant blocklist: text list (one ID per line) or prebuilt index; empty = disabled
+MERCHANT_BLOCKLIST_PATH = os.getenv("MERCHANT_BLOCKLIST_PATH", "")
+
+# Sessions: idle TTL, max live sessions (LRU beyond that), background sweep interval
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+
+# Shared state for multi-worker deployments: "" (in-process), sqlite:///path or redis://host:port/db
+STATE_BACKEND = os.getenv("STATE_BACKEND", "")
+# Local read-through cache TTL (seconds) for profiles / merchant familiarity on a shared backend
+STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", "1.0"))
+# A user's merchant familiarity on a shared backend expires this long after their last scan (0 = never)
+MERCHANT_HISTORY_TTL_SECONDS = float(os.getenv("MERCHANT_HISTORY_TTL_SECONDS", str(90 * 24 * 3600)))
+
+# Session history: turns kept verbatim (older ones fold into a rolling summary), per-turn char cap
+SESSION_HISTORY_MESSAGES = int(os.getenv("SESSION_HISTORY_MESSAGES", "10"))
+SESSION_MESSAGE_MAX_CHARS = int(os.getenv("SESSION_MESSAGE_MAX_CHARS", "4000"))
+
+# Scan history (SQLite) and its write-behind queue
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "data/history.db")
+HISTORY_BATCH_ROWS = int(os.getenv("HISTORY_BATCH_ROWS", "200"))
+HISTORY_FLUSH_MS = float(os.getenv("HISTORY_FLUSH_MS", "50"))
+HISTORY_QUEUE_MAX = int(os.getenv("HISTORY_QUEUE_MAX", "10000"))
+# How long a request may block on a full queue before the entry is dropped
+HISTORY_ENQUEUE_TIMEOUT = float(os.getenv("HISTORY_ENQUEUE_TIMEOUT", "1.0"))
+# Compress pre-existing raw_json history rows in the background at startup
+HISTORY_MIGRATE_RAW = os.getenv("HISTORY_MIGRATE_RAW", "1") == "1"
+# Retention: rows older than this many days move to gzip archives (0 = keep everything)
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", "0"))
+HISTORY_RETENTION_INTERVAL = float(os.getenv("HISTORY_RETENTION_INTERVAL", "3600"))
+HISTORY_ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR", "data/archive")
+
+# User profiles (SQLite) and their in-process LRU cache; TTL 0 = until evicted/overwritten
+PROFILE_DB_PATH = os.getenv("PROFILE_DB_PATH", "data/profiles.db")
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "0"))
+
+# Admission control: concurrent API requests allowed (0 = unlimited). Beyond it requests get
+# an immediate 503 with Retry-After instead of queueing for the threadpool (40 threads by default)
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "40"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+# Time budget per request (seconds, 0 = none), shared by FX, Gemini and QR decoding.
+# REQUEST_BUDGETS overrides it per path, e.g. "/api/scan-text=8,/api/scan-images=0"
+REQUEST_BUDGET_SECONDS = float(os.getenv("REQUEST_BUDGET_SECONDS", "20"))
+REQUEST_BUDGETS = os.getenv("REQUEST_BUDGETS", "/api/scan-images=0")
+# Upstream timeouts, capped by the request's remaining budget
+FX_HTTP_TIMEOUT = float(os.getenv("FX_HTTP_TIMEOUT", "15"))
+GEMINI_HTTP_TIMEOUT = float(os.getenv("GEMINI_HTTP_TIMEOUT", "30"))
+# Upstream endpoints; point them at local stand-ins for load tests (src/eval/upstream_stubs.py)
+FX_API_URL = os.getenv("FX_API_URL", "https://api.exchangerate.host/convert")
+FX_ER_API_BASE = os.getenv("FX_ER_API_BASE", "https://open.er-api.com/v6/latest/")
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
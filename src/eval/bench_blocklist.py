@@ -0,0 +1,69 @@
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+
+from src.agents.merchant_blocklist import MerchantBlocklist
+
+# Benchmark: blocklist build/load, lookup latency for clean vs blocked
+# merchants, memory footprint and false-positive rate.
+#
+#   python -m src.eval.bench_blocklist --size 1000000
+
+
+def _random_id(rng: random.Random) -> str:
+    return "M" + "".join(rng.choices(string.ascii_uppercase + string.digits, k=11))
+
+
+def run_bench(size: int = 1_000_000, probes: int = 200_000, fp_rate: float = 0.01) -> None:
+    rng = random.Random(42)
+    blocked = [_random_id(rng) for _ in range(size)]
+    clean = [_random_id(rng) + "C" for _ in range(probes)]  # never in the list
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "blocklist.txt")
+        with open(src, "w", encoding="utf-8") as f:
+            f.write("\n".join(blocked))
+
+        t0 = time.perf_counter()
+        bl = MerchantBlocklist.from_path(src, fp_rate=fp_rate)
+        cold = time.perf_counter() - t0
+        bl.close()
+
+        t0 = time.perf_counter()
+        bl = MerchantBlocklist.from_path(src, fp_rate=fp_rate)
+        warm = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for mid in clean:
+            bl.contains(mid)
+        clean_ns = (time.perf_counter() - t0) / len(clean) * 1e9
+
+        sample = rng.sample(blocked, min(probes, len(blocked)))
+        t0 = time.perf_counter()
+        for mid in sample:
+            bl.contains(mid)
+        hit_ns = (time.perf_counter() - t0) / len(sample) * 1e9
+
+        stats = bl.stats()
+        bl.close()
+
+    print(f"entries:                {size:,}")
+    print(f"build + load (cold):    {cold:.2f} s")
+    print(f"load (cached bloom):    {warm * 1000:.1f} ms")
+    print(f"clean lookup:           {clean_ns:,.0f} ns/op")
+    print(f"blocked lookup:         {hit_ns:,.0f} ns/op")
+    print(f"bloom:                  {stats['bloom_bytes'] / 1e6:.2f} MB, k={stats['bloom_hashes']}")
+    print(f"index (mmap, on disk):  {stats['index_mapped_bytes'] / 1e6:.2f} MB")
+    print(f"fp rate expected/seen:  {stats['expected_fp_rate']:.4%} / {stats['observed_fp_rate']:.4%}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=1_000_000)
+    ap.add_argument("--probes", type=int, default=200_000)
+    ap.add_argument("--fp-rate", type=float, default=0.01)
+    args = ap.parse_args()
+    run_bench(args.size, args.probes, args.fp_rate)
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from src.persistence.history_store import HistoryStore
+
+# Benchmark: raw result storage as pretty JSON text (before) vs compact JSON
+# deflated with a preset dictionary (after), plus the online migration.
+#
+#   python -m src.eval.bench_history_raw --rows 50000 --reads 20000
+
+_COUNTRIES = [("JP", "JPY", 0.55), ("US", "USD", 83.1), ("TH", "THB", 2.3), ("SG", "SGD", 61.7), ("AE", "AED", 22.6)]
+
+
+class JsonHistoryStore(HistoryStore):
+    """The previous format: json.dumps(raw) into raw_json, parsed on every read."""
+
+    def add_many(self, rows):
+        params = [row[:-1] + (json.dumps(row[-1], ensure_ascii=False),) for row in rows]
+        with self._conn() as con:
+            con.executemany(
+                "INSERT INTO history (created_at, user_id, mode, input_repr, total_home, home_currency,"
+                " risk_level, note, raw_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                params,
+            )
+            con.commit()
+        return len(params)
+
+
+def _scan(rng: random.Random, seq: int):
+    country, currency, rate = rng.choice(_COUNTRIES)
+    amount = float(rng.choice([rng.randint(5, 900), rng.randint(1000, 20000)]))
+    base = amount * rate
+    markup = base * 0.03
+    total = base + markup + 11.0
+    level = rng.choices(["low", "medium", "high"], [80, 17, 3])[0]
+    reasons = ["Merchant seen recently (familiar)."]
+    if amount >= 1000:
+        reasons.insert(0, "Moderate amount (>= 1000).")
+    item = {
+        "qr_info": {
+            "merchant_id": f"M{rng.randint(10000, 10300)}",
+            "country": country,
+            "currency": currency,
+            "amount": amount,
+            "raw_fields": {"raw": f"QR:{country}:{currency}:{amount:g}"},
+            "qr_id": f"{uuid.UUID(int=rng.getrandbits(128)).hex[:16]}{seq:016d}",
+        },
+        "fx_result": {
+            "from_currency": currency,
+            "to_currency": "INR",
+            "rate": rate,
+            "base_home": base,
+            "markup_home": markup,
+            "network_fee_home": 11.0,
+            "total_home": total,
+            "notes": "Live FX rate from exchangerate.host with standard markup.",
+            "provider": rng.choice(["exchangerate.host-live", "cache", "cache"]),
+        },
+        "risk_result": {
+            "risk_score": {"low": 15.0, "medium": 45.0, "high": 80.0}[level],
+            "risk_level": level,
+            "reasons": reasons,
+            "velocity": {
+                "scans_per_minute": rng.randint(1, 4),
+                "spend_per_hour": amount,
+                "currency": currency,
+                "distinct_merchants_per_day": rng.randint(1, 6),
+            },
+        },
+    }
+    return item, total, level
+
+
+def make_result(rng: random.Random, seq: int):
+    """A stored result shaped like the orchestrator's (single or multi scan)."""
+    if rng.random() < 0.1:
+        items = [_scan(rng, seq * 10 + i)[0] for i in range(rng.randint(2, 4))]
+        total = sum(it["fx_result"]["total_home"] for it in items)
+        return {
+            "session_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_country": None,
+            "multiple": True,
+            "count": len(items),
+            "errors": 0,
+            "items": items,
+            "total_home": total,
+            "message": (
+                f"You scanned **{len(items)}** QR payments.\n\n"
+                f"**Total estimated charge: {total:.2f} INR**\n"
+                "Open the JSON details to see per-QR breakdowns."
+            ),
+        }
+    item, total, level = _scan(rng, seq)
+    fx = item["fx_result"]
+    return {
+        "session_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "user_country": None,
+        **item,
+        "message": (
+            "LLM is unavailable right now, but here is the computed breakdown:\n"
+            f"- Base converted amount: {fx['base_home']:.2f} INR\n"
+            f"- FX markup: {fx['markup_home']:.2f} INR\n"
+            f"- Network fee (approx.): 11.00 INR\n"
+            f"- Total estimated charge: {total:.2f} INR\n"
+            f"- Risk level: {level}\n"
+            "Recommendation: Proceed only if this total and risk level match your expectation."
+        ),
+    }
+
+
+def _rows(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        raw = make_result(rng, i)
+        out.append(HistoryStore.make_row(f"user-{i % 50}", "text", "QR", raw.get("total_home"), "INR", "low", "", raw))
+    return out
+
+
+def _file_bytes(path: str) -> int:
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    con.execute("VACUUM")
+    con.close()
+    return os.path.getsize(path)
+
+
+def _raw_bytes(path: str) -> int:
+    con = sqlite3.connect(path)
+    n = con.execute("SELECT SUM(LENGTH(raw_json)) + COALESCE(SUM(LENGTH(raw_blob)), 0) FROM history").fetchone()[0]
+    con.close()
+    return n or 0
+
+
+def bench_store(make, rows, reads: int, batch: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.db")
+        store = make(path)
+
+        t0 = time.perf_counter()
+        for i in range(0, len(rows), batch):
+            store.add_many(rows[i:i + batch])
+        write_rate = len(rows) / (time.perf_counter() - t0)
+
+        rng = random.Random(1)
+        ids = [rng.randint(1, len(rows)) for _ in range(reads)]
+        t0 = time.perf_counter()
+        for item_id in ids:
+            store.get_raw(item_id)
+        read_rate = reads / (time.perf_counter() - t0)
+
+        store.close()
+        return write_rate, read_rate, _raw_bytes(path), _file_bytes(path)
+
+
+def bench_migration(rows, batch: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.db")
+        legacy = JsonHistoryStore(path)
+        for i in range(0, len(rows), batch):
+            legacy.add_many(rows[i:i + batch])
+        legacy.close()
+        before = _file_bytes(path)
+
+        store = HistoryStore(path)
+        t0 = time.perf_counter()
+        converted = store.migrate_raw()
+        rate = converted / (time.perf_counter() - t0)
+        assert store.get_raw(1) == rows[0][-1]
+        store.close()
+        return converted, rate, before, _file_bytes(path)
+
+
+def run_bench(rows: int, reads: int, batch: int) -> None:
+    data = _rows(rows)
+    results = {}
+    for name, make in (("json", JsonHistoryStore), ("blob", HistoryStore)):
+        results[name] = w, r, raw, size = bench_store(make, data, reads, batch)
+        print(
+            f"{name:<5} writes {w:>9,.0f} rows/s | get_raw {r:>8,.0f}/s | "
+            f"raw payload {raw / rows:7.1f} B/row | db file {size / 1e6:7.2f} MB"
+        )
+    jw, jr, jraw, jsize = results["json"]
+    bw, br, braw, bsize = results["blob"]
+    print(
+        f"ratio: payload {jraw / braw:.1f}x smaller, file {jsize / bsize:.1f}x smaller, "
+        f"writes {bw / jw:.2f}x, reads {br / jr:.2f}x"
+    )
+
+    converted, rate, before, after = bench_migration(data, batch)
+    print(
+        f"migration: {converted:,} rows at {rate:,.0f} rows/s; "
+        f"file {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB after VACUUM"
+    )
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=50_000)
+    ap.add_argument("--reads", type=int, default=20_000)
+    ap.add_argument("--batch", type=int, default=200)
+    args = ap.parse_args()
+    run_bench(args.rows, args.reads, args.batch)
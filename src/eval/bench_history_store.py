@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from src.persistence.history_store import HistoryStore
+
+# Benchmark: HistoryStore before (connect per call, rollback journal) vs
+# after (pooled WAL connections, cached statements).
+#
+#   python -m src.eval.bench_history_store --inserts 5000 --seconds 5 --writers 2 --readers 4
+
+_RAW = {
+    "qr_info": {"merchant_id": "M12345", "country": "JP", "currency": "JPY", "amount": 1500.0},
+    "fx_result": {"rate": 0.55, "base_home": 825.0, "total_home": 860.75, "provider": "cache"},
+    "risk_result": {"risk_score": 45.0, "risk_level": "medium", "reasons": ["Moderate amount (>= 1000)."]},
+    "message": "Total estimated charge: 860.75 INR. Risk level: medium. " * 4,
+}
+
+
+class LegacyHistoryStore(HistoryStore):
+    """The original access pattern: a fresh connection per call, default journal."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_db()
+
+    def _conn(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def close(self) -> None:
+        pass
+
+
+def _add(store: HistoryStore, user_id: str) -> None:
+    store.add(user_id, "text", "QR:JP:JPY:1500", 860.75, "INR", "medium", "", _RAW)
+
+
+def _seed(path: str, rows: int) -> None:
+    con = sqlite3.connect(path)
+    raw = json.dumps(_RAW)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    con.executemany(
+        "INSERT INTO history (created_at, user_id, mode, input_repr, total_home, home_currency, risk_level, note, raw_json)"
+        " VALUES (?, ?, 'text', 'QR', 860.75, 'INR', 'medium', '', ?)",
+        ((now, f"user-{i % 100}", raw) for i in range(rows)),
+    )
+    con.commit()
+    con.close()
+
+
+def _pct(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))] if samples else 0.0
+
+
+def bench_inserts(store: HistoryStore, n: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        _add(store, f"user-{i % 100}")
+    return n / (time.perf_counter() - t0)
+
+
+def bench_mixed(store: HistoryStore, seconds: float, writers: int, readers: int):
+    stop = threading.Event()
+    writes = [0] * writers
+    latencies = [[] for _ in range(readers)]
+    errors = []
+
+    def writer(i):
+        try:
+            while not stop.is_set():
+                _add(store, f"user-{i}")
+                writes[i] += 1
+        except Exception as e:
+            errors.append(e)
+
+    def reader(i):
+        try:
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                store.list(f"user-{i % 100}", limit=50)
+                latencies[i].append((time.perf_counter() - t0) * 1000)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    lat = [x for per in latencies for x in per]
+    return sum(writes) / seconds, len(lat) / seconds, _pct(lat, 0.50), _pct(lat, 0.95), _pct(lat, 0.99), errors
+
+
+def run_bench(inserts: int, seconds: float, writers: int, readers: int, seed_rows: int) -> None:
+    for name, make in (("legacy", LegacyHistoryStore), ("pooled", HistoryStore)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "history.db")
+            store = make(path)
+            _seed(path, seed_rows)
+
+            ins = bench_inserts(store, inserts)
+            w, r, p50, p95, p99, errors = bench_mixed(store, seconds, writers, readers)
+            store.close()
+
+            print(
+                f"{name:<7} inserts {ins:>8,.0f}/s | mixed ({writers}w/{readers}r): "
+                f"writes {w:>7,.0f}/s  lists {r:>8,.0f}/s  "
+                f"list p50 {p50:6.2f}ms p95 {p95:6.2f}ms p99 {p99:7.2f}ms"
+                + (f"  errors={len(errors)} ({errors[0]})" if errors else "")
+            )
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--inserts", type=int, default=2000)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    ap.add_argument("--writers", type=int, default=2)
+    ap.add_argument("--readers", type=int, default=4)
+    ap.add_argument("--seed-rows", type=int, default=50_000)
+    args = ap.parse_args()
+    run_bench(args.inserts, args.seconds, args.writers, args.readers, args.seed_rows)
@@ -0,0 +1,54 @@
+import argparse
+import timeit
+
+from src.agents.qr_parser_agent import QRParserAgent
+from src.tools.emvco_tlv_tool import build_emvco_payload, parse_emvco
+
+# Benchmark: EMVCo TLV decoder vs the toy "QR:CC:CUR:AMT" parser.
+#
+#   python -m src.eval.bench_qr_parser --number 100000
+
+TOY_PAYLOAD = "QR:TH:THB:150.00"
+EMVCO_PAYLOAD = build_emvco_payload(
+    merchant_id="0812345678",
+    country="TH",
+    currency_numeric="764",
+    amount="150.00",
+    merchant_name="BANGKOK NOODLE HOUSE",
+    merchant_city="BANGKOK",
+)
+
+
+def _naive_tlv(payload: str) -> dict:
+    """Substring-per-field TLV walk, for reference."""
+    out = {}
+    i = 0
+    while i < len(payload):
+        tag = payload[i:i + 2]
+        length = int(payload[i + 2:i + 4])
+        out[tag] = payload[i + 4:i + 4 + length]
+        i += 4 + length
+    return out
+
+
+def run_bench(number: int = 100_000) -> None:
+    agent = QRParserAgent()
+
+    cases = [
+        ("toy parser (QRParserAgent._parse_single)", lambda: agent._parse_single(TOY_PAYLOAD)),
+        ("emvco parse_emvco (with CRC)", lambda: parse_emvco(EMVCO_PAYLOAD)),
+        ("emvco parse_emvco (no CRC)", lambda: parse_emvco(EMVCO_PAYLOAD, verify_crc=False)),
+        ("naive substring TLV split (no CRC, no mapping)", lambda: _naive_tlv(EMVCO_PAYLOAD)),
+    ]
+
+    print(f"EMVCo payload: {len(EMVCO_PAYLOAD)} chars, {number} iterations each\n")
+    for label, fn in cases:
+        best = min(timeit.repeat(fn, number=number, repeat=3))
+        print(f"{label:<48} {best / number * 1e6:8.2f} us/op  {number / best:12,.0f} ops/s")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--number", type=int, default=100_000)
+    args = ap.parse_args()
+    run_bench(args.number)
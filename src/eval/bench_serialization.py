@@ -0,0 +1,72 @@
+import argparse
+import json
+import random
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from src.api.models import to_scan_response
+from src.api.responses import dumps
+from src.eval.bench_history_raw import _scan
+
+# Benchmark: serializing scan responses the way FastAPI did for a returned
+# dict (jsonable_encoder + json.dumps, as JSONResponse renders) vs the typed
+# models rendered by FastJSONResponse (to_scan_response + orjson).
+#
+#   python -m src.eval.bench_serialization --items 200 --reps 500
+
+
+def make_multi_result(items: int, seed: int = 0):
+    rng = random.Random(seed)
+    scans = [_scan(rng, i)[0] for i in range(items)]
+    total = sum(s["fx_result"]["total_home"] for s in scans)
+    return {
+        "session_id": "bench-session",
+        "user_country": "IN",
+        "multiple": True,
+        "count": items,
+        "errors": 0,
+        "items": scans,
+        "total_home": total,
+        "message": f"You scanned **{items}** QR payments.\n\n**Total estimated charge: {total:.2f} INR**",
+    }
+
+
+def _before(result) -> bytes:
+    return json.dumps(
+        jsonable_encoder(result), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _after(result) -> bytes:
+    return dumps(to_scan_response(result))
+
+
+def _time(fn, result, reps: int) -> float:
+    fn(result)  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        fn(result)
+    return (time.perf_counter() - t0) / reps * 1e6
+
+
+def run_bench(sizes, reps: int) -> None:
+    for items in sizes:
+        result = make_multi_result(items)
+        same = json.loads(_after(result))
+        same.pop("success")
+        assert same == json.loads(_before(result)), "typed response changed the payload"
+        before = _time(_before, result, reps)
+        after = _time(_after, result, reps)
+        print(
+            f"{items:>5} items ({len(_after(result)) / 1024:7.1f} KiB) | "
+            f"before {before:9.1f} us | after {after:8.1f} us | {before / after:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, nargs="*", default=[1, 10, 50, 200, 1000])
+    ap.add_argument("--reps", type=int, default=300)
+    args = ap.parse_args()
+    run_bench(args.items, args.reps)
@@ -0,0 +1,286 @@
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.eval.upstream_stubs import UpstreamStubServer, add_fault_args, faults_from_args
+
+# Load driver: closed-loop worker threads send a weighted mix of scan
+# requests and report throughput and latency percentiles per workload.
+#
+# By default it starts the upstream stand-ins (src/eval/upstream_stubs.py),
+# points the app at them and drives it in-process through its ASGI stack
+# (middleware, threadpool, history writer), so nothing touches the internet:
+#
+#   python -m src.eval.load_test --duration 20 --concurrency 16 --mix text=6,multi=3,image=1 \
+#       --gemini-latency-ms 300 --gemini-429-rate 0.02 --fx-latency-ms 80
+#
+# --base-url drives an already running server instead; run the stand-ins
+# separately (`python -m src.eval.upstream_stubs`) and start the server
+# with the env it prints. The fault flags then go to upstream_stubs.
+
+_COUNTRIES = [("JP", "JPY", 100, 20000), ("US", "USD", 5, 400), ("TH", "THB", 50, 5000),
+              ("SG", "SGD", 3, 300), ("AE", "AED", 10, 1500)]
+
+# workload -> endpoint it exercises
+ENDPOINTS = {
+    "text": "POST /api/scan-text",
+    "multi": "POST /api/scan-text",
+    "image": "POST /api/scan-image",
+}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """'text=6,multi=3,image=1' -> weights."""
+    mix: Dict[str, float] = {}
+    for entry in spec.split(","):
+        name, _, weight = entry.strip().partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown workload {name!r} (expected one of {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _qr(rng: random.Random) -> str:
+    country, currency, lo, hi = rng.choice(_COUNTRIES)
+    return f"QR:{country}:{currency}:{rng.randint(lo, hi)}"
+
+
+def make_images(n: int = 8, seed: int = 0) -> List[bytes]:
+    """PNG-encoded QR codes for the image workload."""
+    import cv2
+
+    rng = random.Random(seed)
+    images = []
+    for _ in range(n):
+        img = cv2.QRCodeEncoder.create().encode(_qr(rng))
+        img = cv2.resize(img, None, fx=8, fy=8, interpolation=cv2.INTER_NEAREST)
+        img = cv2.copyMakeBorder(img, 40, 40, 40, 40, cv2.BORDER_CONSTANT, value=255)
+        ok, buf = cv2.imencode(".png", img)
+        images.append(buf.tobytes())
+    return images
+
+
+class _HttpTarget:
+    """requests against a running server; one session (connection pool) per worker thread."""
+
+    def __init__(self, base_url: str, timeout: float = 60.0):
+        import requests
+
+        self._requests = requests
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, path: str, **kwargs: Any):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        return session.post(self.base_url + path, timeout=self.timeout, **kwargs)
+
+    def get(self, path: str, **kwargs: Any):
+        return self._requests.get(self.base_url + path, timeout=self.timeout, **kwargs)
+
+
+def _request(client, workload: str, rng: random.Random, user_id: str, session_id: str, images: List[bytes]):
+    if workload == "image":
+        return client.post(
+            "/api/scan-image",
+            params={"user_id": user_id, "session_id": session_id},
+            files={"file": ("qr.png", rng.choice(images), "image/png")},
+        )
+    count = rng.randint(3, 6) if workload == "multi" else 1
+    payload = ",".join(_qr(rng) for _ in range(count))
+    return client.post("/api/scan-text", json={"user_id": user_id, "session_id": session_id, "qr_payload": payload})
+
+
+def percentile(sorted_ms: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_ms:
+        return 0.0
+    return sorted_ms[max(0, math.ceil(p * len(sorted_ms)) - 1)]
+
+
+def run_load(
+    client,
+    mix: Dict[str, float],
+    concurrency: int = 8,
+    duration: float = 10.0,
+    max_requests: Optional[int] = None,
+    users: int = 50,
+    seed: int = 0,
+    images: Optional[List[bytes]] = None,
+    honor_retry_after: bool = True,
+) -> Dict[str, Any]:
+    """
+    Drive `client` (TestClient or _HttpTarget) until `duration` seconds or
+    `max_requests` requests, whichever comes first. Each worker scans as
+    one user and keeps its session, like a traveller scanning repeatedly.
+    Latency percentiles cover 2xx responses; 503s (admission control) and
+    other failures are counted separately. A worker that gets a 503 waits
+    out its Retry-After, as a well-behaved client would, unless
+    honor_retry_after is off.
+    """
+    if "image" in mix and images is None:
+        images = make_images(seed=seed)
+    names, weights = list(mix), list(mix.values())
+    lock = threading.Lock()
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    issued = [0]
+    stop_at = time.perf_counter() + duration
+
+    def _take() -> bool:
+        with lock:
+            if max_requests is not None and issued[0] >= max_requests:
+                return False
+            issued[0] += 1
+            return True
+
+    def _worker(n: int) -> None:
+        rng = random.Random(seed * 1000 + n)
+        user_id = f"load-user-{n % users}"
+        session_id = ""
+        while time.perf_counter() < stop_at and _take():
+            workload = rng.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                resp = _request(client, workload, rng, user_id, session_id, images or [])
+                status = resp.status_code
+            except Exception:
+                status = 0  # connection error / client timeout
+            ms = (time.perf_counter() - t0) * 1000
+            with lock:
+                statuses[workload][status] += 1
+                if 200 <= status < 300:
+                    latencies[workload].append(ms)
+            if status == 200 and not session_id:
+                session_id = resp.json().get("session_id") or ""
+            elif status == 503 and honor_retry_after:
+                wait = float(resp.headers.get("Retry-After") or 0)
+                time.sleep(max(0.0, min(wait, stop_at - time.perf_counter())))
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=_worker, args=(n,), name=f"load-{n}") for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    report: Dict[str, Any] = {"seconds": round(elapsed, 3), "concurrency": concurrency, "workloads": {}}
+    all_ms: List[float] = []
+    totals: Dict[int, int] = defaultdict(int)
+    for workload in names:
+        ms = sorted(latencies[workload])
+        all_ms += ms
+        for status, n in statuses[workload].items():
+            totals[status] += n
+        report["workloads"][workload] = _summary(ENDPOINTS[workload], ms, statuses[workload], elapsed)
+    report["total"] = _summary("all", sorted(all_ms), totals, elapsed)
+    return report
+
+
+def _summary(endpoint: str, ms: List[float], statuses: Dict[int, int], elapsed: float) -> Dict[str, Any]:
+    requests_done = sum(statuses.values())
+    return {
+        "endpoint": endpoint,
+        "requests": requests_done,
+        "ok": len(ms),
+        "rejected_503": statuses.get(503, 0),
+        "failed": requests_done - len(ms) - statuses.get(503, 0),
+        "rps": round(requests_done / elapsed, 1) if elapsed else 0.0,
+        "ok_rps": round(len(ms) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ms, 0.50), 2),
+        "p95_ms": round(percentile(ms, 0.95), 2),
+        "p99_ms": round(percentile(ms, 0.99), 2),
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"{report['seconds']:.1f}s at concurrency {report['concurrency']}",
+        f"{'workload':<8} {'endpoint':<21} {'reqs':>6} {'ok':>6} {'503':>5} {'fail':>5} "
+        f"{'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}",
+    ]
+    rows = list(report["workloads"].items()) + [("total", report["total"])]
+    for name, s in rows:
+        lines.append(
+            f"{name:<8} {s['endpoint']:<21} {s['requests']:>6} {s['ok']:>6} {s['rejected_503']:>5} {s['failed']:>5} "
+            f"{s['rps']:>7.1f} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f}"
+        )
+    return "\n".join(lines)
+
+
+def _in_process(env: Dict[str, str]) -> Tuple[Callable[[], Any], Callable[[], None]]:
+    # config is read at import time, so the env goes in before the app is imported
+    tmp = tempfile.mkdtemp(prefix="qr-load-")
+    os.environ.update(env)
+    os.environ.setdefault("GEMINI_API_KEY", "stand-in")
+    os.environ["HISTORY_DB_PATH"] = os.path.join(tmp, "history.db")
+    os.environ["PROFILE_DB_PATH"] = os.path.join(tmp, "profiles.db")
+
+    from fastapi.testclient import TestClient
+    from src.api.server import app
+
+    client = TestClient(app)
+    client.__enter__()  # runs the lifespan (decoder warm-up, history writer, ...)
+    return client, lambda: client.__exit__(None, None, None)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--duration", type=float, default=10.0)
+    ap.add_argument("--requests", type=int, default=None, help="stop after this many requests")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--mix", default="text=6,multi=3,image=1")
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--base-url", default="", help="drive a running server instead of the in-process app")
+    ap.add_argument("--fx-cache-ttl", type=float, default=None,
+                    help="in-process only: FX cache TTL in seconds (0 sends every conversion upstream)")
+    ap.add_argument("--ignore-retry-after", action="store_true", help="retry 503s immediately")
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    ap.add_argument("--app-logs", action="store_true", help="keep the app's logging (injected faults log errors)")
+    add_fault_args(ap)
+    args = ap.parse_args()
+    if not args.app_logs:
+        logging.getLogger("src").setLevel(logging.CRITICAL)
+
+    stubs = None
+    if args.base_url:
+        target, close = _HttpTarget(args.base_url), lambda: None
+    else:
+        stubs = UpstreamStubServer(
+            fx=faults_from_args(args, "fx"), gemini=faults_from_args(args, "gemini"), seed=args.seed
+        ).start()
+        target, close = _in_process(stubs.env())
+        if args.fx_cache_ttl is not None:
+            from src.api.server import orchestrator
+
+            orchestrator.fx_agent.cache_ttl_seconds = args.fx_cache_ttl
+
+    try:
+        report = run_load(target, parse_mix(args.mix), args.concurrency, args.duration, args.requests,
+                          args.users, args.seed, honor_retry_after=not args.ignore_retry_after)
+        report["upstream"] = stubs.stats() if stubs else {}
+        report["admission"] = {
+            k: v for k, v in target.get("/api/metrics").json().get("gauges", {}).items() if k.startswith("admission.")
+        }
+    finally:
+        close()
+        if stubs:
+            stubs.stop()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+        print(f"upstream stand-ins: {report['upstream']}  admission: {report['admission']}")
@@ -0,0 +1,213 @@
+import argparse
+import json
+import resource
+import sqlite3
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from src.agents.risk_rules import CompiledRules, RuleSet, compile_rules
+from src.agents.risk_scorer import RiskScorer
+from src.orchestration.memory_manager import SimpleMemoryBank
+from src.orchestration.velocity_tracker import VelocityTracker
+from src.persistence.history_rollups import iter_scans
+from src.persistence.raw_codec import load_raw
+from src.tools.fee_rules_tool import DEFAULT_MARKUP_PCT, DEFAULT_NETWORK_FEE, compute_fees
+
+# Offline replay of data/history.db under a candidate rule set.
+#
+#   python -m src.eval.replay_history --rules candidate_rules.json
+#   python -m src.eval.replay_history --db data/history.db --markup-pct 0.025 --json
+#
+# Rows are streamed in created_at order with fetchmany(), so memory stays
+# flat no matter how large the table is. id order is not time order: rows
+# from several workers, or written with an explicit created_at, can land
+# after newer ones. Merchant familiarity and velocity are
+# rebuilt as the replay goes (using each row's created_at), which is what
+# the live scorer would have seen.
+
+
+def iter_history_rows(
+    db_path: str, batch_size: int = 1000
+) -> Iterator[Tuple[int, str, str, Optional[str], Optional[bytes]]]:
+    """
+    Yield (id, created_at, user_id, raw_json, raw_blob) in (created_at, id)
+    order from a read-only connection, batch_size rows at a time. Decode
+    the last two with raw_codec.load_raw(); raw_blob is None on databases
+    from before compressed storage.
+    """
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        columns = {row[1] for row in con.execute("PRAGMA table_info(history)")}
+        blob = "raw_blob" if "raw_blob" in columns else "NULL"
+        cur = con.execute(f"SELECT id, created_at, user_id, raw_json, {blob} FROM history ORDER BY created_at, id")
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        con.close()
+
+
+def _timestamp(created_at: str) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(created_at).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def replay(
+    db_path: str,
+    rules: CompiledRules,
+    markup_pct: float = DEFAULT_MARKUP_PCT,
+    network_fee: float = DEFAULT_NETWORK_FEE,
+    batch_size: int = 1000,
+    with_velocity: bool = True,
+) -> Dict[str, Any]:
+    """
+    Re-score every stored scan and recompute its fees. Returns a report with
+    old/new level counts, level transitions, fee deltas and throughput.
+    """
+    memory = SimpleMemoryBank()
+    velocity = VelocityTracker() if with_velocity else None
+    scorer = RiskScorer(memory=memory, rules=rules)
+
+    old_levels: Counter = Counter()
+    new_levels: Counter = Counter()
+    transitions: Counter = Counter()
+    rows = scans = skipped = 0
+    old_total = new_total = 0.0
+    max_fee_delta = 0.0
+
+    t0 = time.perf_counter()
+    for _id, created_at, user_id, raw_json, raw_blob in iter_history_rows(db_path, batch_size):
+        rows += 1
+        try:
+            raw = load_raw(raw_json, raw_blob)
+        except ValueError:
+            skipped += 1
+            continue
+        now = _timestamp(created_at)
+
+        for item in iter_scans(raw):
+            qr = item["qr_info"]
+            merchant_id = qr.get("merchant_id", "")
+            country = qr.get("country", "")
+            amount = float(qr.get("amount") or 0.0)
+
+            feats = None
+            if velocity is not None and now is not None:
+                feats = velocity.record(user_id, merchant_id, qr.get("currency", ""), amount, now=now)
+
+            risk = scorer.evaluate(merchant_id, country, amount, user_id=user_id, velocity=feats)
+            memory.add_recent_merchant(merchant_id, country, user_id)
+
+            old = item["risk_result"].get("risk_level", "unknown")
+            new = risk["risk_level"]
+            old_levels[old] += 1
+            new_levels[new] += 1
+            if old != new:
+                transitions[f"{old}->{new}"] += 1
+
+            fx = item.get("fx_result") or {}
+            if "base_home" in fx and "total_home" in fx:
+                base_home = float(fx["base_home"])
+                fees = compute_fees(base_home, markup_pct, network_fee)
+                total = base_home + fees["markup_home"] + fees["network_fee_home"]
+                old_total += float(fx["total_home"])
+                new_total += total
+                max_fee_delta = max(max_fee_delta, abs(total - float(fx["total_home"])))
+
+            scans += 1
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "rules_version": rules.version,
+        "rows": rows,
+        "scans": scans,
+        "skipped_rows": skipped,
+        "old_levels": dict(old_levels),
+        "new_levels": dict(new_levels),
+        "changed": sum(transitions.values()),
+        "transitions": dict(transitions.most_common()),
+        "fees": {
+            "markup_pct": markup_pct,
+            "network_fee": network_fee,
+            "old_total_home": round(old_total, 2),
+            "new_total_home": round(new_total, 2),
+            "max_abs_delta": round(max_fee_delta, 2),
+        },
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"rules: {report['rules_version']}")
+    print(f"rows: {report['rows']:,}  scans: {report['scans']:,}  skipped rows: {report['skipped_rows']}")
+    print(f"{'level':<10}{'old':>10}{'new':>10}{'delta':>10}")
+    for level in sorted(set(report["old_levels"]) | set(report["new_levels"])):
+        old = report["old_levels"].get(level, 0)
+        new = report["new_levels"].get(level, 0)
+        print(f"{level:<10}{old:>10,}{new:>10,}{new - old:>+10,}")
+    print(f"changed: {report['changed']:,}")
+    for transition, n in report["transitions"].items():
+        print(f"  {transition:<18}{n:>8,}")
+    fees = report["fees"]
+    print(
+        f"fees (markup {fees['markup_pct']:.4f}, network {fees['network_fee']:.2f}): "
+        f"total {fees['old_total_home']:,.2f} -> {fees['new_total_home']:,.2f} "
+        f"(max per-scan delta {fees['max_abs_delta']:,.2f})"
+    )
+    print(
+        f"throughput: {report['rows_per_s']:,.0f} rows/s ({report['elapsed_s']}s)  "
+        f"peak RSS: {report['peak_rss_kb']:,} KiB"
+    )
+    if "peak_traced_kb" in report:
+        print(f"peak traced Python memory: {report['peak_traced_kb']:,.0f} KiB")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default="data/history.db")
+    ap.add_argument("--rules", default=None, help="candidate rule file (JSON); built-in rules if omitted")
+    ap.add_argument("--markup-pct", type=float, default=DEFAULT_MARKUP_PCT)
+    ap.add_argument("--network-fee", type=float, default=DEFAULT_NETWORK_FEE)
+    ap.add_argument("--batch-size", type=int, default=1000)
+    ap.add_argument("--no-velocity", action="store_true", help="don't rebuild velocity features")
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    ap.add_argument(
+        "--trace-memory", action="store_true",
+        help="also report tracemalloc peak (accurate, but slows the replay ~10x)",
+    )
+    args = ap.parse_args()
+
+    if args.rules:
+        candidate = RuleSet(args.rules).get()
+        if candidate.version == "builtin":
+            raise SystemExit(f"Could not load rules from {args.rules}")
+    else:
+        candidate = compile_rules({})
+
+    if args.trace_memory:
+        tracemalloc.start()
+    report = replay(
+        args.db,
+        candidate,
+        markup_pct=args.markup_pct,
+        network_fee=args.network_fee,
+        batch_size=args.batch_size,
+        with_velocity=not args.no_velocity,
+    )
+    report["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+    if args.trace_memory:
+        report["peak_traced_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
@@ -0,0 +1,214 @@
+import argparse
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Tiny in-memory server speaking the subset of the Redis protocol that
+# RedisBackend uses. For tests and local multi-worker runs without Redis:
+#
+#   python -m src.eval.resp_stub_server --port 6399
+#   STATE_BACKEND=redis://127.0.0.1:6399/0 uvicorn src.api.server:app --workers 4
+
+
+class _Store:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.kv: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.hashes: Dict[bytes, Dict[bytes, bytes]] = {}
+        self.hash_expires: Dict[bytes, float] = {}
+        # bumped on every write of a key; WATCH compares these at EXEC
+        self.versions: Dict[bytes, int] = {}
+
+    def touch(self, key: bytes) -> None:
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        hit = self.kv.get(key)
+        if hit is None:
+            return None
+        value, expires_at = hit
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.kv[key]
+            return None
+        return value
+
+    def hash(self, key: bytes) -> Dict[bytes, bytes]:
+        expires_at = self.hash_expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.hashes.pop(key, None)
+            del self.hash_expires[key]
+        return self.hashes.get(key, {})
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _array(values: List[bytes]) -> bytes:
+    return b"*%d\r\n" % len(values) + b"".join(_bulk(v) for v in values)
+
+
+def _execute(store: _Store, args: List[bytes]) -> bytes:
+    cmd = args[0].upper()
+    with store.lock:
+        if cmd == b"PING":
+            return b"+PONG\r\n"
+        if cmd in (b"SELECT", b"AUTH"):
+            return b"+OK\r\n"
+        if cmd == b"GET":
+            return _bulk(store.get(args[1]))
+        if cmd == b"SET":
+            expires_at = None
+            opts = [a.upper() for a in args[3:]]
+            for unit in (b"PX", b"EX"):
+                if unit in opts:
+                    n = float(args[3 + opts.index(unit) + 1])
+                    expires_at = time.monotonic() + (n / 1000 if unit == b"PX" else n)
+            if b"NX" in opts and store.get(args[1]) is not None:
+                return _bulk(None)
+            store.kv[args[1]] = (args[2], expires_at)
+            store.touch(args[1])
+            return b"+OK\r\n"
+        if cmd == b"DEL":
+            n = 0
+            for key in args[1:]:
+                n += (store.kv.pop(key, None) is not None) + (store.hashes.pop(key, None) is not None)
+                store.hash_expires.pop(key, None)
+                store.touch(key)
+            return b":%d\r\n" % n
+        if cmd == b"PEXPIRE":
+            key, expires_at = args[1], time.monotonic() + float(args[2]) / 1000
+            if store.get(key) is not None:
+                store.kv[key] = (store.kv[key][0], expires_at)
+            elif store.hash(key):
+                store.hash_expires[key] = expires_at
+            else:
+                return b":0\r\n"
+            store.touch(key)
+            return b":1\r\n"
+        if cmd == b"HGET":
+            return _bulk(store.hash(args[1]).get(args[2]))
+        if cmd == b"HSET":
+            store.hash(args[1])  # drop it first if expired
+            h = store.hashes.setdefault(args[1], {})
+            new = 0
+            for i in range(2, len(args) - 1, 2):
+                new += args[i] not in h
+                h[args[i]] = args[i + 1]
+            store.touch(args[1])
+            return b":%d\r\n" % new
+        if cmd == b"HSETNX":
+            if args[2] in store.hash(args[1]):
+                return b":0\r\n"
+            store.hashes.setdefault(args[1], {})[args[2]] = args[3]
+            store.touch(args[1])
+            return b":1\r\n"
+        if cmd == b"HDEL":
+            h = store.hash(args[1])
+            n = sum(1 for f in args[2:] if h.pop(f, None) is not None)
+            store.touch(args[1])
+            return b":%d\r\n" % n
+        if cmd == b"HGETALL":
+            flat: List[bytes] = []
+            for f, v in store.hash(args[1]).items():
+                flat += [f, v]
+            return _array(flat)
+        if cmd == b"HLEN":
+            return b":%d\r\n" % len(store.hash(args[1]))
+        if cmd == b"FLUSHDB":
+            store.kv.clear()
+            store.hashes.clear()
+            store.hash_expires.clear()
+            for key in list(store.versions):
+                store.touch(key)
+            return b"+OK\r\n"
+    return b"-ERR unknown command '%s'\r\n" % cmd
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """One client connection; also holds its WATCH / MULTI state."""
+
+    def _transaction(self, store: _Store, args: List[bytes]) -> Optional[bytes]:
+        cmd = args[0].upper()
+        if cmd == b"WATCH":
+            with store.lock:
+                for key in args[1:]:
+                    self.watched[key] = store.versions.get(key, 0)
+            return b"+OK\r\n"
+        if cmd == b"UNWATCH":
+            self.watched = {}
+            return b"+OK\r\n"
+        if cmd == b"MULTI":
+            self.queued = []
+            return b"+OK\r\n"
+        if cmd == b"DISCARD":
+            self.queued, self.watched = None, {}
+            return b"+OK\r\n"
+        if cmd == b"EXEC":
+            if self.queued is None:
+                return b"-ERR EXEC without MULTI\r\n"
+            queued, watched = self.queued, self.watched
+            self.queued, self.watched = None, {}
+            with store.lock:
+                if any(store.versions.get(k, 0) != v for k, v in watched.items()):
+                    return b"*-1\r\n"  # a watched key changed: nothing runs
+                replies = [_execute(store, q) for q in queued]
+            return b"*%d\r\n" % len(replies) + b"".join(replies)
+        if self.queued is not None:
+            self.queued.append(args)
+            return b"+QUEUED\r\n"
+        return None
+
+    def handle(self) -> None:
+        store = self.server.store  # type: ignore[attr-defined]
+        self.watched: Dict[bytes, int] = {}
+        self.queued: Optional[List[List[bytes]]] = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if not line.startswith(b"*"):
+                self.wfile.write(b"-ERR protocol error\r\n")
+                return
+            args: List[bytes] = []
+            for _ in range(int(line[1:-2])):
+                n = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(n + 2)[:-2])
+            reply = self._transaction(store, args)
+            self.wfile.write(reply if reply is not None else _execute(store, args))
+
+
+class RespStubServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.store = _Store()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> "RespStubServer":
+        threading.Thread(target=self.serve_forever, name="resp-stub", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=6399)
+    args = ap.parse_args()
+
+    server = RespStubServer(args.host, args.port)
+    print(f"RESP stand-in listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,203 @@
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Local stand-ins for the upstream APIs the scan path calls, so load tests
+# and local runs don't touch the internet:
+#
+#   GET  /convert?from=JPY&to=INR&amount=1         exchangerate.host
+#   GET  /v6/latest/JPY                             open.er-api.com
+#   POST /v1beta/models/<model>:generateContent     Gemini
+#
+# Each family (fx / gemini) has its own latency and fault injection.
+#
+#   python -m src.eval.upstream_stubs --port 8765 --gemini-latency-ms 400 --gemini-429-rate 0.05
+#   FX_API_URL=http://127.0.0.1:8765/convert GEMINI_API_BASE=http://127.0.0.1:8765/v1beta ... uvicorn src.api.server:app
+
+# Units per USD; cross rates are derived from these
+_USD_RATES = {
+    "USD": 1.0, "INR": 83.1, "JPY": 151.0, "THB": 36.1, "SGD": 1.35,
+    "AED": 3.67, "EUR": 0.92, "GBP": 0.79, "CNY": 7.24, "KRW": 1370.0,
+}
+
+
+@dataclass
+class Faults:
+    """Injected behaviour for one upstream family."""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0       # extra uniform 0..jitter_ms per request
+    error_rate: float = 0.0      # share of requests answered 500
+    rate_limit_rate: float = 0.0  # share answered 429 with Retry-After
+    retry_after: int = 1
+
+
+def cross_rate(from_cur: str, to_cur: str) -> float:
+    return _USD_RATES.get(to_cur.upper(), 1.0) / _USD_RATES.get(from_cur.upper(), 1.0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == "/convert":
+            if self._fault("fx"):
+                return
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            rate = cross_rate(q.get("from", ""), q.get("to", ""))
+            amount = float(q.get("amount", 1))
+            self._json(200, {"success": True, "query": q, "info": {"rate": rate}, "result": rate * amount})
+        elif url.path.startswith("/v6/latest/"):
+            if self._fault("fx"):
+                return
+            base = url.path.rsplit("/", 1)[-1].upper()
+            rates = {cur: cross_rate(base, cur) for cur in _USD_RATES}
+            self._json(200, {"result": "success", "base_code": base, "rates": rates})
+        else:
+            self._json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        path = urlsplit(self.path).path
+        if not (path.startswith("/v1beta/models/") and path.endswith(":generateContent")):
+            self._json(404, {"error": "not found"})
+            return
+        if self._fault("gemini"):
+            return
+        try:
+            prompt = json.loads(body)["contents"][0]["parts"][0]["text"]
+        except Exception:
+            self._json(400, {"error": {"code": 400, "message": "bad request"}})
+            return
+        text = f"Stand-in explanation for a {len(prompt)}-char prompt. Check the total and risk level above."
+        self._json(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]})
+
+    # ---------- helpers ----------
+    def _fault(self, family: str) -> bool:
+        """Apply latency and maybe answer with an injected error; True if answered."""
+        server: "UpstreamStubServer" = self.server  # type: ignore[assignment]
+        faults, roll, jitter = server.roll(family)
+        delay = faults.latency_ms + jitter * faults.jitter_ms
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if roll < faults.rate_limit_rate:
+            server.count(family, "rate_limited")
+            self._json(429, {"error": {"code": 429, "message": "stand-in rate limit"}},
+                       {"Retry-After": str(faults.retry_after)})
+            return True
+        if roll < faults.rate_limit_rate + faults.error_rate:
+            server.count(family, "errors")
+            self._json(500, {"error": {"code": 500, "message": "stand-in failure"}})
+            return True
+        server.count(family, "ok")
+        return False
+
+    def _json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class UpstreamStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        fx: Optional[Faults] = None,
+        gemini: Optional[Faults] = None,
+        seed: int = 0,
+    ):
+        super().__init__((host, port), _Handler)
+        # replaceable while running, e.g. to start an outage mid-test
+        self.faults = {"fx": fx or Faults(), "gemini": gemini or Faults()}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts = {family: {"ok": 0, "errors": 0, "rate_limited": 0} for family in self.faults}
+
+    def roll(self, family: str) -> Tuple[Faults, float, float]:
+        with self._lock:
+            return self.faults[family], self._rng.random(), self._rng.random()
+
+    def count(self, family: str, outcome: str) -> None:
+        with self._lock:
+            self._counts[family][outcome] += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {family: dict(c) for family, c in self._counts.items()}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Config overrides that point the app at this server."""
+        return {
+            "FX_API_URL": f"{self.url}/convert",
+            "FX_ER_API_BASE": f"{self.url}/v6/latest/",
+            "GEMINI_API_BASE": f"{self.url}/v1beta",
+        }
+
+    def start(self) -> "UpstreamStubServer":
+        threading.Thread(target=self.serve_forever, name="upstream-stub", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def add_fault_args(ap: argparse.ArgumentParser) -> None:
+    for family in ("fx", "gemini"):
+        ap.add_argument(f"--{family}-latency-ms", type=float, default=0.0)
+        ap.add_argument(f"--{family}-jitter-ms", type=float, default=0.0)
+        ap.add_argument(f"--{family}-error-rate", type=float, default=0.0)
+        ap.add_argument(f"--{family}-429-rate", type=float, default=0.0)
+        ap.add_argument(f"--{family}-retry-after", type=int, default=1)
+
+
+def faults_from_args(args: argparse.Namespace, family: str) -> Faults:
+    return Faults(
+        latency_ms=getattr(args, f"{family}_latency_ms"),
+        jitter_ms=getattr(args, f"{family}_jitter_ms"),
+        error_rate=getattr(args, f"{family}_error_rate"),
+        rate_limit_rate=getattr(args, f"{family}_429_rate"),
+        retry_after=getattr(args, f"{family}_retry_after"),
+    )
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--seed", type=int, default=0)
+    add_fault_args(ap)
+    args = ap.parse_args()
+
+    server = UpstreamStubServer(
+        args.host, args.port, fx=faults_from_args(args, "fx"), gemini=faults_from_args(args, "gemini"), seed=args.seed
+    )
+    print(f"Upstream stand-ins listening on {server.url}; point the API at them with:")
+    for k, v in server.env().items():
+        print(f"  export {k}={v}")
+    print("  export GEMINI_API_KEY=stand-in")
+    server.serve_forever()
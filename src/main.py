@@ -1,6 +1,7 @@
 from src.orchestration.orchestrator_agent import OrchestratorAgent
 from src.orchestration.session_manager import InMemorySessionService
 from src.orchestration.memory_manager import SimpleMemoryBank
+from src.persistence.profile_store import ProfileStore
 from src.observability.logging_config import setup_logging
 
 
@@ -8,11 +9,11 @@ def main():
     setup_logging()
 
     sessions = InMemorySessionService()
-    memory = SimpleMemoryBank()
+    memory = SimpleMemoryBank(profiles=ProfileStore())
 
     # Seed user profile
     user_id = "user-123"
-    memory.upsert_profile(user_id, {
+    memory.seed_profile(user_id, {
         "home_currency": "INR",
         "preferred_card": "VISA_CREDIT",
         "risk_preference": "balanced",
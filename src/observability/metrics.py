@@ -0,0 +1,86 @@
+import threading
+from collections import deque
+from typing import Any, Callable, Dict
+
+
+class LatencyStat:
+    """
+    Rolling latency summary: lifetime count/avg/max plus p50/p95 over the
+    last `window` samples.
+    """
+
+    def __init__(self, window: int = 1024):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        with self._lock:
+            self._samples.append(ms)
+            self.count += 1
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total, max_ms = self.count, self.total_ms, self.max_ms
+
+        def _pct(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "count": count,
+            "avg_ms": round(total / count, 3) if count else 0.0,
+            "p50_ms": round(_pct(0.50), 3),
+            "p95_ms": round(_pct(0.95), 3),
+            "max_ms": round(max_ms, 3),
+        }
+
+
+class MetricsRegistry:
+    """
+    Process-local metrics: latency stats, plain gauges, and callback gauges
+    that are read at snapshot time (e.g. queue depth).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, LatencyStat] = {}
+        self._gauges: Dict[str, Any] = {}
+        self._gauge_fns: Dict[str, Callable[[], Any]] = {}
+
+    def latency(self, name: str) -> LatencyStat:
+        stat = self._latencies.get(name)
+        if stat is None:
+            with self._lock:
+                stat = self._latencies.setdefault(name, LatencyStat())
+        return stat
+
+    def set_gauge(self, name: str, value: Any) -> None:
+        self._gauges[name] = value
+
+    def register_gauge(self, name: str, fn: Callable[[], Any]) -> None:
+        self._gauge_fns[name] = fn
+
+    def snapshot(self) -> Dict[str, Any]:
+        gauges = dict(self._gauges)
+        for name, fn in list(self._gauge_fns.items()):
+            try:
+                gauges[name] = fn()
+            except Exception as e:
+                gauges[name] = f"error: {e}"
+
+        return {
+            "gauges": gauges,
+            "latency": {name: stat.snapshot() for name, stat in list(self._latencies.items())},
+        }
+
+
+# Shared registry for the process
+metrics = MetricsRegistry()
@@ -1,30 +1,249 @@
-from typing import Dict, Any, List
-from collections import deque
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional
+
+from src.config import MERCHANT_HISTORY_TTL_SECONDS
+
+
+class MerchantSeen:
+    """Per-user merchant familiarity record."""
+
+    __slots__ = ("country", "first_seen", "last_seen", "count")
+
+    def __init__(self, country: str, now: float):
+        self.country = country
+        self.first_seen = now
+        self.last_seen = now
+        self.count = 1
+
+    def to_dict(self, merchant_id: str) -> Dict[str, Any]:
+        return {
+            "merchant_id": merchant_id,
+            "country": self.country,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "count": self.count,
+        }
 
 
 class SimpleMemoryBank:
     """
     Very simple long-term memory store.
-    - user_profiles: stores user preferences
-    - merchant_history: stores recent merchants seen (for risk scoring)
+    - user_profiles: stores user preferences (in a ProfileStore - durable,
+      LRU-cached - when one is passed, else in this dict)
+    - merchant index: per user, merchant_id -> last seen / count (for risk scoring)
+
+    The merchant index is two levels of OrderedDict (hash map + recency list):
+    users in least-recently-active order, and per user the merchants in
+    least-recently-seen order. Lookups are O(1); each user keeps at most
+    max_merchants entries and idle users are evicted past max_users.
+
+    Thread safety: the outer user list has its own lock, held only for the
+    O(1) lookup/reorder. Per-user data is guarded by one of `stripes` locks
+    chosen by user id, so requests for different users rarely contend.
     """
 
-    def __init__(self, max_merchants: int = 50):
+    def __init__(self, max_merchants: int = 50, max_users: int = 10_000, stripes: int = 64, profiles=None):
+        self.profiles = profiles
         self.user_profiles: Dict[str, Dict[str, Any]] = {}
-        self._recent_merchants = deque(maxlen=max_merchants)
+        self.max_merchants = max_merchants
+        self.max_users = max_users
+        self._merchant_index: "OrderedDict[str, OrderedDict[str, MerchantSeen]]" = OrderedDict()
+        self._users_lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+
+    def _stripe(self, user_id: str) -> threading.Lock:
+        return self._stripes[hash(user_id) % len(self._stripes)]
+
+    # ---------- Profiles ----------
+    def upsert_profile(self, user_id: str, profile: Dict[str, Any]) -> None:
+        if self.profiles is not None:
+            self.profiles.upsert(user_id, profile)
+            return
+        with self._stripe(user_id):
+            existing = self.user_profiles.get(user_id, {})
+            existing.update(profile)
+            self.user_profiles[user_id] = existing
+
+    def get_profile(self, user_id: str) -> Dict[str, Any]:
+        return self.find_profile(user_id) or {}
+
+    def find_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """The profile, or None if the user has none."""
+        if self.profiles is not None:
+            return self.profiles.get(user_id)
+        return self.user_profiles.get(user_id)
+
+    def replace_profile(self, user_id: str, profile: Dict[str, Any]) -> None:
+        if self.profiles is not None:
+            self.profiles.replace(user_id, profile)
+            return
+        with self._stripe(user_id):
+            self.user_profiles[user_id] = dict(profile)
+
+    def seed_profile(self, user_id: str, profile: Dict[str, Any]) -> bool:
+        """Create the profile only if absent (edits survive restarts); True if created."""
+        if self.profiles is not None:
+            return self.profiles.seed(user_id, profile)
+        with self._stripe(user_id):
+            if user_id in self.user_profiles:
+                return False
+            self.user_profiles[user_id] = dict(profile)
+            return True
+
+    def delete_profile(self, user_id: str) -> bool:
+        if self.profiles is not None:
+            return self.profiles.delete(user_id)
+        with self._stripe(user_id):
+            return self.user_profiles.pop(user_id, None) is not None
+
+    # ---------- Merchant History ----------
+    def _user_index(self, user_id: str, create: bool) -> Optional["OrderedDict[str, MerchantSeen]"]:
+        with self._users_lock:
+            index = self._merchant_index.get(user_id)
+            if index is not None:
+                self._merchant_index.move_to_end(user_id)
+                return index
+            if not create:
+                return None
+
+            index = OrderedDict()
+            self._merchant_index[user_id] = index
+            while len(self._merchant_index) > self.max_users:
+                self._merchant_index.popitem(last=False)  # least recently active user
+            return index
+
+    def add_recent_merchant(self, merchant_id: str, country: str, user_id: str = "") -> None:
+        now = time.time()
+        with self._stripe(user_id):
+            index = self._user_index(user_id, create=True)
+
+            seen = index.get(merchant_id)
+            if seen is None:
+                index[merchant_id] = MerchantSeen(country, now)
+                if len(index) > self.max_merchants:
+                    index.popitem(last=False)  # least recently seen merchant
+                return
+
+            seen.country = country
+            seen.last_seen = now
+            seen.count += 1
+            index.move_to_end(merchant_id)
+
+    def has_recent_merchant(self, merchant_id: str, user_id: str = "") -> bool:
+        index = self._user_index(user_id, create=False)
+        return index is not None and merchant_id in index
+
+    def get_merchant_stats(self, merchant_id: str, user_id: str = "") -> Optional[Dict[str, Any]]:
+        index = self._user_index(user_id, create=False)
+        seen = index.get(merchant_id) if index is not None else None
+        return seen.to_dict(merchant_id) if seen is not None else None
+
+    def get_recent_merchants(self, user_id: str = "") -> List[Dict[str, Any]]:
+        """Most recently seen first."""
+        with self._stripe(user_id):
+            index = self._merchant_index.get(user_id)
+            if not index:
+                return []
+            return [seen.to_dict(mid) for mid, seen in reversed(index.items())]
+
+
+class SharedMemoryBank:
+    """
+    SimpleMemoryBank on a shared StateBackend, so profiles and merchant
+    familiarity are the same in every API worker.
+
+    - profile:<user>    -> JSON profile
+    - merchants:<user>  -> hash of merchant_id -> JSON MerchantSeen record,
+                           expiring merchant_ttl seconds after the user's
+                           last scan
+
+    Every read-modify-write is a compare-and-set on the backend (see
+    StateBackend.update), so two workers updating the same profile or
+    merchant record both land. Each user keeps at most max_merchants
+    entries; when a new merchant pushes past the cap, the least recently
+    seen ones are dropped.
+    """
+
+    def __init__(self, backend, max_merchants: int = 50, clock: Callable[[], float] = time.time,
+                 merchant_ttl: float = MERCHANT_HISTORY_TTL_SECONDS):
+        self.backend = backend
+        self.max_merchants = max_merchants
+        self.merchant_ttl = merchant_ttl
+        self._clock = clock
 
     # ---------- Profiles ----------
     def upsert_profile(self, user_id: str, profile: Dict[str, Any]) -> None:
-        existing = self.user_profiles.get(user_id, {})
-        existing.update(profile)
-        self.user_profiles[user_id] = existing
+        def _merge(current: Optional[str]) -> str:
+            merged = json.loads(current) if current else {}
+            merged.update(profile)
+            return json.dumps(merged)
+
+        self.backend.update(f"profile:{user_id}", _merge)
 
     def get_profile(self, user_id: str) -> Dict[str, Any]:
-        return self.user_profiles.get(user_id, {})
+        return self.find_profile(user_id) or {}
+
+    def find_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.backend.get(f"profile:{user_id}")
+        return json.loads(raw) if raw else None
+
+    def replace_profile(self, user_id: str, profile: Dict[str, Any]) -> None:
+        self.backend.set(f"profile:{user_id}", json.dumps(profile))
+
+    def seed_profile(self, user_id: str, profile: Dict[str, Any]) -> bool:
+        # set-if-absent: of several workers seeding at once, exactly one writes
+        return self.backend.cas(f"profile:{user_id}", None, json.dumps(profile))
+
+    def delete_profile(self, user_id: str) -> bool:
+        if self.backend.get(f"profile:{user_id}") is None:
+            return False
+        self.backend.delete(f"profile:{user_id}")
+        return True
 
     # ---------- Merchant History ----------
-    def add_recent_merchant(self, merchant_id: str, country: str) -> None:
-        self._recent_merchants.appendleft({"merchant_id": merchant_id, "country": country})
+    def add_recent_merchant(self, merchant_id: str, country: str, user_id: str = "") -> None:
+        key = f"merchants:{user_id}"
+        now = self._clock()
+
+        def _bump(raw: Optional[str]) -> str:
+            if raw is None:
+                rec = {"country": country, "first_seen": now, "last_seen": now, "count": 1}
+            else:
+                rec = json.loads(raw)
+                rec.update(country=country, last_seen=now, count=rec.get("count", 0) + 1)
+            return json.dumps(rec)
+
+        previous, _ = self.backend.hupdate(key, merchant_id, _bump)
+        if self.merchant_ttl > 0:
+            self.backend.expire(key, self.merchant_ttl)  # idle users' indexes age out
+        if previous is None and self.backend.hlen(key) > self.max_merchants:
+            self._prune(key)
+
+    def _prune(self, key: str) -> None:
+        entries = self.backend.hgetall(key)
+        by_age = sorted(entries, key=lambda mid: json.loads(entries[mid])["last_seen"])
+        self.backend.hdel(key, *by_age[: len(entries) - self.max_merchants])
+
+    def has_recent_merchant(self, merchant_id: str, user_id: str = "") -> bool:
+        return self.backend.hget(f"merchants:{user_id}", merchant_id) is not None
+
+    def get_merchant_stats(self, merchant_id: str, user_id: str = "") -> Optional[Dict[str, Any]]:
+        raw = self.backend.hget(f"merchants:{user_id}", merchant_id)
+        if raw is None:
+            return None
+        rec = json.loads(raw)
+        rec["merchant_id"] = merchant_id
+        return rec
 
-    def get_recent_merchants(self) -> List[Dict[str, Any]]:
-        return list(self._recent_merchants)
+    def get_recent_merchants(self, user_id: str = "") -> List[Dict[str, Any]]:
+        """Most recently seen first."""
+        recs = []
+        for mid, raw in self.backend.hgetall(f"merchants:{user_id}").items():
+            rec = json.loads(raw)
+            rec["merchant_id"] = mid
+            recs.append(rec)
+        recs.sort(key=lambda r: r["last_seen"], reverse=True)
+        return recs
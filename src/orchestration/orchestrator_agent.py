@@ -1,20 +1,49 @@
+import itertools
 import logging
-from typing import Dict, Any, List, Optional
+from dataclasses import dataclass
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
 
 from src.agents.qr_image_agent import QRImageAgent
 from src.agents.qr_parser_agent import QRParserAgent
 from src.agents.fx_rate_agent import FXRateAgent
 from src.agents.risk_guard_agent import RiskGuardAgent
+from src.agents.merchant_blocklist import default_blocklist
 
-from src.orchestration.session_manager import InMemorySessionService, compact_history
+from src.orchestration.session_manager import InMemorySessionService, SessionState
 from src.orchestration.memory_manager import SimpleMemoryBank
+from src.orchestration.velocity_tracker import VelocityTracker
 
 from src.tools.gemini_http_client import call_gemini, GeminiHTTPError
-from src.config import HOME_CURRENCY
+from src.tools.deadline import Deadline
+from src.tools.decode_qr_image_tool import DecodePool
+from src.config import HOME_CURRENCY, BULK_DECODE_WORKERS
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class ScanContext:
+    """
+    What a scan needs besides its payload: the session and the user's
+    profile-derived settings. Built once per HTTP request, or once per
+    WebSocket scan session and reused for every scan on it.
+
+    deadline, if set, is the current request's budget; FX, Gemini and the
+    image decoder each only use what is left of it.
+    """
+    user_id: str
+    state: SessionState
+    home_currency: str
+    system_prompt: str
+    user_country: Optional[str] = None
+    deadline: Optional[Deadline] = None
+
+    @property
+    def session_id(self) -> str:
+        return self.state.session_id
+
+
 class OrchestratorAgent:
     def __init__(self, session_service: InMemorySessionService, memory_bank: SimpleMemoryBank):
         self.sessions = session_service
@@ -22,8 +51,11 @@ class OrchestratorAgent:
 
         self.qr_agent = QRParserAgent()
         self.fx_agent = FXRateAgent()                 # live-first (fallback only if live fails)
-        self.risk_agent = RiskGuardAgent(memory_bank)
+        self.risk_agent = RiskGuardAgent(memory_bank, blocklist=default_blocklist())
         self.qr_image_agent = QRImageAgent()
+        self.velocity = VelocityTracker()
+        # bulk decode threads: started and warmed at app startup, reused by every bulk scan
+        self.decode_pool = DecodePool(BULK_DECODE_WORKERS)
 
     # -------------------------
     # Prompt building
@@ -69,6 +101,28 @@ class OrchestratorAgent:
             "Recommendation: Proceed only if this total and risk level match your expectation."
         )
 
+    # -------------------------
+    # Scan context
+    # -------------------------
+    def open_context(
+        self,
+        user_id: str,
+        session_id: str,
+        user_country: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> ScanContext:
+        """Resolve session and profile once, for one scan or a whole scan session."""
+        state = self._get_or_create_session(session_id)
+        user_profile = self.memory.get_profile(user_id) or {}
+        return ScanContext(
+            user_id=user_id,
+            state=state,
+            home_currency=user_profile.get("home_currency", HOME_CURRENCY),
+            system_prompt=self._build_system_prompt(user_profile, user_country),
+            user_country=user_country,
+            deadline=deadline,
+        )
+
     # -------------------------
     # Main: TEXT QR scan
     # -------------------------
@@ -78,32 +132,47 @@ class OrchestratorAgent:
         session_id: str,
         qr_payload: str,
         user_country: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
     ) -> Dict[str, Any]:
-        state = self._get_or_create_session(session_id)
+        ctx = self.open_context(user_id, session_id, user_country, deadline)
+        return self.scan(ctx, qr_payload)
 
-        user_profile = self.memory.get_profile(user_id) or {}
-        home_currency = user_profile.get("home_currency", HOME_CURRENCY)
-        system_prompt = self._build_system_prompt(user_profile, user_country)
+    def scan(self, ctx: ScanContext, qr_payload: str) -> Dict[str, Any]:
+        """Full scan in an open context: score() then explain()."""
+        qr_payload = (qr_payload or "").strip()
+        result = self.score(ctx, qr_payload)
+        if "message" not in result:
+            result["message"] = self.explain(ctx, qr_payload, result)
+        return result
 
+    def score(self, ctx: ScanContext, qr_payload: str) -> Dict[str, Any]:
+        """
+        Parse, convert and risk-score a payload; no LLM call and no session
+        turns. Results that need an explanation come back without "message"
+        (see explain()); empty input comes back with one.
+        """
+        user_id = ctx.user_id
         qr_payload = (qr_payload or "").strip()
         if not qr_payload:
             return {
-                "session_id": state.session_id,
-                "user_country": user_country,
+                "session_id": ctx.session_id,
+                "user_country": ctx.user_country,
                 "error": "Empty QR payload",
                 "message": "Please provide a QR payload.",
             }
 
         # 1) Parse QR payload (single or multi)
-        qr_info = self.qr_agent.handle(qr_payload)
+        # Items are parsed lazily; peek two to tell single from multi.
+        qr_items = self.qr_agent.iter_items(qr_payload)
+        first = next(qr_items, None)
+        second = next(qr_items, None) if first is not None else None
 
         # ---------- MULTI-QR ----------
-        if isinstance(qr_info, dict) and qr_info.get("multiple") is True:
-            items: List[Dict[str, Any]] = qr_info.get("items", [])
-            if not items:
+        if second is not None or first is None:
+            if first is None:
                 return {
-                    "session_id": state.session_id,
-                    "user_country": user_country,
+                    "session_id": ctx.session_id,
+                    "user_country": ctx.user_country,
                     "multiple": True,
                     "count": 0,
                     "items": [],
@@ -111,108 +180,148 @@ class OrchestratorAgent:
                     "message": "No valid QR items found in the provided input.",
                 }
 
+            items = list(itertools.chain((first, second), qr_items))
+            valid = [item for item in items if "error" not in item]
+
+            # Risk is scored for all valid items in one batch. Velocity is
+            # recorded per item first, so item k sees items 0..k as the
+            # scalar loop did; merchants are remembered after scoring.
+            velocities = [
+                self.velocity.record(user_id, item["merchant_id"], item["currency"], item["amount"])
+                for item in valid
+            ]
+            risks = iter(self.risk_agent.handle_many(valid, user_id=user_id, velocities=velocities))
+            for item in valid:
+                self.memory.add_recent_merchant(item["merchant_id"], item["country"], user_id)
+
             results = []
             total_home_sum = 0.0
-            any_high = False
+            error_count = 0
 
             for item in items:
+                if "error" in item:
+                    # Bad item: report it, keep going with the rest
+                    error_count += 1
+                    results.append({"qr_info": item, "error": item["error"]})
+                    continue
+
                 fx = self.fx_agent.handle(
                     amount_local=item["amount"],
                     local_currency=item["currency"],
-                    home_currency=home_currency,
+                    home_currency=ctx.home_currency,
+                    deadline=ctx.deadline,
                 )
-                risk = self.risk_agent.handle(
-                    merchant_id=item["merchant_id"],
-                    country=item["country"],
-                    amount=item["amount"],
-                )
-                self.memory.add_recent_merchant(item["merchant_id"], item["country"])
-
                 total_home_sum += float(fx.get("total_home", 0.0) or 0.0)
 
-                rl = risk.get("risk_level") or "unknown"
-                if rl in ("high", "critical"):
-                    any_high = True
-
                 results.append({
                     "qr_info": item,
                     "fx_result": fx,
-                    "risk_result": risk,
+                    "risk_result": next(risks),
                 })
 
-            state.history = compact_history(state.history)
-            state.history.append({"role": "user", "content": f"User scanned MULTI QR: {qr_payload}"})
-
-            tool_summary = f"Multi-QR results: {results}\nTotal home sum: {total_home_sum}\n"
-            convo_text = "\n".join(f"{m['role']}: {m['content']}" for m in state.history)
-
-            prompt = (
-                system_prompt
-                + "\n\nConversation so far:\n"
-                + convo_text
-                + "\n\n---\nTool results:\n"
-                + tool_summary
-                + "\n\nNow respond with: a short summary, total cost in home currency, "
-                  "and a warning if any transaction is high-risk."
-            )
-
-            try:
-                response_text = call_gemini(prompt)
-            except GeminiHTTPError as e:
-                logger.error("Gemini HTTP call failed (multi): %s", e)
-                warning = "⚠️ One or more transactions appear high-risk.\n\n" if any_high else ""
-                response_text = (
-                    f"{warning}You scanned **{len(results)}** QR payments.\n\n"
-                    f"**Total estimated charge: {total_home_sum:.2f} {home_currency}**\n"
-                    "Open the JSON details to see per-QR breakdowns."
-                )
-
-            state.history.append({"role": "assistant", "content": response_text})
-            self.sessions.update_session(state)
-
             return {
-                "session_id": state.session_id,
-                "user_country": user_country,
+                "session_id": ctx.session_id,
+                "user_country": ctx.user_country,
                 "multiple": True,
                 "count": len(results),
+                "errors": error_count,
                 "items": results,
                 "total_home": total_home_sum,
-                "message": response_text,
             }
 
         # ---------- SINGLE-QR ----------
-        if not isinstance(qr_info, dict):
-            raise ValueError("QR parser returned invalid format (expected dict).")
+        qr_info = first
+        if "error" in qr_info:
+            raise ValueError(qr_info["error"])
 
         logger.info("Decoded QR: %s", qr_info)
 
         fx_result = self.fx_agent.handle(
             amount_local=qr_info["amount"],
             local_currency=qr_info["currency"],
-            home_currency=home_currency,
+            home_currency=ctx.home_currency,
+            deadline=ctx.deadline,
         )
         logger.info("FX result: %s", fx_result)
 
+        velocity = self.velocity.record(user_id, qr_info["merchant_id"], qr_info["currency"], qr_info["amount"])
         risk_result = self.risk_agent.handle(
             merchant_id=qr_info["merchant_id"],
             country=qr_info["country"],
             amount=qr_info["amount"],
+            user_id=user_id,
+            velocity=velocity,
         )
-        self.memory.add_recent_merchant(qr_info["merchant_id"], qr_info["country"])
+        self.memory.add_recent_merchant(qr_info["merchant_id"], qr_info["country"], user_id)
         logger.info("Risk result: %s", risk_result)
 
-        state.history = compact_history(state.history)
-        state.history.append({"role": "user", "content": f"User scanned QR: {qr_payload}"})
+        return {
+            "session_id": ctx.session_id,
+            "user_country": ctx.user_country,
+            "qr_info": qr_info,
+            "fx_result": fx_result,
+            "risk_result": risk_result,
+        }
+
+    def explain(self, ctx: ScanContext, qr_payload: str, result: Dict[str, Any]) -> str:
+        """LLM explanation of a score() result; records both turns in the session."""
+        state = ctx.state
+
+        # ---------- MULTI-QR ----------
+        if result.get("multiple"):
+            results = result["items"]
+            total_home_sum = result["total_home"]
+            error_count = result.get("errors", 0)
+
+            state.add_message("user", f"User scanned MULTI QR: {qr_payload}")
+
+            tool_summary = f"Multi-QR results: {results}\nTotal home sum: {total_home_sum}\n"
+            convo_text = state.conversation_text()
+
+            prompt = (
+                ctx.system_prompt
+                + "\n\nConversation so far:\n"
+                + convo_text
+                + "\n\n---\nTool results:\n"
+                + tool_summary
+                + "\n\nNow respond with: a short summary, total cost in home currency, "
+                  "and a warning if any transaction is high-risk."
+            )
+
+            try:
+                response_text = call_gemini(prompt, deadline=ctx.deadline)
+            except GeminiHTTPError as e:
+                logger.error("Gemini HTTP call failed (multi): %s", e)
+                any_high = any(
+                    (it["risk_result"].get("risk_level") or "unknown") in ("high", "critical")
+                    for it in results if "risk_result" in it
+                )
+                warning = "⚠️ One or more transactions appear high-risk.\n\n" if any_high else ""
+                skipped = f"{error_count} item(s) could not be parsed and were skipped.\n" if error_count else ""
+                response_text = (
+                    f"{warning}You scanned **{len(results) - error_count}** QR payments.\n\n"
+                    f"**Total estimated charge: {total_home_sum:.2f} {ctx.home_currency}**\n"
+                    f"{skipped}"
+                    "Open the JSON details to see per-QR breakdowns."
+                )
+
+            state.add_message("assistant", response_text)
+            self.sessions.update_session(state)
+            return response_text
+
+        # ---------- SINGLE-QR ----------
+        qr_info, fx_result, risk_result = result["qr_info"], result["fx_result"], result["risk_result"]
+        state.add_message("user", f"User scanned QR: {qr_payload}")
 
         tool_summary = (
             f"Decoded QR: {qr_info}\n"
             f"FX result: {fx_result}\n"
             f"Risk result: {risk_result}\n"
         )
-        convo_text = "\n".join(f"{m['role']}: {m['content']}" for m in state.history)
+        convo_text = state.conversation_text()
 
         prompt = (
-            system_prompt
+            ctx.system_prompt
             + "\n\nConversation so far:\n"
             + convo_text
             + "\n\n---\nTool results:\n"
@@ -221,22 +330,14 @@ class OrchestratorAgent:
         )
 
         try:
-            response_text = call_gemini(prompt)
+            response_text = call_gemini(prompt, deadline=ctx.deadline)
         except GeminiHTTPError as e:
             logger.error("Gemini HTTP call failed: %s", e)
             response_text = self._fallback_message(fx_result, risk_result)
 
-        state.history.append({"role": "assistant", "content": response_text})
+        state.add_message("assistant", response_text)
         self.sessions.update_session(state)
-
-        return {
-            "session_id": state.session_id,
-            "user_country": user_country,
-            "qr_info": qr_info,
-            "fx_result": fx_result,
-            "risk_result": risk_result,
-            "message": response_text,
-        }
+        return response_text
 
     # -------------------------
     # Image QR scan
@@ -247,14 +348,28 @@ class OrchestratorAgent:
         session_id: str,
         image_path: str,
         user_country: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
     ) -> Dict[str, Any]:
         """
         1) Decode QR text from image
         2) Normalize weird types (list, list-string)
         3) Reuse handle_qr_scan for full flow
         """
-        qr_payload = self.qr_image_agent.handle(image_path)
+        qr_payload = self._normalize_image_payload(self.qr_image_agent.handle(image_path, deadline))
 
+        return self.handle_qr_scan(
+            user_id=user_id,
+            session_id=session_id,
+            qr_payload=qr_payload,
+            user_country=user_country,
+            deadline=deadline,
+        )
+
+    def decode_image_bytes(self, data: bytes, deadline: Optional[Deadline] = None) -> str:
+        """QR payload text from in-memory image bytes ("" if none found)."""
+        return self._normalize_image_payload(self.qr_image_agent.handle_bytes(data, deadline))
+
+    def _normalize_image_payload(self, qr_payload: Any) -> str:
         # qr_payload might be a list OR a string OR a weird repr string like "['QR:..']"
         if isinstance(qr_payload, (list, tuple)):
             qr_payload = ",".join([str(x).strip() for x in qr_payload if str(x).strip()])
@@ -271,9 +386,70 @@ class OrchestratorAgent:
             inner = inner.strip().strip("'").strip('"')
             qr_payload = inner
 
-        return self.handle_qr_scan(
-            user_id=user_id,
-            session_id=session_id,
-            qr_payload=qr_payload,
-            user_country=user_country,
-        )
+        return qr_payload
+
+    # -------------------------
+    # Bulk image QR scan
+    # -------------------------
+    def handle_bulk_image_scan(
+        self,
+        user_id: str,
+        session_id: str,
+        images: Iterable[Tuple[str, Union[bytes, Exception]]],
+        user_country: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Decode many images in parallel and run each payload through the normal
+        text flow. Yields one result dict per image as soon as it's ready
+        (completion order, not input order).
+
+        - Decoding runs on self.decode_pool, shared by all bulk requests.
+        - images is consumed lazily; at most ~2x the pool's workers images
+          are in flight, so a large archive is never fully buffered.
+        - A failure on one image (unreadable, no QR, bad payload) is reported
+          in that image's result and never aborts the batch.
+        - OpenCV releases the GIL, so decoding scales across threads. The
+          orchestration step itself runs on the consuming thread, one file
+          at a time, reusing a single scan context (session + profile) for
+          the whole batch.
+        - deadline, if set, bounds the whole request: decodes and scans
+          after it has passed fail their own line instead of running.
+        """
+        ctx = self.open_context(user_id, session_id, user_country, deadline)
+        max_in_flight = self.decode_pool.workers * 2
+
+        def _decode(data: Union[bytes, Exception]) -> str:
+            if isinstance(data, Exception):
+                raise data
+            return self.decode_image_bytes(data, deadline)
+
+        def _scan(name: str, fut) -> Dict[str, Any]:
+            try:
+                qr_payload = fut.result()
+                if not qr_payload:
+                    raise ValueError("No QR code found in image")
+                result = self.scan(ctx, qr_payload)
+                return {"file": name, "ok": "error" not in result, "result": result}
+            except Exception as e:
+                logger.warning("Bulk scan failed for %s: %s", name, e)
+                return {"file": name, "ok": False, "error": str(e)}
+
+        pending: Dict[Any, str] = {}
+        pool = self.decode_pool
+        try:
+            for name, data in images:
+                pending[pool.submit(_decode, data)] = name
+                if len(pending) < max_in_flight:
+                    continue
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield _scan(pending.pop(fut), fut)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield _scan(pending.pop(fut), fut)
+        finally:
+            for fut in pending:  # client went away: don't decode the rest on the shared pool
+                fut.cancel()
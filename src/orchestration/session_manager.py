@@ -1,43 +1,422 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
 from dataclasses import dataclass, field
-from typing import List, Dict, Any
+from typing import Callable, Deque, List, Dict, Any, Optional, Tuple
+import json
+import logging
+import sys
+import threading
 import uuid
 import time
 
+from src.config import (
+    SESSION_HISTORY_MESSAGES,
+    SESSION_MAX_ENTRIES,
+    SESSION_MESSAGE_MAX_CHARS,
+    SESSION_SWEEP_INTERVAL,
+    SESSION_TTL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rolling summary: how many evicted scans to quote, and how much of each
+SUMMARY_RECENT_SCANS = 3
+SUMMARY_SNIPPET_CHARS = 120
+
+
+class Message:
+    """One conversation turn."""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+
+class MessageRing:
+    """
+    Fixed-capacity ring of Messages, oldest first. append() is O(1) and
+    returns the message it pushed out (if any).
+    """
+
+    __slots__ = ("capacity", "_buf", "_start", "_len")
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._buf: List[Optional[Message]] = [None] * self.capacity
+        self._start = 0
+        self._len = 0
+
+    def append(self, msg: Message) -> Optional[Message]:
+        if self._len < self.capacity:
+            self._buf[(self._start + self._len) % self.capacity] = msg
+            self._len += 1
+            return None
+        evicted = self._buf[self._start]
+        self._buf[self._start] = msg
+        self._start = (self._start + 1) % self.capacity
+        return evicted
+
+    def clear(self) -> None:
+        self._buf = [None] * self.capacity
+        self._start = self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self):
+        buf, cap, start = self._buf, self.capacity, self._start
+        for i in range(self._len):
+            yield buf[(start + i) % cap]
+
+
+class RollingSummary:
+    """
+    Running digest of turns that fell out of the ring: counts plus the last
+    few evicted scans. Updated per eviction in O(1), bounded in size.
+    """
+
+    __slots__ = ("scans", "replies", "recent")
+
+    def __init__(self, scans: int = 0, replies: int = 0, recent: Optional[List[str]] = None):
+        self.scans = scans
+        self.replies = replies
+        self.recent: Deque[str] = deque(recent or (), maxlen=SUMMARY_RECENT_SCANS)
+
+    def add(self, msg: Message) -> None:
+        if msg.role == "user":
+            self.scans += 1
+            self.recent.append(msg.content[:SUMMARY_SNIPPET_CHARS])
+        else:
+            self.replies += 1
+
+    def text(self) -> str:
+        if not (self.scans or self.replies):
+            return ""
+        text = f"(Earlier in this session: {self.scans} scan(s), {self.replies} assistant replies."
+        if self.recent:
+            text += " Most recent earlier scans: " + "; ".join(self.recent) + "."
+        return text + ")"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"scans": self.scans, "replies": self.replies, "recent": list(self.recent)}
+
 
 @dataclass
 class SessionState:
     session_id: str
-    history: List[Dict[str, str]] = field(default_factory=list)
     last_qr_summary: str = ""
     status: str = "IDLE"
     metadata: Dict[str, Any] = field(default_factory=dict)
     created_at: float = field(default_factory=time.time)
+    messages: MessageRing = field(default_factory=lambda: MessageRing(SESSION_HISTORY_MESSAGES))
+    summary: RollingSummary = field(default_factory=RollingSummary)
+    # per-session lock: concurrent requests on one session append turns safely
+    lock: threading.RLock = field(default_factory=threading.RLock, repr=False, compare=False)
+    # SharedSessionService bookkeeping for compare-and-set: the record this
+    # state was loaded from / last saved as (None = new or wholesale
+    # replaced), and how many turns were added since
+    stored_as: Optional[str] = field(default=None, repr=False, compare=False)
+    appended: int = field(default=0, repr=False, compare=False)
+
+    def add_message(self, role: str, content: str) -> None:
+        if len(content) > SESSION_MESSAGE_MAX_CHARS:
+            content = content[:SESSION_MESSAGE_MAX_CHARS] + "..."
+        with self.lock:
+            evicted = self.messages.append(Message(role, content))
+            if evicted is not None:
+                self.summary.add(evicted)
+            self.appended += 1
+
+    def conversation_text(self) -> str:
+        """Prompt-ready transcript: rolling summary + the turns in the ring."""
+        with self.lock:
+            lines = [f"{m.role}: {m.content}" for m in self.messages]
+            summary = self.summary.text()
+        if summary:
+            lines.insert(0, f"system: {summary}")
+        return "\n".join(lines)
+
+    @property
+    def history(self) -> Tuple[Dict[str, str], ...]:
+        """
+        Read-only snapshot as role/content dicts (summary first, if any).
+        add_message() and clear_history() are the only mutators.
+        """
+        with self.lock:
+            out = [m.to_dict() for m in self.messages]
+            summary = self.summary.text()
+        if summary:
+            out.insert(0, {"role": "system", "content": summary})
+        return tuple(out)
+
+    def clear_history(self) -> None:
+        with self.lock:
+            self.messages.clear()
+            self.summary = RollingSummary()
+            self.appended = 0
+            self.stored_as = None  # replaces whatever is stored, not merged into it
+
+
+def session_to_dict(state: SessionState) -> Dict[str, Any]:
+    with state.lock:
+        messages = [[m.role, m.content] for m in state.messages]
+        summary = state.summary.to_dict()
+    return {
+        "session_id": state.session_id,
+        "messages": messages,
+        "summary": summary,
+        "last_qr_summary": state.last_qr_summary,
+        "status": state.status,
+        "metadata": state.metadata,
+        "created_at": state.created_at,
+    }
+
+
+def session_from_dict(data: Dict[str, Any]) -> SessionState:
+    state = SessionState(
+        session_id=data["session_id"],
+        last_qr_summary=data.get("last_qr_summary", ""),
+        status=data.get("status", "IDLE"),
+        metadata=dict(data.get("metadata") or {}),
+        created_at=data.get("created_at", time.time()),
+    )
+    if "messages" in data:
+        for role, content in data["messages"]:
+            state.add_message(role, content)
+        state.summary = RollingSummary(**(data.get("summary") or {}))
+    else:
+        for m in data.get("history") or []:  # older records
+            state.add_message(m["role"], m["content"])
+    return state
+
+
+def approx_session_bytes(state: SessionState) -> int:
+    """Rough heap footprint of a session (object + messages + summary + metadata)."""
+    size = sys.getsizeof(state) + sys.getsizeof(state.messages._buf) + sys.getsizeof(state.last_qr_summary)
+    with state.lock:
+        for msg in state.messages:
+            size += sys.getsizeof(msg) + sys.getsizeof(msg.content)
+        size += sys.getsizeof(state.summary) + sum(sys.getsizeof(r) for r in state.summary.recent)
+    size += sys.getsizeof(state.metadata)
+    for k, v in state.metadata.items():
+        size += sys.getsizeof(k) + sys.getsizeof(v)
+    return size
+
 
+class _Entry:
+    __slots__ = ("state", "last_access", "size")
 
-class InMemorySessionService(object):
-    def __init__(self):
-        self._sessions: Dict[str, SessionState] = {}
+    def __init__(self, state: SessionState, now: float):
+        self.state = state
+        self.last_access = now
+        self.size = approx_session_bytes(state)
 
+
+class _SweeperMixin(ABC):
+    """Background thread calling self.sweep() every `interval` seconds."""
+
+    _sweeper: Optional[threading.Thread] = None
+    _stop: Optional[threading.Event] = None
+
+    @abstractmethod
+    def sweep(self) -> int:
+        """Drop expired sessions; returns how many."""
+
+    def start_sweeper(self, interval: float = SESSION_SWEEP_INTERVAL) -> None:
+        if self._sweeper is not None or interval <= 0:
+            return
+        self._stop = threading.Event()
+
+        def _run():
+            while not self._stop.wait(interval):
+                try:
+                    n = self.sweep()
+                    if n:
+                        logger.debug("Expired %d idle sessions", n)
+                except Exception as e:
+                    logger.warning("Session sweep failed: %s", e)
+
+        self._sweeper = threading.Thread(target=_run, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self) -> None:
+        if self._sweeper is None:
+            return
+        self._stop.set()
+        self._sweeper.join(timeout=5)
+        self._sweeper = None
+
+
+class InMemorySessionService(_SweeperMixin):
+    """
+    Bounded in-memory session store.
+
+    - Sessions idle longer than ttl_seconds expire (checked on access and by
+      the background sweeper).
+    - At most max_entries sessions are kept; the least recently used one is
+      evicted to make room.
+
+    Entries live in an OrderedDict in access order, so both the sweep and LRU
+    eviction only ever look at the front. Sizes are re-measured on
+    create/update and kept as a running total for the bytes gauge.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+        max_entries: int = SESSION_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self.expired = 0
+        self.evicted = 0
+
+    # ---------- create / get / update ----------
     def create_session(self) -> SessionState:
         sid = str(uuid.uuid4())
         state = SessionState(session_id=sid)
-        self._sessions[sid] = state
+        self.update_session(state)
         return state
 
     def get_session(self, session_id: str):
-        return self._sessions.get(session_id)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            now = self._clock()
+            if now - entry.last_access > self.ttl_seconds:
+                self._drop(session_id)
+                self.expired += 1
+                return None
+            entry.last_access = now
+            self._sessions.move_to_end(session_id)
+            return entry.state
 
     def update_session(self, state: SessionState):
-        self._sessions[state.session_id] = state
+        with self._lock:
+            now = self._clock()
+            entry = self._sessions.get(state.session_id)
+            if entry is None:
+                entry = self._sessions[state.session_id] = _Entry(state, now)
+                self._bytes += entry.size
+            else:
+                entry.state = state
+                entry.last_access = now
+                self._bytes -= entry.size
+                entry.size = approx_session_bytes(state)
+                self._bytes += entry.size
+                self._sessions.move_to_end(state.session_id)
+
+            while len(self._sessions) > self.max_entries:
+                self._drop(next(iter(self._sessions)))
+                self.evicted += 1
+
+    def _drop(self, session_id: str) -> None:
+        entry = self._sessions.pop(session_id)
+        self._bytes -= entry.size
+
+    # ---------- Expiry ----------
+    def sweep(self) -> int:
+        """Remove idle sessions; returns how many expired."""
+        removed = 0
+        with self._lock:
+            cutoff = self._clock() - self.ttl_seconds
+            while self._sessions:
+                sid, entry = next(iter(self._sessions.items()))
+                if entry.last_access >= cutoff:
+                    break  # everything after is more recent
+                self._drop(sid)
+                removed += 1
+            self.expired += removed
+        return removed
+
+    # ---------- Accounting ----------
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def approx_bytes(self) -> int:
+        return self._bytes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "live": len(self._sessions),
+            "approx_bytes": self._bytes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+class SharedSessionService(_SweeperMixin):
+    """
+    Sessions in a shared StateBackend (SQLite / Redis), so any API worker
+    can continue a session. Same create/get/update interface as
+    InMemorySessionService; idle expiry is the backend key TTL, refreshed
+    on every update.
+
+    update_session() is a compare-and-set against the record the state was
+    loaded from. If another worker saved the session in between, its record
+    is kept and this state's new turns are appended to it (scalar fields
+    and metadata keys from this state win), so neither update is lost.
+    """
+
+    def __init__(self, backend, ttl_seconds: float = SESSION_TTL_SECONDS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    def create_session(self) -> SessionState:
+        state = SessionState(session_id=str(uuid.uuid4()))
+        self.update_session(state)
+        return state
+
+    def get_session(self, session_id: str):
+        raw = self.backend.get(self._key(session_id))
+        if raw is None:
+            return None
+        state = session_from_dict(json.loads(raw))
+        state.stored_as, state.appended = raw, 0
+        return state
+
+    def update_session(self, state: SessionState):
+        with state.lock:  # turns added meanwhile would be neither saved nor pending
+            ours = json.dumps(session_to_dict(state))
+            base = state.stored_as
+            new_turns = list(state.messages)[-state.appended:] if state.appended else []
+
+            def _merge(current: Optional[str]) -> str:
+                if current is None or base is None or current == base:
+                    return ours
+                merged = session_from_dict(json.loads(current))
+                for msg in new_turns:
+                    merged.add_message(msg.role, msg.content)
+                merged.last_qr_summary = state.last_qr_summary
+                merged.status = state.status
+                merged.metadata.update(state.metadata)
+                return json.dumps(session_to_dict(merged))
 
+            stored = self.backend.update(self._key(state.session_id), _merge, ttl=self.ttl_seconds)
+            if stored != ours:
+                # merged with another worker's save: carry on from the merged record
+                fresh = session_from_dict(json.loads(stored))
+                state.messages, state.summary, state.metadata = fresh.messages, fresh.summary, fresh.metadata
+            state.stored_as, state.appended = stored, 0
 
-def compact_history(history: List[Dict[str, str]], max_messages: int = 10):
-    if len(history) <= max_messages:
-        return history
+    def sweep(self) -> int:
+        return self.backend.purge_expired()
 
-    compressed = history[-max_messages:]
-    compressed.insert(0, {
-        "role": "system",
-        "content": "(Earlier conversation summarized: multiple QR scans this trip.)"
-    })
-    return compressed
@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set
+
+
+class SlidingWindowCounter:
+    """
+    Sum of values over the last `window_seconds`, kept in a ring of
+    `buckets` fixed-width buckets with a running total.
+
+    add() and total() are O(1) amortized: advancing the ring clears at most
+    one bucket per elapsed bucket width (and never more than the ring).
+    """
+
+    __slots__ = ("bucket_seconds", "_n", "_buckets", "_head", "_total")
+
+    def __init__(self, window_seconds: float, buckets: int):
+        self.bucket_seconds = window_seconds / buckets
+        self._n = buckets
+        self._buckets = [0.0] * buckets
+        self._head = 0  # absolute bucket number of the newest bucket
+        self._total = 0.0
+
+    def _advance(self, now: float) -> None:
+        current = int(now // self.bucket_seconds)
+        steps = current - self._head
+        if steps <= 0:
+            return
+        if steps >= self._n:
+            self._buckets = [0.0] * self._n
+            self._total = 0.0
+        else:
+            buckets, n = self._buckets, self._n
+            for b in range(self._head + 1, current + 1):
+                i = b % n
+                self._total -= buckets[i]
+                buckets[i] = 0.0
+        self._head = current
+
+    def add(self, value: float, now: float) -> None:
+        self._advance(now)
+        self._buckets[self._head % self._n] += value
+        self._total += value
+
+    def total(self, now: float) -> float:
+        self._advance(now)
+        return self._total
+
+
+class DistinctWindowCounter:
+    """
+    Number of distinct keys seen in the last `window_seconds`.
+
+    Each key is counted once, in the bucket of its latest sighting; a repeat
+    sighting moves it forward. Expired buckets drop their keys, so memory is
+    bounded by the keys actually inside the window. O(1) amortized per add.
+    """
+
+    __slots__ = ("bucket_seconds", "_n", "_buckets", "_head", "_latest", "_count")
+
+    def __init__(self, window_seconds: float, buckets: int):
+        self.bucket_seconds = window_seconds / buckets
+        self._n = buckets
+        self._buckets: List[Set[str]] = [set() for _ in range(buckets)]
+        self._head = 0
+        self._latest: Dict[str, int] = {}  # key -> absolute bucket number
+        self._count = 0
+
+    def _advance(self, now: float) -> None:
+        current = int(now // self.bucket_seconds)
+        steps = current - self._head
+        if steps <= 0:
+            return
+        # slot b % n is reused for bucket b; clear what it held (b - n)
+        last = self._head + min(steps, self._n)
+        for b in range(self._head + 1, last + 1):
+            expired = self._buckets[b % self._n]
+            if expired:
+                for key in expired:
+                    del self._latest[key]
+                self._count -= len(expired)
+                expired.clear()
+        self._head = current
+
+    def add(self, key: str, now: float) -> None:
+        self._advance(now)
+        prev = self._latest.get(key)
+        if prev == self._head:
+            return
+        if prev is not None:
+            self._buckets[prev % self._n].discard(key)
+        else:
+            self._count += 1
+        self._buckets[self._head % self._n].add(key)
+        self._latest[key] = self._head
+
+    def count(self, now: float) -> int:
+        self._advance(now)
+        return self._count
+
+
+class UserVelocity:
+    __slots__ = ("scans", "spend", "merchants")
+
+    def __init__(self):
+        self.scans = SlidingWindowCounter(60, 60)                # 1s buckets
+        self.spend: Dict[str, SlidingWindowCounter] = {}         # currency -> 1h window, 1min buckets
+        self.merchants = DistinctWindowCounter(86400, 24)        # 1h buckets
+
+
+class VelocityTracker:
+    """
+    In-memory velocity features per user:
+    - scans_per_minute
+    - spend_per_hour (in the scanned currency)
+    - distinct_merchants_per_day
+
+    Users are kept in LRU order and capped at max_users. The LRU has its own
+    short lock; each user's counters are updated under a striped lock.
+    """
+
+    def __init__(self, max_users: int = 10_000, clock: Callable[[], float] = time.time, stripes: int = 64):
+        self.max_users = max_users
+        self._clock = clock
+        self._users: "OrderedDict[str, UserVelocity]" = OrderedDict()
+        self._users_lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+
+    def _user(self, user_id: str) -> UserVelocity:
+        with self._users_lock:
+            uv = self._users.get(user_id)
+            if uv is not None:
+                self._users.move_to_end(user_id)
+                return uv
+            uv = UserVelocity()
+            self._users[user_id] = uv
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            return uv
+
+    def record(
+        self,
+        user_id: str,
+        merchant_id: str,
+        currency: str,
+        amount: float,
+        now: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Record one scan and return the velocity features including it.
+        """
+        now = self._clock() if now is None else now
+        with self._stripes[hash(user_id) % len(self._stripes)]:
+            uv = self._user(user_id)
+
+            spend = uv.spend.get(currency)
+            if spend is None:
+                spend = uv.spend[currency] = SlidingWindowCounter(3600, 60)
+
+            uv.scans.add(1, now)
+            spend.add(float(amount), now)
+            uv.merchants.add(merchant_id, now)
+
+            return {
+                "scans_per_minute": int(uv.scans.total(now)),
+                "spend_per_hour": spend.total(now),
+                "currency": currency,
+                "distinct_merchants_per_day": uv.merchants.count(now),
+            }
@@ -0,0 +1,185 @@
+# src/persistence/history_archiver.py
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from src.config import HISTORY_ARCHIVE_DIR, HISTORY_DB_PATH, HISTORY_RETENTION_DAYS, HISTORY_RETENTION_INTERVAL
+from src.persistence.history_rollups import HistoryRollups
+from src.persistence.history_store import HistoryStore
+
+logger = logging.getLogger(__name__)
+
+# Pages released per PRAGMA incremental_vacuum step; each step is a short
+# write transaction, so live inserts interleave with the shrink.
+VACUUM_STEP_PAGES = 1024
+
+
+def archive_path(archive_dir: str, day: str) -> str:
+    """archive_dir/YYYY/MM/history-YYYY-MM-DD.ndjson.gz"""
+    return os.path.join(archive_dir, day[:4], day[5:7], f"history-{day}.ndjson.gz")
+
+
+class HistoryArchiver:
+    """
+    Retention for the history table: rows older than retention_days move to
+    gzip NDJSON files partitioned by day, then the freed pages are returned
+    to the OS with incremental vacuum.
+
+    Rows go out in batches: append the batch to its day files (one gzip
+    member per append, fsynced), then delete those ids. A crash between the
+    two can only duplicate a batch in the archive, never lose it; every
+    record carries its history id for de-duplication.
+
+    With `rollups`, rows are only archived once they are rolled up, so the
+    analytics totals keep counting them.
+    """
+
+    def __init__(
+        self,
+        store: HistoryStore,
+        archive_dir: str = HISTORY_ARCHIVE_DIR,
+        retention_days: float = HISTORY_RETENTION_DAYS,
+        rollups: Optional[HistoryRollups] = None,
+        batch_rows: int = 1000,
+        clock: Callable[[], datetime] = datetime.now,
+    ):
+        self.store = store
+        self.archive_dir = archive_dir
+        self.retention_days = retention_days
+        self.rollups = rollups
+        self.batch_rows = batch_rows
+        self._clock = clock
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def cutoff(self) -> str:
+        return (self._clock() - timedelta(days=self.retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+
+    # ---------- One pass ----------
+    def archive(self, cutoff: Optional[str] = None) -> Dict[str, Any]:
+        """Archive and delete rows with created_at < cutoff; returns a report."""
+        cutoff = cutoff or self.cutoff()
+        t0 = time.perf_counter()
+        mark = None
+        if self.rollups is not None:
+            self.rollups.refresh()
+            mark = self.rollups.high_water_mark()
+
+        archived = kept = 0
+        files = set()
+        batch: List[Dict[str, Any]] = []
+        for row in self.store.iter_rows(before=cutoff, batch_rows=self.batch_rows):
+            if self._stop.is_set():
+                break
+            if mark is not None and row["id"] > mark:
+                kept += 1  # not rolled up yet; next pass
+                continue
+            batch.append(row)
+            if len(batch) >= self.batch_rows:
+                archived += self._move(batch, files)
+                batch = []
+        if batch:
+            archived += self._move(batch, files)
+
+        freed = self.vacuum()
+        report = {
+            "cutoff": cutoff,
+            "archived": archived,
+            "skipped_not_rolled_up": kept,
+            "files": sorted(files),
+            "pages_freed": freed,
+            "seconds": round(time.perf_counter() - t0, 3),
+        }
+        if archived:
+            logger.info("Archived %d history rows older than %s (%d pages freed)", archived, cutoff, freed)
+        return report
+
+    def _move(self, rows: List[Dict[str, Any]], files: set) -> int:
+        by_day: Dict[str, List[str]] = defaultdict(list)
+        for row in rows:
+            by_day[row["created_at"][:10]].append(json.dumps(row, ensure_ascii=False, default=str))
+
+        for day, lines in by_day.items():
+            path = archive_path(self.archive_dir, day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "ab") as f:
+                with gzip.GzipFile(fileobj=f, mode="ab") as gz:
+                    gz.write(("\n".join(lines) + "\n").encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            files.add(path)
+
+        return self.store.delete_ids([row["id"] for row in rows])
+
+    def vacuum(self) -> int:
+        """Release free pages in VACUUM_STEP_PAGES steps; returns pages freed."""
+        freed = 0
+        with self.store._conn() as con:
+            if con.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return 0  # older database: freed pages are reused by new rows instead
+            while not self._stop.is_set():
+                before = con.execute("PRAGMA freelist_count").fetchone()[0]
+                if not before:
+                    break
+                con.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+                freed += before - con.execute("PRAGMA freelist_count").fetchone()[0]
+        return freed
+
+    # ---------- Periodic job ----------
+    def start(self, interval: float = HISTORY_RETENTION_INTERVAL) -> None:
+        if self._thread is not None or self.retention_days <= 0:
+            return
+
+        def _run():
+            while not self._stop.wait(interval):
+                try:
+                    self.archive()
+                except Exception as e:
+                    logger.error("History archiving failed: %s", e)
+
+        self._thread = threading.Thread(target=_run, name="history-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+
+def enable_incremental_vacuum(db_path: str) -> None:
+    """One-off conversion of a database created before auto_vacuum was set (rewrites the file)."""
+    con = sqlite3.connect(db_path)
+    try:
+        con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        con.execute("VACUUM")
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    # python -m src.persistence.history_archiver --days 180
+    ap = argparse.ArgumentParser(description="Move old history rows into gzip NDJSON archives")
+    ap.add_argument("--db", default=HISTORY_DB_PATH)
+    ap.add_argument("--dir", default=HISTORY_ARCHIVE_DIR)
+    ap.add_argument("--days", type=float, default=HISTORY_RETENTION_DAYS or 180)
+    ap.add_argument("--enable-incremental-vacuum", action="store_true",
+                    help="convert an older database first (full VACUUM, run while the API is stopped)")
+    args = ap.parse_args()
+
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum(args.db)
+    store = HistoryStore(args.db)
+    archiver = HistoryArchiver(store, args.dir, args.days, rollups=HistoryRollups(store))
+    print(json.dumps(archiver.archive(), indent=2))
+    store.close()
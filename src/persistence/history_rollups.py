@@ -0,0 +1,281 @@
+# src/persistence/history_rollups.py
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.observability.metrics import metrics
+from src.persistence.history_store import HistoryStore
+from src.persistence.raw_codec import load_raw
+
+logger = logging.getLogger(__name__)
+
+# Scope key for the all-users rollup rows
+GLOBAL_SCOPE = "*"
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS rollup_spend (
+        scope TEXT NOT NULL,
+        day TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        home_currency TEXT NOT NULL,
+        scans INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        total_home REAL NOT NULL,
+        PRIMARY KEY (scope, day, currency, home_currency)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_risk (
+        scope TEXT NOT NULL,
+        day TEXT NOT NULL,
+        risk_level TEXT NOT NULL,
+        scans INTEGER NOT NULL,
+        PRIMARY KEY (scope, day, risk_level)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_merchants (
+        scope TEXT NOT NULL,
+        merchant_id TEXT NOT NULL,
+        scans INTEGER NOT NULL,
+        total_home REAL NOT NULL,
+        last_seen TEXT NOT NULL,
+        PRIMARY KEY (scope, merchant_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_rollup_merchants_top ON rollup_merchants(scope, scans)",
+    "CREATE TABLE IF NOT EXISTS rollup_state (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+)
+
+_UPSERT_SPEND = """
+    INSERT INTO rollup_spend (scope, day, currency, home_currency, scans, amount, total_home)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (scope, day, currency, home_currency) DO UPDATE SET
+        scans = scans + excluded.scans,
+        amount = amount + excluded.amount,
+        total_home = total_home + excluded.total_home
+"""
+_UPSERT_RISK = """
+    INSERT INTO rollup_risk (scope, day, risk_level, scans) VALUES (?, ?, ?, ?)
+    ON CONFLICT (scope, day, risk_level) DO UPDATE SET scans = scans + excluded.scans
+"""
+_UPSERT_MERCHANT = """
+    INSERT INTO rollup_merchants (scope, merchant_id, scans, total_home, last_seen) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (scope, merchant_id) DO UPDATE SET
+        scans = scans + excluded.scans,
+        total_home = total_home + excluded.total_home,
+        last_seen = MAX(last_seen, excluded.last_seen)
+"""
+_HWM_NAME = "history_id"
+
+
+def iter_scans(raw: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Scored items in a stored result (single scan or multi 'items')."""
+    items = raw.get("items")
+    if items is None:
+        items = [raw]
+    for item in items:
+        if item.get("error") or not item.get("risk_result") or not item.get("qr_info"):
+            continue
+        yield item
+
+
+class HistoryRollups:
+    """
+    Per-user and global aggregates over the history table, kept up to date
+    incrementally so dashboards never scan history:
+
+    - rollup_spend:     scans / source amount / home total per day and currency
+    - rollup_risk:      scanned items per day and risk level
+    - rollup_merchants: scans / home total / last seen per merchant
+
+    refresh() folds in history rows past a stored high-water mark (the last
+    history id applied). Each batch's deltas and the new mark are committed
+    in one BEGIN IMMEDIATE transaction, so every row is counted exactly
+    once even with several API workers refreshing the same database.
+
+    start() runs refresh() on a background thread whenever notify() is
+    called (the history writer does so after each batch it writes).
+    """
+
+    def __init__(self, store: HistoryStore, batch_rows: int = 2000):
+        self.store = store
+        self.batch_rows = batch_rows
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._refresh_stat = metrics.latency("history_rollups.refresh_ms")
+        self.applied = 0
+        metrics.register_gauge("history_rollups.applied", lambda: self.applied)
+        self._init_db()
+
+    def _init_db(self) -> None:
+        with self.store._conn() as con:
+            for stmt in _SCHEMA:
+                con.execute(stmt)
+            con.commit()
+
+    # ---------- Incremental refresh ----------
+    def high_water_mark(self) -> int:
+        with self.store._conn() as con:
+            row = con.execute("SELECT value FROM rollup_state WHERE name = ?", (_HWM_NAME,)).fetchone()
+        return row[0] if row else 0
+
+    def refresh(self) -> int:
+        """Apply every history row past the high-water mark; returns rows applied."""
+        applied = 0
+        t0 = time.perf_counter()
+        with self._lock:
+            while not self._stop.is_set():
+                n = self._apply_batch()
+                applied += n
+                if n < self.batch_rows:
+                    break
+            self.applied += applied
+        if applied:
+            self._refresh_stat.observe((time.perf_counter() - t0) * 1000)
+        return applied
+
+    def _apply_batch(self) -> int:
+        spend: Dict[tuple, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        risk: Dict[tuple, int] = defaultdict(int)
+        merchants: Dict[tuple, List[Any]] = {}
+
+        with self.store._conn() as con:
+            con.execute("BEGIN IMMEDIATE")  # serializes refreshes across processes
+            row = con.execute("SELECT value FROM rollup_state WHERE name = ?", (_HWM_NAME,)).fetchone()
+            hwm = row[0] if row else 0
+            rows = con.execute(
+                "SELECT id, created_at, user_id, raw_json, raw_blob FROM history WHERE id > ? ORDER BY id LIMIT ?",
+                (hwm, self.batch_rows),
+            ).fetchall()
+            if not rows:
+                con.rollback()
+                return 0
+
+            for r in rows:
+                try:
+                    raw = load_raw(r["raw_json"], r["raw_blob"])
+                except ValueError:
+                    logger.warning("History row %d has an unreadable raw result; not rolled up", r["id"])
+                    continue
+                day = r["created_at"][:10]
+                for item in iter_scans(raw):
+                    qr, fx = item["qr_info"], item.get("fx_result") or {}
+                    level = item["risk_result"].get("risk_level") or "unknown"
+                    amount = float(qr.get("amount") or 0.0)
+                    total_home = float(fx.get("total_home") or 0.0)
+                    for scope in (r["user_id"], GLOBAL_SCOPE):
+                        s = spend[(scope, day, qr.get("currency") or "", fx.get("to_currency") or "")]
+                        s[0] += 1
+                        s[1] += amount
+                        s[2] += total_home
+                        risk[(scope, day, level)] += 1
+                        merchant_id = qr.get("merchant_id")
+                        if merchant_id:
+                            m = merchants.setdefault((scope, merchant_id), [0, 0.0, r["created_at"]])
+                            m[0] += 1
+                            m[1] += total_home
+                            m[2] = max(m[2], r["created_at"])
+
+            con.executemany(_UPSERT_SPEND, [k + tuple(v) for k, v in spend.items()])
+            con.executemany(_UPSERT_RISK, [k + (v,) for k, v in risk.items()])
+            con.executemany(_UPSERT_MERCHANT, [k + tuple(v) for k, v in merchants.items()])
+            con.execute(
+                "INSERT INTO rollup_state (name, value) VALUES (?, ?)"
+                " ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                (_HWM_NAME, rows[-1]["id"]),
+            )
+            con.commit()
+        return len(rows)
+
+    # ---------- Background refresh ----------
+    def notify(self) -> None:
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        def _run():
+            while True:
+                self._wake.wait()
+                if self._stop.is_set():
+                    return
+                self._wake.clear()
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error("History rollup refresh failed: %s", e)
+
+        self._thread = threading.Thread(target=_run, name="history-rollups", daemon=True)
+        self._thread.start()
+        self.notify()  # catch up on rows written before startup
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    # ---------- Dashboard queries (rollup tables only) ----------
+    def summary(self, scope: str = GLOBAL_SCOPE, days: int = 30, top: int = 10) -> Dict[str, Any]:
+        """
+        Spend per day and currency and risk-level counts over the last
+        `days`, plus all-time top merchants (rollup_merchants is not kept per
+        day), for one user (or GLOBAL_SCOPE). Cost depends on days x
+        currencies and `top`, not on history size.
+        """
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        with self.store._conn() as con:
+            spend = [
+                dict(r) for r in con.execute(
+                    "SELECT day, currency, home_currency, scans, amount, total_home FROM rollup_spend"
+                    " WHERE scope = ? AND day >= ? ORDER BY day, currency",
+                    (scope, since),
+                )
+            ]
+            risk_rows = con.execute(
+                "SELECT day, risk_level, scans FROM rollup_risk WHERE scope = ? AND day >= ? ORDER BY day",
+                (scope, since),
+            ).fetchall()
+            top_merchants = [
+                dict(r) for r in con.execute(
+                    "SELECT merchant_id, scans, total_home, last_seen FROM rollup_merchants"
+                    " WHERE scope = ? ORDER BY scans DESC LIMIT ?",
+                    (scope, top),
+                )
+            ]
+
+        risk_levels: Dict[str, int] = defaultdict(int)
+        risk_by_day: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for r in risk_rows:
+            risk_levels[r["risk_level"]] += r["scans"]
+            risk_by_day[r["day"]][r["risk_level"]] = r["scans"]
+
+        totals: Dict[str, Dict[str, float]] = {}
+        for s in spend:
+            t = totals.setdefault(s["currency"], {"scans": 0, "amount": 0.0, "total_home": 0.0})
+            t["scans"] += s["scans"]
+            t["amount"] += s["amount"]
+            t["total_home"] += s["total_home"]
+
+        return {
+            "scope": scope,
+            "since": since,
+            "spend_by_day": spend,
+            "spend_by_currency": totals,
+            "risk_levels": dict(risk_levels),
+            "risk_by_day": dict(risk_by_day),
+            "top_merchants": top_merchants,
+            "top_merchants_window": "all_time",
+        }
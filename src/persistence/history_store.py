@@ -1,28 +1,184 @@
 # src/persistence/history_store.py
 from __future__ import annotations
 
+import base64
 import json
+import logging
 import os
+import queue
 import sqlite3
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.config import HISTORY_DB_PATH
+from src.persistence.raw_codec import encode_raw, load_raw
+
+logger = logging.getLogger(__name__)
+
+# Applied to every pooled connection. WAL lets readers run alongside the
+# writer; synchronous=NORMAL is durable across app crashes in WAL mode (only
+# an OS crash can lose the last commits). auto_vacuum only takes effect on a
+# new database and must come before journal_mode; it lets the retention job
+# hand pages freed by archiving back to the OS (PRAGMA incremental_vacuum).
+_PRAGMAS = (
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",      # ~16 MB page cache per connection
+    "PRAGMA mmap_size=268435456",    # map up to 256 MB of the file
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Statements are module constants so each pooled connection's statement
+# cache (cached_statements) reuses the prepared statement by SQL text.
+_INSERT_SQL = """
+    INSERT INTO history
+    (created_at, user_id, mode, input_repr, total_home, home_currency, local_currency, risk_level, note, raw_json, raw_blob)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, '', ?)
+"""
+_PAGE_COLUMNS = (
+    "id, created_at, user_id, mode, input_repr, total_home, home_currency, local_currency, risk_level, note"
+)
+_EXPORT_COLUMNS = _PAGE_COLUMNS + ", raw_json, raw_blob"
+_GET_RAW_SQL = "SELECT raw_json, raw_blob FROM history WHERE id = ?"
+_MIGRATE_SELECT_SQL = "SELECT id, raw_json FROM history WHERE id > ? AND raw_blob IS NULL ORDER BY id LIMIT ?"
+_MIGRATE_UPDATE_SQL = "UPDATE history SET raw_blob = ?, raw_json = '' WHERE id = ? AND raw_blob IS NULL"
+_BACKFILL_SELECT_SQL = (
+    "SELECT id, raw_json, raw_blob FROM history WHERE id > ? AND local_currency IS NULL ORDER BY id LIMIT ?"
+)
+_BACKFILL_UPDATE_SQL = "UPDATE history SET local_currency = ? WHERE id = ?"
+
+
+def encode_cursor(created_at: str, item_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{item_id}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        created_at, item_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        return created_at, int(item_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid history cursor: {cursor!r}") from e
+
+
+def local_currency_of(raw_result: Dict[str, Any]) -> str:
+    """
+    The scanned (QR) currency of a result: qr_info.currency, or the one
+    currency shared by every priced item of a multi-QR scan. "" when there
+    is none (or the items mix currencies).
+    """
+    if raw_result.get("multiple"):
+        currencies = {
+            (it.get("qr_info") or {}).get("currency")
+            for it in raw_result.get("items") or []
+            if "fx_result" in it
+        }
+        currency = currencies.pop() if len(currencies) == 1 else None
+    else:
+        currency = (raw_result.get("qr_info") or {}).get("currency")
+    return str(currency).upper() if currency else ""
+
+
+def _date_bound(value: str, upper: bool) -> str:
+    """Normalize a date/datetime filter to the created_at text format."""
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError as e:
+        raise ValueError(f"Invalid date: {value!r}") from e
+    if upper:
+        # exclusive upper bound: next day for a bare date, next second otherwise
+        dt += timedelta(days=1) if len(value) == 10 else timedelta(seconds=1)
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of SQLite connections, created lazily. connection()
+    blocks when all `size` connections are checked out.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, cached_statements: int = 128):
+        self.db_path = db_path
+        self.size = size
+        self.cached_statements = cached_statements
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._all: List[sqlite3.Connection] = []
+
+    def _new_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,  # handed between threads, never shared concurrently
+            cached_statements=self.cached_statements,
+            timeout=5.0,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self.size
+                if grow:
+                    self._created += 1
+            if grow:
+                conn = self._new_connection()
+                with self._lock:
+                    self._all.append(conn)
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()  # never hand out a connection mid-transaction
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+            self._created = 0
+        self._idle = queue.LifoQueue()
 
 
 class HistoryStore:
     """
     SQLite-backed history storage (simple + interview-friendly).
     Stores raw result JSON + a compact summary for fast UI tables.
+
+    Connections come from a small pool (WAL mode, tuned pragmas, cached
+    prepared statements) instead of a fresh connect per call.
+
+    Raw results are stored compressed in raw_blob (see raw_codec); raw_json
+    is only populated on rows written before that, until migrate_raw()
+    converts them.
     """
 
-    def __init__(self, db_path: str = "data/history.db"):
+    def __init__(self, db_path: str = HISTORY_DB_PATH, pool_size: int = 4):
         self.db_path = db_path
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._pool = ConnectionPool(db_path, size=pool_size)
+        self._closing = threading.Event()
+        self._migration: Optional[threading.Thread] = None
         self._init_db()
 
-    def _conn(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        return conn
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        with self._pool.connection() as conn:
+            yield conn
 
     def _init_db(self) -> None:
         with self._conn() as con:
@@ -36,17 +192,47 @@ class HistoryStore:
                     input_repr TEXT NOT NULL,
                     total_home REAL,
                     home_currency TEXT,
+                    local_currency TEXT,
                     risk_level TEXT,
                     note TEXT,
-                    raw_json TEXT NOT NULL
+                    raw_json TEXT NOT NULL,
+                    raw_blob BLOB
                 )
                 """
             )
-            con.execute("CREATE INDEX IF NOT EXISTS idx_history_user_time ON history(user_id, created_at DESC)")
+            columns = {row["name"] for row in con.execute("PRAGMA table_info(history)")}
+            if "raw_blob" not in columns:
+                con.execute("ALTER TABLE history ADD COLUMN raw_blob BLOB")
+            if "local_currency" not in columns:
+                # NULL on existing rows until backfill_local_currency() fills them
+                con.execute("ALTER TABLE history ADD COLUMN local_currency TEXT")
+            for name, sql in con.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index'"
+                " AND name IN ('idx_history_user_page', 'idx_history_user_risk')"
+            ).fetchall():
+                if "local_currency" not in sql:
+                    con.execute(f"DROP INDEX {name}")  # older layout filtered on home_currency
+            # Keyset paging walks (user_id, created_at, id) backwards. The
+            # trailing filter columns let risk/currency filters be checked in
+            # the index, so only rows that are returned touch the table. The
+            # indexes are not covering: page() also reads mode, input_repr,
+            # total_home and note, i.e. one rowid lookup per returned row
+            # (at most `limit` + 1), which keeps note text out of the index.
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_history_user_page"
+                " ON history(user_id, created_at, id, risk_level, local_currency)"
+            )
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_history_user_risk"
+                " ON history(user_id, risk_level, created_at, id, local_currency)"
+            )
+            # all-user date ranges: export and retention
+            con.execute("CREATE INDEX IF NOT EXISTS idx_history_created ON history(created_at)")
+            con.execute("DROP INDEX IF EXISTS idx_history_user_time")  # prefix of idx_history_user_page
             con.commit()
 
-    def add(
-        self,
+    @staticmethod
+    def make_row(
         user_id: str,
         mode: str,
         input_repr: str,
@@ -55,53 +241,262 @@ class HistoryStore:
         risk_level: Optional[str],
         note: Optional[str],
         raw_result: Dict[str, Any],
-    ) -> None:
-        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        raw_json = json.dumps(raw_result, ensure_ascii=False)
+        created_at: Optional[str] = None,
+    ) -> Tuple[Any, ...]:
+        """
+        Normalize one history entry; raw_result is encoded at write time.
+        The scanned currency (local_currency column) comes from raw_result.
+        """
+        return (
+            created_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            user_id,
+            mode,
+            input_repr,
+            float(total_home) if isinstance(total_home, (int, float)) else None,
+            home_currency or "",
+            local_currency_of(raw_result),
+            risk_level or "unknown",
+            note or "",
+            raw_result,
+        )
 
+    def add_many(self, rows: Sequence[Tuple[Any, ...]]) -> int:
+        """Insert make_row() tuples in a single transaction."""
+        params = [row[:-1] + (encode_raw(row[-1]),) for row in rows]
         with self._conn() as con:
-            con.execute(
-                """
-                INSERT INTO history
-                (created_at, user_id, mode, input_repr, total_home, home_currency, risk_level, note, raw_json)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    created_at,
-                    user_id,
-                    mode,
-                    input_repr,
-                    float(total_home) if isinstance(total_home, (int, float)) else None,
-                    home_currency or "",
-                    risk_level or "unknown",
-                    note or "",
-                    raw_json,
-                ),
-            )
+            con.executemany(_INSERT_SQL, params)
             con.commit()
+        return len(params)
+
+    def add(
+        self,
+        user_id: str,
+        mode: str,
+        input_repr: str,
+        total_home: Optional[float],
+        home_currency: Optional[str],
+        risk_level: Optional[str],
+        note: Optional[str],
+        raw_result: Dict[str, Any],
+    ) -> None:
+        self.add_many([
+            self.make_row(user_id, mode, input_repr, total_home, home_currency, risk_level, note, raw_result)
+        ])
 
     def list(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return self.page(user_id, limit=limit)[0]
+
+    def page(
+        self,
+        user_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        risk_levels: Optional[Sequence[str]] = None,
+        currency: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Newest-first page of a user's history and the cursor for the next
+        page (None at the end). Keyset pagination: the cursor encodes the
+        last row's (created_at, id), so every page is an index seek plus
+        `limit` rows, however deep it is.
+
+        `currency` matches the scanned (local) currency, e.g. JPY for a
+        traveler's scans in Japan. date_from is inclusive; date_to is
+        inclusive, and a bare date (YYYY-MM-DD) covers that whole day.
+        """
+        where = ["user_id = ?"]
+        params: List[Any] = [user_id]
+        if cursor:
+            where.append("(created_at, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        if risk_levels:
+            where.append(f"risk_level IN ({','.join('?' * len(risk_levels))})")
+            params.extend(risk_levels)
+        if currency:
+            where.append("local_currency = ?")
+            params.append(currency.upper())
+        if date_from:
+            where.append("created_at >= ?")
+            params.append(_date_bound(date_from, upper=False))
+        if date_to:
+            where.append("created_at < ?")
+            params.append(_date_bound(date_to, upper=True))
+        params.append(limit + 1)  # one extra row tells us if there is a next page
+
+        sql = (
+            f"SELECT {_PAGE_COLUMNS} FROM history WHERE {' AND '.join(where)}"
+            " ORDER BY created_at DESC, id DESC LIMIT ?"
+        )
         with self._conn() as con:
-            rows = con.execute(
-                """
-                SELECT id, created_at, user_id, mode, input_repr, total_home, home_currency, risk_level, note
-                FROM history
-                WHERE user_id = ?
-                ORDER BY id DESC
-                LIMIT ?
-                """,
-                (user_id, limit),
-            ).fetchall()
+            rows = [dict(r) for r in con.execute(sql, params).fetchall()]
 
-        return [dict(r) for r in rows]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        return rows, next_cursor
+
+    def iter_rows(
+        self,
+        user_id: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        before: Optional[str] = None,
+        with_raw: bool = True,
+        batch_rows: int = 500,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream rows oldest first (one user, or all users if user_id is None).
+        Reads batch_rows at a time by keyset on (created_at, id), each batch
+        on a briefly borrowed connection, so memory stays flat, no
+        connection or read snapshot is held while the caller consumes rows,
+        and rows may be deleted between batches (the retention job does).
+
+        date_from/date_to as in page(); `before` is an exclusive created_at
+        bound. With with_raw, each row carries the decoded result as "raw";
+        a row whose result can't be decoded has "raw": None, "raw_error",
+        and the stored bytes as-is ("raw_json", base64 "raw_blob"), so an
+        archived copy can still be restored.
+        """
+        where: List[str] = []
+        params: List[Any] = []
+        if user_id is not None:
+            where.append("user_id = ?")
+            params.append(user_id)
+        if date_from:
+            where.append("created_at >= ?")
+            params.append(_date_bound(date_from, upper=False))
+        if date_to:
+            where.append("created_at < ?")
+            params.append(_date_bound(date_to, upper=True))
+        if before:
+            where.append("created_at < ?")
+            params.append(before)
+        columns = _EXPORT_COLUMNS if with_raw else _PAGE_COLUMNS
+        sql = (
+            f"SELECT {columns} FROM history WHERE {' AND '.join(where + ['(created_at, id) > (?, ?)'])}"
+            " ORDER BY created_at, id LIMIT ?"
+        )
+
+        last: Tuple[str, int] = ("", 0)
+        while True:
+            with self._conn() as con:
+                batch = con.execute(sql, params + [last[0], last[1], batch_rows]).fetchall()
+            for r in batch:
+                row = dict(r)
+                if with_raw:
+                    raw_json, raw_blob = row.pop("raw_json"), row.pop("raw_blob")
+                    try:
+                        row["raw"] = load_raw(raw_json, raw_blob)
+                    except ValueError as e:
+                        # one corrupt blob must not cut an export short or stall retention
+                        logger.warning("History row %d has an unreadable raw result: %s", row["id"], e)
+                        row["raw"] = None
+                        row["raw_error"] = str(e)
+                        row["raw_json"] = raw_json
+                        row["raw_blob"] = base64.b64encode(raw_blob).decode("ascii") if raw_blob else None
+                yield row
+            if len(batch) < batch_rows:
+                return
+            last = (batch[-1]["created_at"], batch[-1]["id"])
+
+    def delete_ids(self, ids: Sequence[int]) -> int:
+        with self._conn() as con:
+            cur = con.executemany("DELETE FROM history WHERE id = ?", [(i,) for i in ids])
+            con.commit()
+        return cur.rowcount
 
     def get_raw(self, item_id: int) -> Optional[Dict[str, Any]]:
         with self._conn() as con:
-            row = con.execute(
-                "SELECT raw_json FROM history WHERE id = ?",
-                (item_id,),
-            ).fetchone()
+            row = con.execute(_GET_RAW_SQL, (item_id,)).fetchone()
 
         if not row:
             return None
-        return json.loads(row["raw_json"])
+        return load_raw(row["raw_json"], row["raw_blob"])
+
+    # ---------- raw_json -> raw_blob migration ----------
+    def migrate_raw(self, batch_size: int = 500, pause: float = 0.0) -> int:
+        """
+        Convert rows still holding raw_json text to raw_blob, batch_size rows
+        per short transaction so live writes interleave. Safe to run while
+        the app serves traffic, to interrupt, and to re-run. Returns the
+        number of rows converted.
+
+        Freed pages are reused by later inserts; run VACUUM offline to
+        shrink the file itself.
+        """
+        converted = 0
+        last_id = 0
+        while not self._closing.is_set():
+            with self._conn() as con:
+                rows = con.execute(_MIGRATE_SELECT_SQL, (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                updates = []
+                for r in rows:
+                    try:
+                        updates.append((encode_raw(json.loads(r["raw_json"])), r["id"]))
+                    except ValueError:
+                        logger.warning("History row %d has unreadable raw_json; left as is", r["id"])
+                con.executemany(_MIGRATE_UPDATE_SQL, updates)
+                con.commit()
+            converted += len(updates)
+            last_id = rows[-1]["id"]
+            if pause:
+                time.sleep(pause)
+        return converted
+
+    def backfill_local_currency(self, batch_size: int = 500, pause: float = 0.0) -> int:
+        """
+        Fill local_currency on rows written before the column existed, from
+        their stored result, in short batches like migrate_raw(). Rows with
+        no readable result get "" so they are not revisited.
+        """
+        filled = 0
+        last_id = 0
+        while not self._closing.is_set():
+            with self._conn() as con:
+                rows = con.execute(_BACKFILL_SELECT_SQL, (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                updates = []
+                for r in rows:
+                    try:
+                        currency = local_currency_of(load_raw(r["raw_json"], r["raw_blob"]))
+                    except ValueError:
+                        currency = ""
+                    updates.append((currency, r["id"]))
+                con.executemany(_BACKFILL_UPDATE_SQL, updates)
+                con.commit()
+            filled += len(updates)
+            last_id = rows[-1]["id"]
+            if pause:
+                time.sleep(pause)
+        return filled
+
+    def start_migration(self, batch_size: int = 500, pause: float = 0.01) -> None:
+        """Run migrate_raw() and backfill_local_currency() on a background thread (stopped by close())."""
+        if self._migration is not None:
+            return
+
+        def _run():
+            try:
+                n = self.migrate_raw(batch_size, pause)
+                if n:
+                    logger.info("Compressed raw results of %d history rows", n)
+                n = self.backfill_local_currency(batch_size, pause)
+                if n:
+                    logger.info("Backfilled local currency of %d history rows", n)
+            except Exception as e:
+                logger.error("History raw migration failed: %s", e)
+
+        self._migration = threading.Thread(target=_run, name="history-migrate", daemon=True)
+        self._migration.start()
+
+    def close(self) -> None:
+        self._closing.set()
+        if self._migration is not None:
+            self._migration.join(timeout=5)
+        self._pool.close()
@@ -0,0 +1,174 @@
+# src/persistence/history_writer.py
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.config import HISTORY_BATCH_ROWS, HISTORY_ENQUEUE_TIMEOUT, HISTORY_FLUSH_MS, HISTORY_QUEUE_MAX
+from src.observability.metrics import metrics
+from src.persistence.history_store import HistoryStore
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+_FLUSH = object()
+
+
+class HistoryWriter:
+    """
+    Write-behind queue in front of HistoryStore.
+
+    Request threads call submit(), which only enqueues. One background
+    thread groups entries into a single add_many() transaction per
+    `batch_rows` entries or `flush_ms` milliseconds, whichever comes first,
+    so scan latency doesn't include a commit/fsync.
+
+    Back-pressure: the queue holds at most `max_queue` entries. A full queue
+    blocks submit() for up to `enqueue_timeout` seconds; after that the
+    entry is dropped and counted rather than stalling the request further.
+
+    on_write, if given, is called on the writer thread after each batch is
+    committed (e.g. HistoryRollups.notify).
+
+    Metrics: history_writer.queue_depth / .written / .dropped / .failed
+    gauges and a history_writer.flush_ms latency.
+    """
+
+    def __init__(
+        self,
+        store: HistoryStore,
+        batch_rows: int = HISTORY_BATCH_ROWS,
+        flush_ms: float = HISTORY_FLUSH_MS,
+        max_queue: int = HISTORY_QUEUE_MAX,
+        enqueue_timeout: float = HISTORY_ENQUEUE_TIMEOUT,
+        on_write: Optional[Callable[[], None]] = None,
+    ):
+        self.store = store
+        self.on_write = on_write
+        self.batch_rows = max(1, batch_rows)
+        self.flush_interval = flush_ms / 1000.0
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._flush_stat = metrics.latency("history_writer.flush_ms")
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._closed = False
+
+        metrics.register_gauge("history_writer.queue_depth", self._queue.qsize)
+        metrics.register_gauge("history_writer.written", lambda: self.written)
+        metrics.register_gauge("history_writer.dropped", lambda: self.dropped)
+        metrics.register_gauge("history_writer.failed", lambda: self.failed)
+
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    # ---------- Producer side ----------
+    def submit(
+        self,
+        user_id: str,
+        mode: str,
+        input_repr: str,
+        total_home: Optional[float],
+        home_currency: Optional[str],
+        risk_level: Optional[str],
+        note: Optional[str],
+        raw_result: Dict[str, Any],
+    ) -> bool:
+        """Queue one history entry; False if it was dropped (closed or full)."""
+        if self._closed:
+            self.dropped += 1
+            return False
+        # timestamp now (scan time), not at flush time
+        row = HistoryStore.make_row(user_id, mode, input_repr, total_home, home_currency, risk_level, note, raw_result)
+        try:
+            self._queue.put(row, timeout=self.enqueue_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("History queue full (%d), dropping entry for %s", self._queue.maxsize, user_id)
+            return False
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything submitted so far is written (True) or timeout."""
+        deadline = time.monotonic() + timeout
+        q = self._queue
+        if q.unfinished_tasks:
+            try:
+                q.put_nowait(_FLUSH)  # cut the current batch short instead of waiting out flush_ms
+            except queue.Full:
+                pass
+        with q.all_tasks_done:
+            while q.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                q.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop accepting entries, write out what is queued, stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)  # FIFO: lands after every queued entry
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("History writer did not drain within %.1fs (%d queued)", timeout, self.depth())
+
+    # ---------- Writer thread ----------
+    def _run(self) -> None:
+        q = self._queue
+        stopping = False
+        while not stopping:
+            first = q.get()
+            if first is _STOP:
+                q.task_done()
+                return
+            if first is _FLUSH:
+                q.task_done()
+                continue
+
+            batch: List[Tuple[Any, ...]] = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_rows:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = q.get(timeout=remaining) if remaining > 0 else q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    q.task_done()
+                    stopping = True
+                    break
+                if item is _FLUSH:
+                    q.task_done()
+                    break
+                batch.append(item)
+
+            self._write(batch)
+            for _ in batch:
+                q.task_done()
+
+    def _write(self, batch: List[Tuple[Any, ...]]) -> None:
+        t0 = time.perf_counter()
+        try:
+            self.store.add_many(batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error("History batch write failed (%d rows): %s", len(batch), e)
+            return
+        finally:
+            self._flush_stat.observe((time.perf_counter() - t0) * 1000)
+        if self.on_write is not None:
+            try:
+                self.on_write()
+            except Exception as e:
+                logger.warning("History on_write hook failed: %s", e)
@@ -0,0 +1,161 @@
+# src/persistence/profile_store.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL, PROFILE_DB_PATH
+from src.persistence.history_store import ConnectionPool
+
+_GET_SQL = "SELECT profile_json FROM profiles WHERE user_id = ?"
+_PUT_SQL = """
+    INSERT INTO profiles (user_id, profile_json, updated_at) VALUES (?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET profile_json = excluded.profile_json, updated_at = excluded.updated_at
+"""
+_SEED_SQL = "INSERT OR IGNORE INTO profiles (user_id, profile_json, updated_at) VALUES (?, ?, ?)"
+_DELETE_SQL = "DELETE FROM profiles WHERE user_id = ?"
+
+_ABSENT = None  # cached "no such profile", so unknown users don't hit disk either
+
+
+class ProfileStore:
+    """
+    Durable user profiles (SQLite) behind an LRU read cache.
+
+    get() is served from memory on a hit, including cached misses. Every
+    write goes to disk first and then replaces the cache entry, so this
+    process always reads its own writes. A miss notes the write counter
+    before reading disk and only caches the result if no write happened
+    meanwhile, so a slow reader can't cache a stale profile (profile writes
+    are rare; the occasional uncached miss is cheap).
+
+    cache_ttl > 0 bounds staleness when other processes write the same
+    database; 0 means entries live until evicted or overwritten.
+    """
+
+    def __init__(
+        self,
+        db_path: str = PROFILE_DB_PATH,
+        cache_size: int = PROFILE_CACHE_SIZE,
+        cache_ttl: float = PROFILE_CACHE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._clock = clock
+        self._pool = ConnectionPool(db_path, size=2)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # disk write + cache update happen in commit order
+        self._cache: "OrderedDict[str, Tuple[Optional[Dict[str, Any]], float]]" = OrderedDict()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.absent = 0
+        with self._pool.connection() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS profiles (
+                    user_id TEXT PRIMARY KEY,
+                    profile_json TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+            con.commit()
+
+    # ---------- Reads ----------
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """The stored profile (a copy), or None for an unknown user."""
+        with self._lock:
+            hit = self._cache.get(user_id)
+            if hit is not None and (not self.cache_ttl or self._clock() - hit[1] < self.cache_ttl):
+                self._cache.move_to_end(user_id)
+                self.hits += 1
+                if hit[0] is _ABSENT:
+                    self.absent += 1
+                    return None
+                return dict(hit[0])
+            self.misses += 1
+            writes = self._writes
+
+        with self._pool.connection() as con:
+            row = con.execute(_GET_SQL, (user_id,)).fetchone()
+        profile = json.loads(row[0]) if row else _ABSENT
+
+        with self._lock:
+            if self._writes == writes:
+                self._remember(user_id, profile)
+            if profile is _ABSENT:
+                self.absent += 1
+        return dict(profile) if profile is not None else None
+
+    # ---------- Writes ----------
+    def upsert(self, user_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Merge fields into the profile (creating it); returns the result."""
+        with self._write_lock, self._pool.connection() as con:
+            con.execute("BEGIN IMMEDIATE")  # read-merge-write, also against other processes
+            row = con.execute(_GET_SQL, (user_id,)).fetchone()
+            profile = json.loads(row[0]) if row else {}
+            profile.update(fields)
+            con.execute(_PUT_SQL, (user_id, json.dumps(profile), _now()))
+            con.commit()
+            self._written(user_id, profile)
+        return dict(profile)
+
+    def replace(self, user_id: str, profile: Dict[str, Any]) -> None:
+        with self._write_lock, self._pool.connection() as con:
+            con.execute(_PUT_SQL, (user_id, json.dumps(profile), _now()))
+            con.commit()
+            self._written(user_id, dict(profile))
+
+    def seed(self, user_id: str, profile: Dict[str, Any]) -> bool:
+        """Create the profile only if the user has none; True if created."""
+        with self._write_lock, self._pool.connection() as con:
+            created = con.execute(_SEED_SQL, (user_id, json.dumps(profile), _now())).rowcount == 1
+            con.commit()
+            if created:
+                self._written(user_id, dict(profile))
+        return created
+
+    def delete(self, user_id: str) -> bool:
+        with self._write_lock, self._pool.connection() as con:
+            deleted = con.execute(_DELETE_SQL, (user_id,)).rowcount == 1
+            con.commit()
+            self._written(user_id, _ABSENT)
+        return deleted
+
+    # ---------- Cache ----------
+    def _written(self, user_id: str, profile: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._writes += 1
+            self._remember(user_id, profile)
+
+    def _remember(self, user_id: str, profile: Optional[Dict[str, Any]]) -> None:
+        # caller holds self._lock
+        self._cache[user_id] = (profile, self._clock())
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "absent": self.absent,
+        }
+
+    def close(self) -> None:
+        self._pool.close()
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
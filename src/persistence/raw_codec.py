@@ -0,0 +1,96 @@
+# src/persistence/raw_codec.py
+from __future__ import annotations
+
+import json
+import zlib
+from typing import Any, Dict, Optional
+
+# Compact storage for history raw results: compact JSON, raw-deflated with a
+# preset dictionary. A stored result is a few hundred bytes of mostly the
+# same keys, provider notes, risk reasons and fallback message on every row,
+# so per-row compression alone barely helps; priming the compressor with
+# those strings lets even the first occurrence be a back-reference.
+#
+# Blob layout: 1 version byte + raw deflate stream. The version selects the
+# dictionary, so a dictionary is NEVER edited in place - add a new version.
+
+_ZDICT_V1 = (
+    b'Merchant history unavailable; using baseline merchant score.'
+    b'Unfamiliar/high-fraud country pattern: '
+    b'Merchant is on the bad-merchant list.'
+    b'Elevated scan velocity: Very high scan velocity: '
+    b' scans in the last minute.'
+    b'High spend in the last hour: Many distinct merchants today: '
+    b'High amount (>= 5000).'
+    b'Mock FX fallback (live failed).'
+    b'You scanned **'
+    b'** QR payments.\\n\\n**Total estimated charge: '
+    b' INR**\\nOpen the JSON details to see per-QR breakdowns.'
+    b'"error":"'
+    b'"multiple":true,"count":'
+    b',"errors":0,"items":[{'
+    b'"provider":"mock-fx"'
+    b'"provider":"cache"'
+    b'"message":"LLM is unavailable right now, but here is the computed breakdown:\\n'
+    b'- Base converted amount: '
+    b' INR\\n- FX markup: '
+    b' INR\\n- Network fee (approx.): '
+    b' INR\\n- Total estimated charge: '
+    b' INR\\n- Risk level: '
+    b'\\nRecommendation: Proceed only if this total and risk level match your expectation."}'
+    b'{"session_id":"'
+    b'","user_country":null,"qr_info":{"merchant_id":"M'
+    b'","country":"'
+    b'","currency":"'
+    b'","amount":'
+    b',"raw_fields":{"raw":"QR:'
+    b'"},"qr_id":"'
+    b'"},"fx_result":{"from_currency":"'
+    b'","to_currency":"INR","rate":'
+    b',"base_home":'
+    b',"markup_home":'
+    b',"network_fee_home":11.0,"total_home":'
+    b',"notes":"Live FX rate from exchangerate.host with standard markup.",'
+    b'"provider":"exchangerate.host-live"},'
+    b'"risk_result":{"risk_score":'
+    b',"risk_level":"low"'
+    b',"risk_level":"medium"'
+    b',"risk_level":"high"'
+    b',"reasons":["Moderate amount (>= 1000).",'
+    b'"Merchant seen recently (familiar)."'
+    b'"Merchant not seen in your recent history."],'
+    b'"velocity":{"scans_per_minute":'
+    b',"spend_per_hour":'
+    b',"currency":"'
+    b'","distinct_merchants_per_day":'
+)
+
+_DICTS = {1: _ZDICT_V1}
+CURRENT_VERSION = 1
+_LEVEL = 6
+
+
+def encode_raw(raw: Dict[str, Any], version: int = CURRENT_VERSION) -> bytes:
+    text = json.dumps(raw, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    comp = zlib.compressobj(_LEVEL, zlib.DEFLATED, -15, zdict=_DICTS[version])
+    return bytes((version,)) + comp.compress(text) + comp.flush()
+
+
+def decode_raw(blob: bytes) -> Dict[str, Any]:
+    """Inverse of encode_raw(); ValueError on unknown version or corrupt data."""
+    version = blob[0]
+    zdict = _DICTS.get(version)
+    if zdict is None:
+        raise ValueError(f"Unknown raw blob version: {version}")
+    try:
+        dec = zlib.decompressobj(-15, zdict=zdict)
+        return json.loads(dec.decompress(blob[1:]) + dec.flush())
+    except zlib.error as e:
+        raise ValueError(f"Corrupt raw blob: {e}") from e
+
+
+def load_raw(raw_json: Optional[str], raw_blob: Optional[bytes]) -> Dict[str, Any]:
+    """Decode a history row's raw result from whichever column holds it."""
+    if raw_blob is not None:
+        return decode_raw(raw_blob)
+    return json.loads(raw_json or "{}")
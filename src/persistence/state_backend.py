@@ -0,0 +1,641 @@
+# src/persistence/state_backend.py
+from __future__ import annotations
+
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class StateConflictError(RuntimeError):
+    """update()/hupdate() kept losing the compare-and-set race."""
+
+
+def _backoff(attempt: int) -> None:
+    # jittered, so contending writers spread out instead of colliding again
+    time.sleep(random.uniform(0, min(0.05, 0.001 * 2 ** attempt)))
+
+
+class StateBackend(ABC):
+    """
+    Minimal shared key/value + hash store for state that must survive across
+    API worker processes (sessions, profiles, merchant familiarity).
+
+    Values are strings (callers store JSON). Plain keys expire via set(ttl);
+    any key, hashes included, via expire(). Read-modify-write goes through
+    cas()/hcas() (or update()/hupdate()), so concurrent workers never
+    silently overwrite each other. Subclasses must implement every abstract
+    method, or instantiating them fails.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def hget(self, key: str, field: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def hset(self, key: str, field: str, value: str) -> bool:
+        """Set a hash field; True if the field is new."""
+        ...
+
+    @abstractmethod
+    def hdel(self, key: str, *fields: str) -> None:
+        ...
+
+    @abstractmethod
+    def hgetall(self, key: str) -> Dict[str, str]:
+        ...
+
+    @abstractmethod
+    def hlen(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def cas(self, key: str, expected: Optional[str], value: str, ttl: Optional[float] = None) -> bool:
+        """Set key to value only if it currently holds `expected` (None = absent); True if set."""
+        ...
+
+    @abstractmethod
+    def hcas(self, key: str, field: str, expected: Optional[str], value: str) -> bool:
+        """cas() for one hash field."""
+        ...
+
+    @abstractmethod
+    def expire(self, key: str, ttl: float) -> None:
+        """(Re)start the expiry of an existing key, hash or plain."""
+        ...
+
+    def update(
+        self,
+        key: str,
+        fn: Callable[[Optional[str]], Optional[str]],
+        ttl: Optional[float] = None,
+        retries: int = 16,
+    ) -> Optional[str]:
+        """
+        Atomic read-modify-write: store fn(current) with cas(), re-reading
+        and re-applying fn on conflict. fn returning None leaves the key
+        alone. Returns the value now stored.
+        """
+        for attempt in range(retries):
+            current = self.get(key)
+            value = fn(current)
+            if value is None:
+                return current
+            if self.cas(key, current, value, ttl):
+                return value
+            _backoff(attempt)
+        raise StateConflictError(f"Too many concurrent updates of {key!r}")
+
+    def hupdate(
+        self,
+        key: str,
+        field: str,
+        fn: Callable[[Optional[str]], str],
+        retries: int = 16,
+    ) -> Tuple[Optional[str], str]:
+        """update() for one hash field; returns (previous, stored) values."""
+        for attempt in range(retries):
+            current = self.hget(key, field)
+            value = fn(current)
+            if self.hcas(key, field, current, value):
+                return current, value
+            _backoff(attempt)
+        raise StateConflictError(f"Too many concurrent updates of {key!r}[{field!r}]")
+
+    def purge_expired(self) -> int:
+        """Drop expired keys (backends with native expiry return 0)."""
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__}
+
+    def close(self) -> None:
+        pass
+
+
+# -------------------------
+# SQLite (WAL)
+# -------------------------
+class SQLiteBackend(StateBackend):
+    """
+    Single-host shared state in one SQLite file. WAL mode lets every worker
+    read while one writes; each thread keeps its own connection.
+
+    cas()/hcas() are single conditional statements, so SQLite's write lock
+    makes them atomic across processes. Hash expiry is applied by
+    purge_expired() (the session sweeper), not on read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        con = self._conn()
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " key TEXT NOT NULL, field TEXT NOT NULL, value TEXT NOT NULL,"
+            " PRIMARY KEY (key, field)) WITHOUT ROWID"
+        )
+        con.execute("CREATE INDEX IF NOT EXISTS idx_kv_expires ON kv(expires_at) WHERE expires_at IS NOT NULL")
+        # expiry of whole hashes (expire()); applied by purge_expired()
+        con.execute("CREATE TABLE IF NOT EXISTS hash_expiry (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            # autocommit: every statement here is a single-row write
+            con = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=5.0)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        self._conn().execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, expires_at),
+        )
+
+    def delete(self, key: str) -> None:
+        con = self._conn()
+        con.execute("DELETE FROM kv WHERE key = ?", (key,))
+        con.execute("DELETE FROM hashes WHERE key = ?", (key,))
+        con.execute("DELETE FROM hash_expiry WHERE key = ?", (key,))
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value FROM hashes WHERE key = ? AND field = ?", (key, field)
+        ).fetchone()
+        return row[0] if row else None
+
+    def hset(self, key: str, field: str, value: str) -> bool:
+        con = self._conn()
+        cur = con.execute(
+            "INSERT OR IGNORE INTO hashes (key, field, value) VALUES (?, ?, ?)", (key, field, value)
+        )
+        if cur.rowcount:
+            return True
+        con.execute("UPDATE hashes SET value = ? WHERE key = ? AND field = ?", (value, key, field))
+        return False
+
+    def hdel(self, key: str, *fields: str) -> None:
+        if fields:
+            self._conn().executemany(
+                "DELETE FROM hashes WHERE key = ? AND field = ?", [(key, f) for f in fields]
+            )
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        rows = self._conn().execute("SELECT field, value FROM hashes WHERE key = ?", (key,)).fetchall()
+        return dict(rows)
+
+    def hlen(self, key: str) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM hashes WHERE key = ?", (key,)).fetchone()[0]
+
+    def cas(self, key: str, expected: Optional[str], value: str, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        if expected is None:
+            # insert, or take over a key that has expired but not been purged yet
+            cur = self._conn().execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+                "WHERE kv.expires_at IS NOT NULL AND kv.expires_at <= ?",
+                (key, value, expires_at, now),
+            )
+        else:
+            cur = self._conn().execute(
+                "UPDATE kv SET value = ?, expires_at = ? "
+                "WHERE key = ? AND value = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (value, expires_at, key, expected, now),
+            )
+        return cur.rowcount == 1
+
+    def hcas(self, key: str, field: str, expected: Optional[str], value: str) -> bool:
+        if expected is None:
+            cur = self._conn().execute(
+                "INSERT OR IGNORE INTO hashes (key, field, value) VALUES (?, ?, ?)", (key, field, value)
+            )
+        else:
+            cur = self._conn().execute(
+                "UPDATE hashes SET value = ? WHERE key = ? AND field = ? AND value = ?",
+                (value, key, field, expected),
+            )
+        return cur.rowcount == 1
+
+    def expire(self, key: str, ttl: float) -> None:
+        con = self._conn()
+        expires_at = time.time() + ttl
+        con.execute("UPDATE kv SET expires_at = ? WHERE key = ?", (expires_at, key))
+        con.execute(
+            "INSERT INTO hash_expiry (key, expires_at) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at",
+            (key, expires_at),
+        )
+
+    def purge_expired(self) -> int:
+        con = self._conn()
+        now = time.time()
+        con.execute("BEGIN IMMEDIATE")  # an expire() racing the purge either lands before or after it
+        try:
+            n = con.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)).rowcount
+            con.execute(
+                "DELETE FROM hashes WHERE key IN (SELECT key FROM hash_expiry WHERE expires_at <= ?)", (now,)
+            )
+            n += con.execute("DELETE FROM hash_expiry WHERE expires_at <= ?", (now,)).rowcount
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        return n
+
+    def close(self) -> None:
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+
+# -------------------------
+# Redis protocol (RESP2)
+# -------------------------
+class RedisError(ValueError):
+    pass
+
+
+class _RespConnection:
+    def __init__(self, host: str, port: int, db: int, password: Optional[str], timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.call("AUTH", password)
+        if db:
+            self.call("SELECT", str(db))
+
+    @staticmethod
+    def _encode(args: Iterable[str]) -> bytes:
+        parts = []
+        items = [a if isinstance(a, bytes) else str(a).encode("utf-8") for a in args]
+        parts.append(b"*%d\r\n" % len(items))
+        for b in items:
+            parts.append(b"$%d\r\n%s\r\n" % (len(b), b))
+        return b"".join(parts)
+
+    def _read(self) -> Any:
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise RedisError(rest.decode("utf-8"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self.reader.read(n + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read() for _ in range(n)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def call(self, *args: str) -> Any:
+        self.sock.sendall(self._encode(args))
+        return self._read()
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend(StateBackend):
+    """
+    Shared state on any server speaking the Redis protocol (Redis, Valkey,
+    KeyDB, or the test stand-in in src/eval/resp_stub_server.py). Small
+    built-in RESP client with one connection per thread, so no client
+    library is needed.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 2.0):
+        self.host, self.port, self.db = host, port, db
+        self._password = password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        u = urlparse(url)
+        db = int(u.path.lstrip("/") or 0)
+        return cls(host=u.hostname or "127.0.0.1", port=u.port or 6379, db=db, password=u.password)
+
+    def _call(self, *args: str) -> Any:
+        con = getattr(self._local, "con", None)
+        for attempt in range(2):
+            if con is None:
+                con = _RespConnection(self.host, self.port, self.db, self._password, self.timeout)
+                self._local.con = con
+            try:
+                return con.call(*args)
+            except (ConnectionError, OSError):
+                # stale socket (server restart, idle timeout): reconnect once
+                con.close()
+                con = self._local.con = None
+                if attempt:
+                    raise
+
+    def _watched_write(self, key: str, read: Tuple[str, ...], expected: Optional[str],
+                       write: Tuple[str, ...]) -> bool:
+        """
+        Optimistic transaction on one connection: WATCH key, run `read`, and
+        only if it returns `expected` run `write` in MULTI/EXEC. EXEC fails
+        (nil) if another client touched the key after the WATCH.
+        """
+        self._call("WATCH", key)  # (re)connects if needed; the rest must use this connection
+        con = self._local.con
+        try:
+            if con.call(*read) != expected:
+                con.call("UNWATCH")
+                return False
+            con.call("MULTI")
+            try:
+                con.call(*write)
+            except RedisError:
+                con.call("DISCARD")
+                raise
+            return con.call("EXEC") is not None
+        except (ConnectionError, OSError):
+            con.close()
+            self._local.con = None
+            raise
+
+    def ping(self) -> bool:
+        return self._call("PING") == "PONG"
+
+    def get(self, key: str) -> Optional[str]:
+        return self._call("GET", key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        if ttl:
+            self._call("SET", key, value, "PX", str(int(ttl * 1000)))
+        else:
+            self._call("SET", key, value)
+
+    def delete(self, key: str) -> None:
+        self._call("DEL", key)
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        return self._call("HGET", key, field)
+
+    def hset(self, key: str, field: str, value: str) -> bool:
+        return self._call("HSET", key, field, value) == 1
+
+    def hdel(self, key: str, *fields: str) -> None:
+        if fields:
+            self._call("HDEL", key, *fields)
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        flat = self._call("HGETALL", key) or []
+        return dict(zip(flat[::2], flat[1::2]))
+
+    def hlen(self, key: str) -> int:
+        return self._call("HLEN", key)
+
+    def cas(self, key: str, expected: Optional[str], value: str, ttl: Optional[float] = None) -> bool:
+        args: Tuple[str, ...] = ("SET", key, value) + (("PX", str(int(ttl * 1000))) if ttl else ())
+        if expected is None:
+            return self._call(*args, "NX") is not None
+        return self._watched_write(key, ("GET", key), expected, args)
+
+    def hcas(self, key: str, field: str, expected: Optional[str], value: str) -> bool:
+        if expected is None:
+            return self._call("HSETNX", key, field, value) == 1
+        return self._watched_write(key, ("HGET", key, field), expected, ("HSET", key, field, value))
+
+    def expire(self, key: str, ttl: float) -> None:
+        self._call("PEXPIRE", key, str(int(ttl * 1000)))
+
+    def close(self) -> None:
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+
+# -------------------------
+# Read-through local cache
+# -------------------------
+_MISSING = object()
+
+
+class CachedBackend(StateBackend):
+    """
+    Read-through cache in front of a shared backend.
+
+    Reads of keys under `cache_prefixes` are served from process memory for
+    up to `ttl` seconds; this worker's own writes update the cache, other
+    workers' writes become visible once the entry expires. Keys outside the
+    prefixes (e.g. sessions, which are read-modify-written per request) are
+    always read from the backend.
+    """
+
+    def __init__(self, inner: StateBackend, ttl: float = 1.0, max_entries: int = 10_000,
+                 cache_prefixes: Tuple[str, ...] = ("profile:", "merchants:")):
+        self.inner = inner
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_prefixes = cache_prefixes
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, Optional[str]], Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _cacheable(self, key: str) -> bool:
+        return key.startswith(self.cache_prefixes)
+
+    def _lookup(self, ck: Tuple[str, Optional[str]]) -> Any:
+        with self._lock:
+            hit = self._cache.get(ck)
+            if hit is not None and hit[0] > time.monotonic():
+                self.hits += 1
+                return hit[1]
+            self.misses += 1
+            return _MISSING
+
+    def _store(self, ck: Tuple[str, Optional[str]], value: Any) -> None:
+        with self._lock:
+            self._cache[ck] = (time.monotonic() + self.ttl, value)
+            self._cache.move_to_end(ck)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _invalidate_key(self, key: str) -> None:
+        with self._lock:
+            for ck in [ck for ck in self._cache if ck[0] == key]:
+                del self._cache[ck]
+
+    def get(self, key: str) -> Optional[str]:
+        if not self._cacheable(key):
+            return self.inner.get(key)
+        value = self._lookup((key, None))
+        if value is _MISSING:
+            value = self.inner.get(key)
+            self._store((key, None), value)
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self.inner.set(key, value, ttl)
+        if self._cacheable(key):
+            self._store((key, None), value)
+
+    def delete(self, key: str) -> None:
+        self.inner.delete(key)
+        if self._cacheable(key):
+            self._invalidate_key(key)
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        if not self._cacheable(key):
+            return self.inner.hget(key, field)
+        value = self._lookup((key, field))
+        if value is _MISSING:
+            value = self.inner.hget(key, field)
+            self._store((key, field), value)
+        return value
+
+    def hset(self, key: str, field: str, value: str) -> bool:
+        new = self.inner.hset(key, field, value)
+        if self._cacheable(key):
+            self._store((key, field), value)
+        return new
+
+    def hdel(self, key: str, *fields: str) -> None:
+        self.inner.hdel(key, *fields)
+        if self._cacheable(key):
+            with self._lock:
+                for f in fields:
+                    self._cache.pop((key, f), None)
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        return self.inner.hgetall(key)
+
+    def hlen(self, key: str) -> int:
+        return self.inner.hlen(key)
+
+    def cas(self, key: str, expected: Optional[str], value: str, ttl: Optional[float] = None) -> bool:
+        ok = self.inner.cas(key, expected, value, ttl)
+        if self._cacheable(key):
+            if ok:
+                self._store((key, None), value)
+            else:
+                self._invalidate_key(key)  # our cached copy is stale
+        return ok
+
+    def hcas(self, key: str, field: str, expected: Optional[str], value: str) -> bool:
+        ok = self.inner.hcas(key, field, expected, value)
+        if self._cacheable(key):
+            if ok:
+                self._store((key, field), value)
+            else:
+                with self._lock:
+                    self._cache.pop((key, field), None)
+        return ok
+
+    def expire(self, key: str, ttl: float) -> None:
+        self.inner.expire(key, ttl)
+
+    def update(
+        self,
+        key: str,
+        fn: Callable[[Optional[str]], Optional[str]],
+        ttl: Optional[float] = None,
+        retries: int = 16,
+    ) -> Optional[str]:
+        # read-modify-write against the backend itself, never a cached value
+        value = self.inner.update(key, fn, ttl, retries)
+        if self._cacheable(key):
+            self._store((key, None), value)
+        return value
+
+    def hupdate(
+        self,
+        key: str,
+        field: str,
+        fn: Callable[[Optional[str]], str],
+        retries: int = 16,
+    ) -> Tuple[Optional[str], str]:
+        previous, value = self.inner.hupdate(key, field, fn, retries)
+        if self._cacheable(key):
+            self._store((key, field), value)
+        return previous, value
+
+    def purge_expired(self) -> int:
+        return self.inner.purge_expired()
+
+    def stats(self) -> Dict[str, Any]:
+        out = self.inner.stats()
+        out.update({"cache_entries": len(self._cache), "cache_hits": self.hits, "cache_misses": self.misses})
+        return out
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+def make_backend(url: str, cache_ttl: float = 1.0) -> Optional[StateBackend]:
+    """
+    Backend from a URL, or None for plain in-process state:
+      ""  / "memory"              -> None
+      "sqlite:///data/state.db"   -> SQLiteBackend (relative path)
+      "sqlite:////abs/state.db"   -> SQLiteBackend (absolute path)
+      "redis://host:6379/0"       -> RedisBackend
+    A cache_ttl > 0 wraps it in a CachedBackend.
+    """
+    if not url or url == "memory":
+        return None
+    if url.startswith("sqlite:///"):
+        backend: StateBackend = SQLiteBackend(url[len("sqlite:///"):])
+    elif url.startswith("redis://"):
+        backend = RedisBackend.from_url(url)
+    else:
+        raise ValueError(f"Unsupported STATE_BACKEND: {url}")
+    return CachedBackend(backend, ttl=cache_ttl) if cache_ttl > 0 else backend
@@ -0,0 +1,99 @@
+# src/tools/bulk_image_tool.py
+from __future__ import annotations
+
+import os
+import zipfile
+from typing import BinaryIO, Iterator, Tuple, Union
+
+# Extensions OpenCV can decode; anything else inside a zip is skipped.
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".webp", ".tif", ".tiff"}
+
+# Per-image cap so a single huge (or zip-bomb) member can't exhaust memory.
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+_ZIP_MAGIC = b"PK\x03\x04"
+
+# (name, image bytes) on success, (name, exception) when that one entry failed
+BulkImage = Tuple[str, Union[bytes, Exception]]
+
+
+def is_zip_upload(filename: str, fileobj: BinaryIO) -> bool:
+    """
+    True if the upload is a zip archive (by magic bytes, falling back to the
+    extension). Leaves the file position at 0.
+    """
+    try:
+        fileobj.seek(0)
+        head = fileobj.read(len(_ZIP_MAGIC))
+        fileobj.seek(0)
+    except Exception:
+        head = b""
+
+    if head == _ZIP_MAGIC:
+        return True
+    return (filename or "").lower().endswith(".zip")
+
+
+def _read_capped(fileobj: BinaryIO, limit: int) -> bytes:
+    data = fileobj.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f"Image exceeds {limit} bytes")
+    return data
+
+
+def iter_zip_images(fileobj: BinaryIO, max_image_bytes: int = MAX_IMAGE_BYTES) -> Iterator[BulkImage]:
+    """
+    Yield images from a zip archive one member at a time.
+
+    Only the central directory is read up front; each member is decompressed
+    when the consumer asks for it, so the archive itself is never held in
+    memory. A corrupt member is reported for that entry and iteration goes on.
+    """
+    with zipfile.ZipFile(fileobj) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+
+            name = info.filename
+            base = os.path.basename(name)
+            # macOS resource forks / hidden files
+            if not base or base.startswith(".") or name.startswith("__MACOSX/"):
+                continue
+            if os.path.splitext(base)[-1].lower() not in IMAGE_EXTENSIONS:
+                continue
+
+            try:
+                if info.file_size > max_image_bytes:
+                    raise ValueError(f"Image exceeds {max_image_bytes} bytes")
+                with zf.open(info) as member:
+                    yield name, _read_capped(member, max_image_bytes)
+            except Exception as e:
+                yield name, e
+
+
+def iter_upload_images(filename: str, fileobj: BinaryIO, max_image_bytes: int = MAX_IMAGE_BYTES) -> Iterator[BulkImage]:
+    """
+    Yield images from a single upload: every image member if it's a zip,
+    otherwise the upload itself.
+    """
+    filename = filename or "upload"
+
+    try:
+        is_zip = is_zip_upload(filename, fileobj)
+    except Exception as e:
+        yield filename, e
+        return
+
+    if not is_zip:
+        try:
+            yield filename, _read_capped(fileobj, max_image_bytes)
+        except Exception as e:
+            yield filename, e
+        return
+
+    try:
+        for name, data in iter_zip_images(fileobj, max_image_bytes):
+            yield f"{filename}/{name}", data
+    except Exception as e:
+        # Unreadable archive (bad central directory etc.)
+        yield filename, e
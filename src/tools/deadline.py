@@ -0,0 +1,42 @@
+# src/tools/deadline.py
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """A stage was reached with no time left in the request's budget."""
+
+
+class Deadline:
+    """
+    Absolute point in time (monotonic clock) by which a request must be
+    answered. Each stage asks for timeout(cap): its own usual timeout,
+    shortened to whatever is left of the budget.
+    """
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str) -> None:
+        if self.expired():
+            raise DeadlineExceeded(f"Request deadline exceeded before {stage}")
+
+    def timeout(self, cap: float, stage: str = "call") -> float:
+        """min(cap, remaining); raises DeadlineExceeded if nothing is left."""
+        self.check(stage)
+        return min(cap, self.remaining())
+
+
+def timeout_for(deadline: Optional[Deadline], cap: float, stage: str = "call") -> float:
+    """A stage's timeout: cap without a deadline, else what's left of it (at most cap)."""
+    return cap if deadline is None else deadline.timeout(cap, stage)
@@ -0,0 +1,312 @@
+# src/tools/emvco_tlv_tool.py
+"""
+EMVCo merchant-presented QR (MPM) decoder.
+
+Payloads are a flat list of TLV objects: 2-digit ID, 2-digit length, value.
+Templates (26-51 merchant account info, 62 additional data, 64 language)
+nest the same structure. We walk the payload once over a memoryview of its
+code units: tags, lengths and numeric codes are read as ints straight from
+the buffer, and only the handful of values we return are materialized as
+strings.
+"""
+from __future__ import annotations
+
+import binascii
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+# ISO 4217 numeric -> alpha (tag 53)
+_CURRENCY_BY_NUMERIC: Dict[int, str] = {
+    36: "AUD", 50: "BDT", 96: "BND", 104: "MMK", 116: "KHR", 124: "CAD",
+    144: "LKR", 156: "CNY", 203: "CZK", 208: "DKK", 344: "HKD", 348: "HUF",
+    356: "INR", 360: "IDR", 376: "ILS", 392: "JPY", 410: "KRW", 418: "LAK",
+    446: "MOP", 458: "MYR", 484: "MXN", 524: "NPR", 554: "NZD", 566: "NGN",
+    578: "NOK", 586: "PKR", 608: "PHP", 643: "RUB", 682: "SAR", 702: "SGD",
+    704: "VND", 710: "ZAR", 752: "SEK", 756: "CHF", 764: "THB", 784: "AED",
+    818: "EGP", 826: "GBP", 840: "USD", 901: "TWD", 949: "TRY", 978: "EUR",
+    985: "PLN", 986: "BRL",
+}
+
+# ISO 3166-1 alpha-2 (tag 58), keyed by the two code units packed into an int
+_COUNTRY_CODES = (
+    "AD AE AF AG AI AL AM AO AQ AR AS AT AU AW AX AZ BA BB BD BE BF BG BH BI BJ BL BM BN BO BQ "
+    "BR BS BT BV BW BY BZ CA CC CD CF CG CH CI CK CL CM CN CO CR CU CV CW CX CY CZ DE DJ DK DM "
+    "DO DZ EC EE EG EH ER ES ET FI FJ FK FM FO FR GA GB GD GE GF GG GH GI GL GM GN GP GQ GR GS "
+    "GT GU GW GY HK HM HN HR HT HU ID IE IL IM IN IO IQ IR IS IT JE JM JO JP KE KG KH KI KM KN "
+    "KP KR KW KY KZ LA LB LC LI LK LR LS LT LU LV LY MA MC MD ME MF MG MH MK ML MM MN MO MP MQ "
+    "MR MS MT MU MV MW MX MY MZ NA NC NE NF NG NI NL NO NP NR NU NZ OM PA PE PF PG PH PK PL PM "
+    "PN PR PS PT PW PY QA RE RO RS RU RW SA SB SC SD SE SG SH SI SJ SK SL SM SN SO SR SS ST SV "
+    "SX SY SZ TC TD TF TG TH TJ TK TL TM TN TO TR TT TV TW TZ UA UG UM US UY UZ VA VC VE VG VI "
+    "VN VU WF WS YE YT ZA ZM ZW"
+).split()
+_COUNTRY_BY_KEY: Dict[int, str] = {(ord(c[0]) << 8) | ord(c[1]): c for c in _COUNTRY_CODES}
+
+# Merchant account template GUI -> sub-tag holding the merchant identifier.
+# Anything not listed uses sub-tag 01 (the common convention).
+_MERCHANT_ID_SUBTAG_BY_GUI: Dict[str, int] = {
+    "SG.PAYNOW": 2,          # 01 is the proxy type, 02 the UEN/mobile
+    "SG.COM.NETS": 3,
+    "A000000677010111": 1,   # PromptPay (mobile)
+    "A000000677010112": 1,   # PromptPay bill payment: 01 is the Biller ID, 02/03 per-bill references
+}
+
+_UTF32 = "utf-32-le" if sys.byteorder == "little" else "utf-32-be"
+
+
+def crc16_ccitt(data, crc: int = 0xFFFF) -> int:
+    """
+    CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), as required by tag 63.
+    binascii.crc_hqx is the same polynomial, table-driven in C.
+    """
+    return binascii.crc_hqx(data, crc)
+
+
+def is_emvco_payload(payload: str) -> bool:
+    # Tag 00 (payload format indicator) must come first with value "01"
+    return payload.startswith("000201")
+
+
+def emvco_payload_end(payload: str, start: int = 0, end: Optional[int] = None) -> int:
+    """
+    Index just past the EMVCo payload that begins at `start`, found by
+    walking TLV lengths up to and including the CRC (tag 63). Values may
+    therefore contain commas or newlines. Returns -1 if the TLV chain breaks
+    before tag 63; parse_emvco() reports the details.
+    """
+    end = len(payload) if end is None else end
+    i = start
+    while i + 4 <= end:
+        header = payload[i:i + 4]
+        if not (header.isascii() and header.isdigit()):
+            return -1
+        tag = int(header[:2])
+        i += 4 + int(header[2:])
+        if i > end:
+            return -1
+        if tag == 63:
+            return i
+    return -1
+
+
+def _code_units(payload: str) -> memoryview:
+    """
+    One int per character, so TLV lengths (counted in characters) index
+    straight into both the buffer and the original string.
+    """
+    if payload.isascii():
+        return memoryview(payload.encode("ascii"))
+    return memoryview(payload.encode(_UTF32)).cast("I")
+
+
+def _two_digits(buf: memoryview, i: int) -> int:
+    d0 = buf[i] - 48
+    d1 = buf[i + 1] - 48
+    if not (0 <= d0 <= 9 and 0 <= d1 <= 9):
+        raise ValueError(f"Invalid EMVCo TLV header at offset {i}")
+    return d0 * 10 + d1
+
+
+def _numeric(buf: memoryview, start: int, end: int) -> int:
+    n = 0
+    for i in range(start, end):
+        d = buf[i] - 48
+        if not 0 <= d <= 9:
+            raise ValueError(f"Expected numeric EMVCo value at offset {start}")
+        n = n * 10 + d
+    return n
+
+
+def _find_subtag(buf: memoryview, start: int, end: int, wanted: int) -> Optional[Tuple[int, int]]:
+    """Walk a template's value range and return (start, end) of one sub-tag."""
+    i = start
+    while i < end:
+        if i + 4 > end:
+            raise ValueError("Truncated EMVCo template")
+        tag = _two_digits(buf, i)
+        length = _two_digits(buf, i + 2)
+        v0 = i + 4
+        i = v0 + length
+        if i > end:
+            raise ValueError(f"EMVCo sub-tag {tag:02d} overruns its template")
+        if tag == wanted:
+            return v0, i
+    return None
+
+
+def _first_subtag_after_gui(buf: memoryview, start: int, end: int) -> Optional[Tuple[int, int]]:
+    i = start
+    while i + 4 <= end:
+        tag = _two_digits(buf, i)
+        length = _two_digits(buf, i + 2)
+        v0 = i + 4
+        i = v0 + length
+        if tag != 0 and length:
+            return v0, min(i, end)
+    return None
+
+
+def parse_emvco(payload: str, verify_crc: bool = True) -> Dict[str, Any]:
+    """
+    Decode an EMVCo merchant-presented QR payload into the same shape as
+    QRParserAgent items (minus qr_id).
+
+    Raises ValueError on malformed TLV, CRC mismatch, or missing
+    mandatory currency/country.
+    """
+    buf = _code_units(payload)
+    n = len(buf)
+
+    currency: Optional[str] = None
+    country: Optional[str] = None
+    amount_span = name_span = city_span = mcc_span = None
+    card_mid_span = None        # tags 02-25: card network merchant IDs
+    account_span = None         # first template in 26-51
+    poi = 0
+    crc_value_at = -1
+
+    i = 0
+    while i < n:
+        if i + 4 > n:
+            raise ValueError("Truncated EMVCo payload")
+        # inlined _two_digits x2: this loop is the hot path
+        t0, t1, l0, l1 = buf[i] - 48, buf[i + 1] - 48, buf[i + 2] - 48, buf[i + 3] - 48
+        if not (0 <= t0 <= 9 and 0 <= t1 <= 9 and 0 <= l0 <= 9 and 0 <= l1 <= 9):
+            raise ValueError(f"Invalid EMVCo TLV header at offset {i}")
+        tag = t0 * 10 + t1
+        length = l0 * 10 + l1
+        v0 = i + 4
+        v1 = v0 + length
+        if v1 > n:
+            raise ValueError(f"EMVCo tag {tag:02d} overruns payload")
+
+        if tag == 63:
+            if length != 4 or v1 != n:
+                raise ValueError("EMVCo CRC (tag 63) must be the last 4-char field")
+            crc_value_at = v0
+        elif tag == 54:
+            amount_span = (v0, v1)
+        elif tag == 53:
+            code = _numeric(buf, v0, v1)
+            currency = _CURRENCY_BY_NUMERIC.get(code)
+            if currency is None:
+                raise ValueError(f"Unknown ISO 4217 currency code: {code:03d}")
+        elif tag == 58:
+            if length != 2:
+                raise ValueError("EMVCo country code (tag 58) must be 2 chars")
+            country = _COUNTRY_BY_KEY.get((buf[v0] << 8) | buf[v0 + 1])
+            if country is None:
+                raise ValueError(f"Unknown country code: {payload[v0:v1]}")
+        elif 26 <= tag <= 51:
+            if account_span is None:
+                account_span = (v0, v1)
+        elif 2 <= tag <= 25:
+            if card_mid_span is None:
+                card_mid_span = (v0, v1)
+        elif tag == 59:
+            name_span = (v0, v1)
+        elif tag == 60:
+            city_span = (v0, v1)
+        elif tag == 52:
+            mcc_span = (v0, v1)
+        elif tag == 1:
+            poi = _numeric(buf, v0, v1)
+
+        i = v1
+
+    if crc_value_at < 0:
+        raise ValueError("EMVCo payload missing CRC (tag 63)")
+    if verify_crc:
+        if payload.isascii():
+            crc_input = buf[:crc_value_at]
+        else:
+            crc_input = payload[:crc_value_at].encode("utf-8")
+        expected = crc16_ccitt(crc_input)
+        try:
+            got = int(payload[crc_value_at:], 16)
+        except ValueError:
+            got = -1
+        if got != expected:
+            raise ValueError(f"EMVCo CRC mismatch (expected {expected:04X})")
+
+    if currency is None:
+        raise ValueError("EMVCo payload missing transaction currency (tag 53)")
+    if country is None:
+        raise ValueError("EMVCo payload missing country code (tag 58)")
+
+    merchant_id = ""
+    gui = ""
+    if account_span is not None:
+        a0, a1 = account_span
+        gui_span = _find_subtag(buf, a0, a1, 0)
+        if gui_span is not None:
+            gui = payload[gui_span[0]:gui_span[1]]
+        sub = _MERCHANT_ID_SUBTAG_BY_GUI.get(gui.upper(), 1)
+        mid_span = _find_subtag(buf, a0, a1, sub) or _first_subtag_after_gui(buf, a0, a1)
+        if mid_span is not None:
+            merchant_id = payload[mid_span[0]:mid_span[1]]
+    if not merchant_id and card_mid_span is not None:
+        merchant_id = payload[card_mid_span[0]:card_mid_span[1]]
+    if not merchant_id:
+        raise ValueError("EMVCo payload has no merchant account information")
+
+    amount = 0.0
+    if amount_span is not None:
+        try:
+            amount = float(payload[amount_span[0]:amount_span[1]])
+        except ValueError:
+            raise ValueError("Invalid EMVCo transaction amount (tag 54)")
+
+    def _s(span):
+        return payload[span[0]:span[1]] if span is not None else ""
+
+    return {
+        "merchant_id": merchant_id,
+        "country": country,
+        "currency": currency,
+        "amount": amount,
+        "raw_fields": {
+            "raw": payload,
+            "format": "emvco",
+            "merchant_name": _s(name_span),
+            "merchant_city": _s(city_span),
+            "mcc": _s(mcc_span),
+            "account_gui": gui,
+            # static QRs carry no amount (the payer types it in)
+            "point_of_initiation": "dynamic" if poi == 12 else "static",
+            "amount_present": amount_span is not None,
+        },
+    }
+
+
+def _tlv(tag: int, value: str) -> str:
+    return f"{tag:02d}{len(value):02d}{value}"
+
+
+def build_emvco_payload(
+    merchant_id: str,
+    country: str,
+    currency_numeric: str,
+    amount: Optional[str] = None,
+    merchant_name: str = "MERCHANT",
+    merchant_city: str = "CITY",
+    gui: str = "A000000677010111",
+    mcc: str = "5411",
+) -> str:
+    """
+    Build a valid EMVCo payload (with CRC). Handy for tests, benchmarks and
+    demo stickers.
+    """
+    account = _tlv(0, gui) + _tlv(_MERCHANT_ID_SUBTAG_BY_GUI.get(gui.upper(), 1), merchant_id)
+    body = (
+        _tlv(0, "01")
+        + _tlv(1, "12" if amount else "11")
+        + _tlv(29, account)
+        + _tlv(52, mcc)
+        + _tlv(53, currency_numeric)
+        + (_tlv(54, amount) if amount else "")
+        + _tlv(58, country)
+        + _tlv(59, merchant_name)
+        + _tlv(60, merchant_city)
+        + "6304"
+    )
+    return body + f"{crc16_ccitt(body.encode('utf-8')):04X}"
@@ -1,9 +1,16 @@
-def compute_fees(base_home: float) -> dict:
+DEFAULT_MARKUP_PCT = 0.03     # 3% markup
+DEFAULT_NETWORK_FEE = 11.0    # flat fee
+
+
+def compute_fees(
+    base_home: float,
+    markup_pct: float = DEFAULT_MARKUP_PCT,
+    network_fee: float = DEFAULT_NETWORK_FEE,
+) -> dict:
     """
     Compute markup + network fee in home currency.
     """
-    markup = base_home * 0.03     # 3% markup
-    network_fee = 11.0            # flat fee
+    markup = base_home * markup_pct
     return {
         "markup_home": markup,
         "network_fee_home": network_fee,
@@ -1,6 +1,8 @@
 import requests
 
-API_BASE = "https://open.er-api.com/v6/latest/"
+from src.config import FX_ER_API_BASE
+
+API_BASE = FX_ER_API_BASE
 
 
 def get_live_fx_rate(from_currency: str, to_currency: str):
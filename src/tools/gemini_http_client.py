@@ -1,7 +1,13 @@
 import os
+import threading
 import time
+from typing import Optional
+
 import requests
 
+from src.config import GEMINI_API_BASE, GEMINI_HTTP_TIMEOUT
+from src.tools.deadline import Deadline, DeadlineExceeded, timeout_for
+
 
 class GeminiHTTPError(Exception):
     def __init__(self, message: str, status_code: int = 0, payload: str = ""):
@@ -12,14 +18,23 @@ class GeminiHTTPError(Exception):
 
 # Simple global cooldown to avoid repeated 429 spam
 _GEMINI_COOLDOWN_UNTIL = 0.0
+_COOLDOWN_LOCK = threading.Lock()
+
+
+def _cooldown_active() -> bool:
+    return time.time() < _GEMINI_COOLDOWN_UNTIL  # single read of a float, no lock needed
 
 
-def call_gemini(prompt: str) -> str:
+def _start_cooldown(delay: float) -> None:
     global _GEMINI_COOLDOWN_UNTIL
+    with _COOLDOWN_LOCK:
+        # concurrent 429s only ever extend the window, never shorten it
+        _GEMINI_COOLDOWN_UNTIL = max(_GEMINI_COOLDOWN_UNTIL, time.time() + delay)
 
+
+def call_gemini(prompt: str, deadline: Optional[Deadline] = None) -> str:
     # If we're in cooldown window, skip calling Gemini
-    now = time.time()
-    if now < _GEMINI_COOLDOWN_UNTIL:
+    if _cooldown_active():
         raise GeminiHTTPError("Gemini cooldown active (skipping call)", status_code=429)
 
     api_key = os.getenv("GEMINI_API_KEY", "").strip()
@@ -29,7 +44,7 @@ def call_gemini(prompt: str) -> str:
     # You can change model if you want
     model = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
+    url = f"{GEMINI_API_BASE}/models/{model}:generateContent?key={api_key}"
 
     payload = {
         "contents": [
@@ -38,7 +53,12 @@ def call_gemini(prompt: str) -> str:
     }
 
     try:
-        resp = requests.post(url, json=payload, timeout=30)
+        timeout = timeout_for(deadline, GEMINI_HTTP_TIMEOUT, "Gemini call")
+    except DeadlineExceeded as e:
+        raise GeminiHTTPError(str(e), status_code=504)
+
+    try:
+        resp = requests.post(url, json=payload, timeout=timeout)
     except requests.RequestException as e:
         raise GeminiHTTPError(f"Gemini request failed: {e}", status_code=0)
 
@@ -51,7 +71,7 @@ def call_gemini(prompt: str) -> str:
                 delay = int(retry_after)
             except Exception:
                 pass
-        _GEMINI_COOLDOWN_UNTIL = time.time() + delay
+        _start_cooldown(delay)
         raise GeminiHTTPError(f"Gemini HTTP error 429 (quota/rate limit). Cooling down {delay}s.", 429, resp.text)
 
     if resp.status_code >= 400:
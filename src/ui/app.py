@@ -6,6 +6,7 @@ import gradio as gr
 from src.orchestration.orchestrator_agent import OrchestratorAgent
 from src.orchestration.session_manager import InMemorySessionService
 from src.orchestration.memory_manager import SimpleMemoryBank
+from src.persistence.profile_store import ProfileStore
 from src.observability.logging_config import setup_logging
 
 
@@ -13,10 +14,10 @@ setup_logging()
 
 # ---- Backend wiring ----
 sessions = InMemorySessionService()
-memory = SimpleMemoryBank()
+memory = SimpleMemoryBank(profiles=ProfileStore())
 
 user_id = "ui-user"
-memory.upsert_profile(user_id, {
+memory.seed_profile(user_id, {
     "home_currency": "INR",
     "preferred_card": "VISA",
     "risk_preference": "balanced",
@@ -0,0 +1,7 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# Keep API tests from writing scan history and profiles into the repo's data/ dir.
+os.environ["HISTORY_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="qr-history-"), "history.db")
+os.environ["PROFILE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="qr-profiles-"), "profiles.db")
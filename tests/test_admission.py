@@ -0,0 +1,147 @@
+# tests/test_admission.py
+import asyncio
+import time
+
+import pytest
+from starlette.middleware.cors import CORSMiddleware
+
+from src.agents.fx_rate_agent import FXRateAgent, _RATE_CACHE
+from src.api.admission import AdmissionControl, RequestBudgets, parse_budgets
+from src.tools import gemini_http_client as gemini
+from src.tools.deadline import Deadline, DeadlineExceeded, timeout_for
+from src.tools.decode_qr_image_tool import decode_qr_image_bytes
+
+
+def _scope(path, method="GET", headers=()):
+    return {"type": "http", "method": method, "path": path, "headers": list(headers), "query_string": b""}
+
+
+def test_parse_budgets_and_per_path_deadlines():
+    budgets = RequestBudgets(20.0, parse_budgets(" /api/scan-text=8, /api/scan-images=0 ,"))
+    assert budgets.seconds("/api/scan-text") == 8.0
+    assert budgets.seconds("/api/history") == 20.0
+    assert budgets.deadline("/api/scan-images") is None
+    assert 7.9 < budgets.deadline("/api/scan-text").remaining() <= 8.0
+
+    with pytest.raises(ValueError):
+        parse_budgets("scan-text:8")
+
+
+def test_deadline_caps_stage_timeouts():
+    assert timeout_for(None, 15.0) == 15.0
+    assert timeout_for(Deadline(60), 15.0) == 15.0
+    assert timeout_for(Deadline(2), 15.0) <= 2.0
+    with pytest.raises(DeadlineExceeded):
+        timeout_for(Deadline(0), 15.0, "FX")
+
+
+def test_admission_rejects_past_limit_with_retry_after():
+    release = asyncio.Event()
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen[scope["path"]] = scope["state"]["deadline"]
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    mw = AdmissionControl(app, RequestBudgets(5.0), max_in_flight=1, retry_after=3)
+
+    async def call(path):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await mw(_scope(path), None, send)
+        return sent
+
+    async def scenario():
+        first = asyncio.create_task(call("/api/scan-text"))
+        await asyncio.sleep(0)
+        busy = await call("/api/scan-text")
+        health = asyncio.create_task(call("/api/health"))  # exempt: admitted despite the limit
+        await asyncio.sleep(0)
+        assert mw.in_flight == 1
+        release.set()
+        return busy, await first, await health
+
+    busy, first, health = asyncio.run(scenario())
+    assert busy[0]["status"] == 503
+    assert (b"retry-after", b"3") in busy[0]["headers"]
+    assert first[0]["status"] == 200 and health[0]["status"] == 200
+    assert mw.in_flight == 0 and mw.rejected == 1
+    assert isinstance(seen["/api/scan-text"], Deadline)
+
+
+def test_saturated_503_keeps_cors_headers_and_preflight_passes():
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    mw = AdmissionControl(app, RequestBudgets(5.0), max_in_flight=1)
+    # same nesting as the server: CORS is added last, so it wraps admission control
+    stack = CORSMiddleware(mw, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+    origin = (b"origin", b"http://localhost:5173")
+
+    async def call(method, headers=()):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await stack(_scope("/api/scan-text", method, [origin, *headers]), None, send)
+        return sent
+
+    async def scenario():
+        first = asyncio.create_task(call("POST"))
+        await asyncio.sleep(0)
+        busy = await call("POST")
+        preflight = await call("OPTIONS", [(b"access-control-request-method", b"POST")])
+        release.set()
+        await first
+        return busy, preflight
+
+    busy, preflight = asyncio.run(scenario())
+    assert busy[0]["status"] == 503
+    assert (b"access-control-allow-origin", b"*") in busy[0]["headers"]
+    assert (b"retry-after", b"1") in busy[0]["headers"]
+    assert preflight[0]["status"] == 200
+    assert mw.rejected == 1
+
+
+def test_fx_uses_remaining_budget_then_falls_back(monkeypatch):
+    timeouts = []
+
+    def fetch(self, f, t, timeout=None):
+        timeouts.append(timeout)
+        return 0.5
+
+    monkeypatch.setattr(FXRateAgent, "_fetch_live_rate", fetch)
+    _RATE_CACHE.pop(("AAA", "CCC"), None)
+    agent = FXRateAgent()
+
+    assert agent.handle(10.0, "AAA", "CCC", deadline=Deadline(2))["provider"] == "exchangerate.host-live"
+    assert 0 < timeouts[0] <= 2.0
+
+    _RATE_CACHE.pop(("AAA", "CCC"), None)
+    t0 = time.perf_counter()
+    fx = agent.handle(10.0, "AAA", "CCC", deadline=Deadline(0))
+    assert fx["provider"] == "mock-fx" and len(timeouts) == 1  # no live call, no retry sleep
+    assert time.perf_counter() - t0 < 0.5
+    _RATE_CACHE.pop(("AAA", "CCC"), None)
+
+
+def test_gemini_and_decoder_refuse_expired_deadline(monkeypatch):
+    monkeypatch.setattr(gemini, "_GEMINI_COOLDOWN_UNTIL", 0.0)
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(gemini.requests, "post", lambda *a, **kw: pytest.fail("Gemini called past deadline"))
+    with pytest.raises(gemini.GeminiHTTPError) as e:
+        gemini.call_gemini("hi", deadline=Deadline(0))
+    assert e.value.status_code == 504
+
+    with pytest.raises(DeadlineExceeded):
+        decode_qr_image_bytes(b"\x89PNG", deadline=Deadline(0))
@@ -1,12 +1,22 @@
 # tests/test_api.py
+import csv
+import io
+import json
+
+import pytest
 
 from fastapi.testclient import TestClient
-from src.api.server import app
+from src.api.server import app, history_rollups, history_writer
 
 
 client = TestClient(app)
 
 
+def _flush_history():
+    # reads don't wait on the write-behind queue; the tests do
+    assert history_writer.flush()
+
+
 def test_health_endpoint():
     """
     Basic health check to ensure the API is up.
@@ -71,6 +81,7 @@ def test_history_endpoint_after_scan():
         "session_id": ""
     }
     client.post("/api/scan-text", json=payload)
+    _flush_history()
 
     # Now call /api/history
     resp = client.get("/api/history")
@@ -90,3 +101,126 @@ def test_history_endpoint_after_scan():
     assert "total_home" in item
     assert "risk_level" in item
     assert "note" in item
+
+
+def test_history_pages_and_filters_persisted_scans(monkeypatch):
+    from src.agents.fx_rate_agent import FXRateAgent
+
+    monkeypatch.setattr(FXRateAgent, "_fetch_live_rate", lambda self, f, t, timeout=None: 0.55)
+    for amount in (100, 200, 300):
+        client.post("/api/scan-text", json={"user_id": "pager", "qr_payload": f"QR:JP:JPY:{amount}"})
+    _flush_history()
+
+    first = client.get("/api/history", params={"user_id": "pager", "limit": 2}).json()
+    assert [it["input_repr"] for it in first["items"]] == ["QR:JP:JPY:300", "QR:JP:JPY:200"]
+    assert first["items"][0]["timestamp"] and first["next_cursor"]
+
+    rest = client.get("/api/history", params={"user_id": "pager", "cursor": first["next_cursor"]}).json()
+    assert [it["input_repr"] for it in rest["items"]] == ["QR:JP:JPY:100"]
+    assert rest["next_cursor"] is None
+
+    assert client.get("/api/history", params={"user_id": "pager", "risk_level": "critical"}).json()["items"] == []
+    assert client.get("/api/history", params={"user_id": "pager", "cursor": "garbage"}).status_code == 400
+
+
+def test_analytics_reads_rollups(monkeypatch):
+    from src.agents.fx_rate_agent import FXRateAgent
+
+    monkeypatch.setattr(FXRateAgent, "_fetch_live_rate", lambda self, f, t, timeout=None: 0.55)
+    client.post("/api/scan-text", json={"user_id": "analyst", "qr_payload": "QR:JP:JPY:1500"})
+    _flush_history()
+    history_rollups.refresh()  # the background job's work
+    monkeypatch.setattr(history_rollups, "refresh", lambda: pytest.fail("GET /api/analytics refreshed inline"))
+
+    data = client.get("/api/analytics", params={"user_id": "analyst", "days": 7}).json()
+    assert data["scope"] == "analyst"
+    assert data["spend_by_currency"]["JPY"]["scans"] == 1
+    assert sum(data["risk_levels"].values()) == 1
+    assert data["top_merchants"][0]["scans"] == 1
+    assert client.get("/api/analytics").json()["scope"] == "*"
+
+
+def test_history_export_streams_ndjson_and_csv(monkeypatch):
+    from src.agents.fx_rate_agent import FXRateAgent
+
+    monkeypatch.setattr(FXRateAgent, "_fetch_live_rate", lambda self, f, t, timeout=None: 0.55)
+    for amount in (10, 20):
+        client.post("/api/scan-text", json={"user_id": "exporter", "qr_payload": f"QR:JP:JPY:{amount}"})
+    _flush_history()
+
+    resp = client.get("/api/history/export", params={"user_id": "exporter", "include_raw": True})
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["input_repr"] for r in rows] == ["QR:JP:JPY:10", "QR:JP:JPY:20"]
+    assert rows[0]["raw"]["qr_info"]["amount"] == 10.0
+
+    resp = client.get("/api/history/export", params={"user_id": "exporter", "format": "csv"})
+    records = list(csv.DictReader(io.StringIO(resp.text)))  # notes are multi-line, so parse properly
+    assert [r["input_repr"] for r in records] == ["QR:JP:JPY:10", "QR:JP:JPY:20"]
+    assert records[0]["user_id"] == "exporter" and "Total estimated charge" in records[0]["note"]
+
+    assert client.get("/api/history/export", params={"date_from": "soon"}).status_code == 400
+
+
+def test_profile_crud_drives_home_currency(monkeypatch):
+    from src.agents.fx_rate_agent import FXRateAgent
+
+    monkeypatch.setattr(FXRateAgent, "_fetch_live_rate", lambda self, f, t, timeout=None: 0.55)
+    assert client.get("/api/profiles/traveller").status_code == 404
+
+    resp = client.put("/api/profiles/traveller", json={"home_currency": "usd", "preferred_card": "AMEX"})
+    assert resp.json()["profile"] == {"home_currency": "USD", "preferred_card": "AMEX"}
+    resp = client.patch("/api/profiles/traveller", json={"risk_preference": "low"})
+    assert resp.json()["profile"]["risk_preference"] == "low"
+    assert client.get("/api/profiles/traveller").json()["profile"]["home_currency"] == "USD"
+
+    scan = client.post("/api/scan-text", json={"user_id": "traveller", "qr_payload": "QR:JP:JPY:1000"}).json()
+    assert scan["fx_result"]["to_currency"] == "USD"
+
+    assert client.put("/api/profiles/traveller", json={"home_currency": "dollars"}).status_code == 422
+    assert client.delete("/api/profiles/traveller").json()["ok"] is True
+    assert client.delete("/api/profiles/traveller").status_code == 404
+
+
+def test_ws_scan_session_pushes_result_then_explanation(monkeypatch):
+    from src.agents.fx_rate_agent import FXRateAgent
+
+    monkeypatch.setattr(FXRateAgent, "_fetch_live_rate", lambda self, f, t, timeout=None: 0.55)
+    with client.websocket_connect("/api/ws/scan?user_id=ws-user") as ws:
+        ready = ws.receive_json()
+        assert ready["type"] == "ready" and ready["home_currency"] == "INR"
+
+        for i, payload in enumerate(["QR:JP:JPY:1500", "QR:JP:JPY:200,QR:TH:THB:100"], start=1):
+            ws.send_json({"qr_payload": payload, "id": f"q{i}"})
+            result = ws.receive_json()
+            assert (result["type"], result["seq"], result["id"]) == ("result", i, f"q{i}")
+            assert result["result"]["session_id"] == ready["session_id"]
+            assert result["result"]["message"] == ""
+            explanation = ws.receive_json()
+            assert (explanation["type"], explanation["seq"]) == ("explanation", i)
+            assert explanation["message"]
+
+        assert result["result"]["multiple"] is True
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_bytes(b"garbage")
+        error = ws.receive_json()
+        assert (error["type"], error["seq"], error["id"]) == ("error", 4, None)
+
+    session = client.get("/api/history", params={"session_id": ready["session_id"]}).json()
+    assert len(session["history"]) == 4  # two scans, two replies, same session
+
+
+def test_ws_scan_takes_an_admission_slot(monkeypatch):
+    from src.api import server
+
+    limiter = server.admission_limiter
+    monkeypatch.setattr(limiter, "max_in_flight", 1)
+    monkeypatch.setattr(limiter, "in_flight", 1)  # pool already saturated by HTTP requests
+    with client.websocket_connect("/api/ws/scan?user_id=ws-busy") as ws:
+        assert ws.receive_json()["type"] == "ready"
+        ws.send_json({"qr_payload": "QR:JP:JPY:1500", "id": "q1"})
+        busy = ws.receive_json()
+        assert (busy["type"], busy["seq"]) == ("error", 1)
+        assert "busy" in busy["error"]
+    assert limiter.in_flight == 1  # the refused scan released nothing it did not take
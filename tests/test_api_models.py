@@ -0,0 +1,65 @@
+# tests/test_api_models.py
+import json
+import random
+
+from src.api import responses
+from src.api.models import (
+    BulkScanLine,
+    MultiScanResponse,
+    ScanErrorResponse,
+    ScanItemError,
+    ScanResponse,
+    to_scan_response,
+)
+from src.eval.bench_history_raw import _scan
+from src.eval.bench_serialization import make_multi_result
+
+
+def _single():
+    item, _, _ = _scan(random.Random(1), 1)
+    return {"session_id": "s1", "user_country": None, **item, "message": "ok"}
+
+
+def test_single_scan_round_trips_with_success_flag():
+    result = _single()
+    resp = to_scan_response(result)
+    assert isinstance(resp, ScanResponse)
+
+    body = json.loads(responses.dumps(resp))
+    assert body.pop("success") is True
+    assert body == result
+
+
+def test_multi_scan_keeps_item_errors():
+    result = make_multi_result(3)
+    result["items"].append({"qr_info": {"error": "bad crc", "raw_fields": {}}, "error": "bad crc"})
+    result["errors"] = 1
+
+    resp = to_scan_response(result)
+    assert isinstance(resp, MultiScanResponse)
+    assert isinstance(resp.items[-1], ScanItemError)
+
+    body = json.loads(responses.dumps(resp))
+    assert body["multiple"] is True and body["success"] is True
+    assert body["items"][-1] == {"qr_info": {"error": "bad crc", "raw_fields": {}}, "error": "bad crc"}
+    assert body["items"][:3] == result["items"][:3]
+
+
+def test_error_result_and_missing_velocity():
+    resp = to_scan_response({"session_id": "s", "user_country": "IN", "error": "QR parse failed", "message": "x"})
+    assert isinstance(resp, ScanErrorResponse)
+    assert json.loads(responses.dumps(resp))["success"] is False
+
+    result = _single()
+    del result["risk_result"]["velocity"]
+    assert json.loads(responses.dumps(to_scan_response(result)))["risk_result"]["velocity"] is None
+
+
+def test_bulk_line_and_stdlib_fallback_match_orjson(monkeypatch):
+    line = BulkScanLine.from_dict({"file": "a.png", "ok": True, "result": make_multi_result(2)})
+    fast = responses.dumps(line)
+
+    monkeypatch.setattr(responses, "orjson", None)
+    slow = responses.dumps(line)
+    assert json.loads(slow) == json.loads(fast)
+    assert json.loads(slow)["result"]["count"] == 2
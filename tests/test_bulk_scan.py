@@ -0,0 +1,80 @@
+# tests/test_bulk_scan.py
+
+import io
+import json
+import zipfile
+
+import cv2
+from fastapi.testclient import TestClient
+
+from src.agents.fx_rate_agent import FXRateAgent
+from src.api.server import app, orchestrator
+from src.tools.bulk_image_tool import iter_upload_images
+from src.tools.deadline import Deadline
+
+
+client = TestClient(app)
+
+
+def _qr_png(text: str) -> bytes:
+    img = cv2.QRCodeEncoder.create().encode(text)
+    img = cv2.resize(img, None, fx=8, fy=8, interpolation=cv2.INTER_NEAREST)
+    img = cv2.copyMakeBorder(img, 40, 40, 40, 40, cv2.BORDER_CONSTANT, value=255)
+    ok, buf = cv2.imencode(".png", img)
+    assert ok
+    return buf.tobytes()
+
+
+def _zip(members) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def test_iter_upload_images_skips_non_images_in_zip():
+    data = _zip([
+        ("a.png", b"not really a png"),
+        ("readme.txt", b"hello"),
+        ("__MACOSX/._a.png", b"junk"),
+    ])
+
+    items = list(iter_upload_images("batch.zip", io.BytesIO(data)))
+
+    assert [name for name, _ in items] == ["batch.zip/a.png"]
+    assert items[0][1] == b"not really a png"
+
+
+def test_scan_images_bulk_isolates_per_file_errors(monkeypatch):
+    monkeypatch.setattr(FXRateAgent, "_fetch_live_rate", lambda self, f, t, timeout=None: 0.55)
+
+    archive = _zip([
+        ("jp.png", _qr_png("QR:JP:JPY:1500")),
+        ("broken.png", b"garbage"),
+    ])
+    files = [
+        ("files", ("stickers.zip", archive, "application/zip")),
+        ("files", ("us.png", _qr_png("QR:US:USD:12"), "image/png")),
+    ]
+
+    resp = client.post("/api/scan-images", files=files)
+    assert resp.status_code == 200
+
+    lines = [json.loads(line) for line in resp.text.splitlines() if line.strip()]
+    by_file = {line["file"]: line for line in lines}
+
+    assert set(by_file) == {"stickers.zip/jp.png", "stickers.zip/broken.png", "us.png"}
+    assert by_file["stickers.zip/broken.png"]["ok"] is False
+    assert by_file["stickers.zip/jp.png"]["ok"] is True
+    assert by_file["stickers.zip/jp.png"]["result"]["fx_result"]["from_currency"] == "JPY"
+    assert by_file["us.png"]["result"]["qr_info"]["currency"] == "USD"
+
+
+def test_bulk_scan_honours_request_deadline():
+    images = [("a.png", _qr_png("QR:JP:JPY:1500")), ("b.png", _qr_png("QR:US:USD:12"))]
+
+    lines = list(orchestrator.handle_bulk_image_scan("u1", "", iter(images), deadline=Deadline(0)))
+
+    assert sorted(line["file"] for line in lines) == ["a.png", "b.png"]
+    assert all(not line["ok"] and "deadline" in line["error"] for line in lines)
@@ -0,0 +1,140 @@
+# tests/test_concurrency.py
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import src.tools.gemini_http_client as gemini
+from src.agents.fx_rate_agent import FXRateAgent, _RATE_CACHE
+from src.orchestration.memory_manager import SimpleMemoryBank
+from src.orchestration.session_manager import InMemorySessionService, MessageRing, SessionState
+from src.orchestration.velocity_tracker import VelocityTracker
+
+THREADS = 16
+
+
+@pytest.fixture(autouse=True)
+def frequent_thread_switches():
+    # switch threads far more often than the 5ms default to surface races
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(old)
+
+
+def _hammer(fn, n_threads=THREADS):
+    """Run fn(thread_index) on n_threads threads released together; re-raise any error."""
+    start = threading.Barrier(n_threads)
+
+    def run(i):
+        start.wait()
+        fn(i)
+
+    with ThreadPoolExecutor(n_threads) as pool:
+        for f in [pool.submit(run, i) for i in range(n_threads)]:
+            f.result()
+
+
+def test_memory_bank_counts_are_exact_under_contention():
+    memory = SimpleMemoryBank(max_merchants=1000)
+    rounds = 300
+
+    def work(i):
+        for r in range(rounds):
+            user = f"u{r % 8}"
+            memory.add_recent_merchant(f"M{r % 20}", "JP", user_id=user)
+            memory.get_recent_merchants(user)  # iterates while others write
+            memory.upsert_profile(user, {f"k{i}": r})
+
+    _hammer(work)
+
+    total = sum(m["count"] for u in range(8) for m in memory.get_recent_merchants(f"u{u}"))
+    assert total == THREADS * rounds
+    assert len(memory.get_profile("u0")) == THREADS
+
+
+def test_session_history_appends_are_not_lost():
+    state = SessionState(session_id="s", messages=MessageRing(8))
+    per_thread = 500
+
+    _hammer(lambda i: [state.add_message("user" if j % 2 else "assistant", f"{i}-{j}") for j in range(per_thread)])
+
+    kept = len(state.messages)
+    assert kept == 8
+    assert kept + state.summary.scans + state.summary.replies == THREADS * per_thread
+
+
+def test_session_service_bounds_hold_under_contention():
+    svc = InMemorySessionService(ttl_seconds=3600, max_entries=50)
+
+    def work(i):
+        for _ in range(200):
+            s = svc.create_session()
+            s.add_message("user", "scan")
+            svc.update_session(s)
+            svc.get_session(s.session_id)
+            svc.sweep()
+
+    _hammer(work)
+
+    assert len(svc) == 50
+    # an update can re-insert a session another thread just evicted
+    assert svc.evicted >= THREADS * 200 - 50
+    assert svc.approx_bytes == sum(e.size for e in svc._sessions.values())
+
+
+def test_velocity_counts_are_exact_under_contention():
+    tracker = VelocityTracker()
+    per_thread = 200
+
+    _hammer(lambda i: [tracker.record("u1", f"M{i}", "JPY", 1.0, now=1000.0) for _ in range(per_thread)])
+
+    feats = tracker.record("u1", "M0", "JPY", 0.0, now=1000.0)
+    assert feats["scans_per_minute"] == THREADS * per_thread + 1
+    assert feats["spend_per_hour"] == THREADS * per_thread
+    assert feats["distinct_merchants_per_day"] == THREADS
+
+
+def test_fx_cache_miss_is_single_flight(monkeypatch):
+    calls = []
+
+    def slow_fetch(self, f, t, timeout=None):
+        calls.append((f, t))
+        time.sleep(0.1)
+        return 0.5
+
+    monkeypatch.setattr(FXRateAgent, "_fetch_live_rate", slow_fetch)
+    _RATE_CACHE.pop(("AAA", "BBB"), None)
+    agent = FXRateAgent()
+    results = []
+
+    _hammer(lambda i: results.append(agent.handle(100.0, "AAA", "BBB")["rate"]))
+
+    assert calls == [("AAA", "BBB")]
+    assert results == [0.5] * THREADS
+    _RATE_CACHE.pop(("AAA", "BBB"), None)
+
+
+def test_gemini_cooldown_only_extends(monkeypatch):
+    monkeypatch.setattr(gemini, "_GEMINI_COOLDOWN_UNTIL", 0.0)
+
+    _hammer(lambda i: gemini._start_cooldown(10 + i))
+
+    remaining = gemini._GEMINI_COOLDOWN_UNTIL - time.time()
+    assert 10 + THREADS - 2 < remaining <= 10 + THREADS - 1
+    assert gemini._cooldown_active()
+
+
+def test_different_users_do_not_share_a_lock():
+    memory = SimpleMemoryBank()
+    other = next(u for u in (f"user{i}" for i in range(100)) if memory._stripe(u) is not memory._stripe("alice"))
+
+    with memory._stripe("alice"):  # alice's stripe is busy
+        t = threading.Thread(target=memory.add_recent_merchant, args=("M1", "JP", other))
+        t.start()
+        t.join(timeout=2)
+        assert not t.is_alive()
+
+    assert memory.has_recent_merchant("M1", other)
@@ -0,0 +1,67 @@
+# tests/test_decode_qr_image.py
+
+import subprocess
+import sys
+import threading
+
+import cv2
+
+from src.observability.metrics import metrics
+from src.tools.decode_qr_image_tool import DecodePool, decode_qr_image_bytes, warm_up_decoder
+
+
+def _qr_png(text: str) -> bytes:
+    img = cv2.QRCodeEncoder.create().encode(text)
+    img = cv2.resize(img, None, fx=8, fy=8, interpolation=cv2.INTER_NEAREST)
+    img = cv2.copyMakeBorder(img, 40, 40, 40, 40, cv2.BORDER_CONSTANT, value=255)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+def test_text_only_import_does_not_load_opencv():
+    code = (
+        "import sys; import src.orchestration.orchestrator_agent; "
+        "print('cv2' in sys.modules)"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+def test_warm_up_moves_first_decode_off_the_scan_path():
+    png = _qr_png("QR:JP:JPY:1500")
+    results = {}
+
+    def worker():
+        first_before = metrics.latency("qr_decode.first_ms").count
+        warmup_before = metrics.latency("qr_decode.warmup_ms").count
+        warm_up_decoder()
+        results["first_delta"] = metrics.latency("qr_decode.first_ms").count - first_before
+        results["warmup_delta"] = metrics.latency("qr_decode.warmup_ms").count - warmup_before
+
+        steady_before = metrics.latency("qr_decode.steady_ms").count
+        results["payloads"] = [decode_qr_image_bytes(png) for _ in range(3)]
+        results["steady_delta"] = metrics.latency("qr_decode.steady_ms").count - steady_before
+
+    # fresh thread -> fresh thread-local detector
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join()
+
+    assert results["payloads"] == ["QR:JP:JPY:1500"] * 3
+    assert results["first_delta"] == 0  # the dummy decode is not a real first scan
+    assert results["warmup_delta"] == 1
+    assert results["steady_delta"] == 3
+
+
+def test_decode_pool_is_warmed_once_and_reused():
+    png = _qr_png("QR:US:USD:12")
+    pool = DecodePool(2)
+    warmup_before = metrics.latency("qr_decode.warmup_ms").count
+    pool.start()
+    assert metrics.latency("qr_decode.warmup_ms").count - warmup_before == 2
+
+    first_before = metrics.latency("qr_decode.first_ms").count
+    for _ in range(2):  # two "requests" on the same pool
+        assert [pool.submit(decode_qr_image_bytes, png).result() for _ in range(4)] == ["QR:US:USD:12"] * 4
+    assert metrics.latency("qr_decode.first_ms").count == first_before
+    assert metrics.latency("qr_decode.warmup_ms").count - warmup_before == 2  # no new threads
+    pool.shutdown()
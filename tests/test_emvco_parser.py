@@ -0,0 +1,110 @@
+# tests/test_emvco_parser.py
+
+import pytest
+
+from src.agents.qr_parser_agent import QRParserAgent
+from src.tools.emvco_tlv_tool import build_emvco_payload, crc16_ccitt, parse_emvco
+
+
+def test_crc16_ccitt_check_value():
+    # Standard CRC-16/CCITT-FALSE check value
+    assert crc16_ccitt(b"123456789") == 0x29B1
+
+
+def test_parse_promptpay_payload():
+    payload = build_emvco_payload(
+        merchant_id="0812345678",
+        country="TH",
+        currency_numeric="764",
+        amount="150.00",
+        merchant_name="NOODLE HOUSE",
+        merchant_city="BANGKOK",
+    )
+
+    item = parse_emvco(payload)
+
+    assert item["merchant_id"] == "0812345678"
+    assert item["country"] == "TH"
+    assert item["currency"] == "THB"
+    assert item["amount"] == 150.0
+    assert item["raw_fields"]["merchant_name"] == "NOODLE HOUSE"
+    assert item["raw_fields"]["point_of_initiation"] == "dynamic"
+
+
+def test_paynow_uses_uen_subtag_and_non_ascii_name():
+    payload = build_emvco_payload(
+        merchant_id="201234567K",
+        country="SG",
+        currency_numeric="702",
+        amount="8.50",
+        merchant_name="CAFÉ 咖啡",
+        gui="SG.PAYNOW",
+    )
+
+    item = parse_emvco(payload)
+
+    assert item["merchant_id"] == "201234567K"
+    assert item["currency"] == "SGD"
+    assert item["raw_fields"]["merchant_name"] == "CAFÉ 咖啡"
+
+
+def test_crc_mismatch_and_unknown_currency_rejected():
+    payload = build_emvco_payload("M1", "JP", "392", "1500")
+    tampered = payload.replace("1500", "9500")
+    with pytest.raises(ValueError, match="CRC"):
+        parse_emvco(tampered)
+
+    with pytest.raises(ValueError, match="currency"):
+        parse_emvco(build_emvco_payload("M1", "JP", "999", "1500"))
+
+
+def test_parser_agent_dispatches_emvco():
+    payload = build_emvco_payload("M-TOKYO-1", "JP", "392", "1500")
+
+    result = QRParserAgent().handle(payload)
+
+    assert result["merchant_id"] == "M-TOKYO-1"
+    assert result["currency"] == "JPY"
+    assert result["amount"] == 1500.0
+    assert "qr_id" in result
+
+
+def test_comma_in_merchant_name_is_not_a_separator():
+    payload = build_emvco_payload(
+        merchant_id="M1",
+        country="TH",
+        currency_numeric="764",
+        amount="100.00",
+        merchant_name="ACME, LTD",
+        merchant_city="BANGKOK",
+    )
+    agent = QRParserAgent()
+
+    single = agent.handle(payload)
+    assert single["raw_fields"]["merchant_name"] == "ACME, LTD"
+    assert single["amount"] == 100.0
+
+    multi = agent.handle(f"{payload},QR:JP:JPY:1500\n{payload}")
+    assert multi["count"] == 3
+    assert [it.get("currency") for it in multi["items"]] == ["THB", "JPY", "THB"]
+    assert all("error" not in it for it in multi["items"])
+
+    listed = agent.handle(f"['{payload}', 'QR:US:USD:12']")
+    assert [it.get("currency") for it in listed["items"]] == ["THB", "USD"]
+
+
+def test_promptpay_bill_payment_uses_biller_id_not_reference():
+    # Thai QR bill payment: tag 30 with GUI, 01 Biller ID (tax ID + suffix), 02 Ref 1, 03 Ref 2
+    account = "0016A000000677010112" "0115010753600031508" "0210INV2024001" "0305ABC12"
+    body = (
+        "000201" "010212"
+        f"30{len(account):02d}{account}"
+        "5303764" "5406250.00" "5802TH" "5911ELECTRIC CO" "6007BANGKOK" "6304"
+    )
+    payload = body + f"{crc16_ccitt(body.encode('utf-8')):04X}"
+
+    item = parse_emvco(payload)
+
+    assert item["merchant_id"] == "010753600031508"
+    assert item["currency"] == "THB" and item["amount"] == 250.0
+    assert item["raw_fields"]["account_gui"] == "A000000677010112"
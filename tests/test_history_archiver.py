@@ -0,0 +1,122 @@
+# tests/test_history_archiver.py
+import base64
+import gzip
+import json
+import os
+
+from src.persistence.history_archiver import HistoryArchiver, archive_path
+from src.persistence.history_rollups import HistoryRollups
+from src.persistence.history_store import HistoryStore
+
+
+def _raw(i):
+    return {
+        "qr_info": {"merchant_id": f"M{i % 3}", "currency": "JPY", "amount": 100.0},
+        "fx_result": {"to_currency": "INR", "total_home": 55.0},
+        "risk_result": {"risk_level": "low"},
+        "message": "x" * 2000,  # enough bytes per row to free whole pages
+    }
+
+
+def _seed(store, days=("2024-01-01", "2024-01-02", "2025-06-01"), per_day=300):
+    rows = [
+        HistoryStore.make_row(f"u{i % 2}", "text", f"QR{day}-{i}", 55.0, "INR", "low", "", _raw(i),
+                              created_at=f"{day} 10:{i // 60:02d}:{i % 60:02d}")
+        for day in days
+        for i in range(per_day)
+    ]
+    store.add_many(rows)
+    return rows
+
+
+def _read_archive(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_iter_rows_streams_in_order_with_filters(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    _seed(store, per_day=40)
+
+    rows = list(store.iter_rows(user_id="u1", batch_rows=7, with_raw=False))
+    assert len(rows) == 60
+    assert rows == sorted(rows, key=lambda r: (r["created_at"], r["id"]))
+    assert "raw" not in rows[0]
+
+    day = list(store.iter_rows(date_from="2024-01-02", date_to="2024-01-02", batch_rows=9))
+    assert len(day) == 40 and day[0]["raw"]["qr_info"]["merchant_id"] == "M0"
+    store.close()
+
+
+def test_archive_moves_old_rows_to_daily_gzip_files_and_shrinks(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    _seed(store)
+    archive_dir = str(tmp_path / "archive")
+    archiver = HistoryArchiver(store, archive_dir, batch_rows=128)
+
+    with store._conn() as con:
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        pages_before = con.execute("PRAGMA page_count").fetchone()[0]
+
+    report = archiver.archive(cutoff="2025-01-01 00:00:00")
+
+    assert report["archived"] == 600
+    assert report["files"] == [archive_path(archive_dir, "2024-01-01"), archive_path(archive_dir, "2024-01-02")]
+    first_day = _read_archive(report["files"][0])
+    assert len(first_day) == 300 and first_day[0]["raw"]["message"] == "x" * 2000
+    assert [r["input_repr"] for r in store.iter_rows(with_raw=False)] == [f"QR2025-06-01-{i}" for i in range(300)]
+
+    assert report["pages_freed"] > 0
+    with store._conn() as con:
+        assert con.execute("PRAGMA freelist_count").fetchone()[0] == 0
+        assert con.execute("PRAGMA page_count").fetchone()[0] < pages_before / 2
+
+    assert archiver.archive(cutoff="2025-01-01 00:00:00")["archived"] == 0
+    store.close()
+
+
+def test_archive_appends_to_existing_day_file(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    archiver = HistoryArchiver(store, str(tmp_path / "archive"))
+    _seed(store, days=("2024-01-01",), per_day=5)
+    archiver.archive(cutoff="2025-01-01 00:00:00")
+    _seed(store, days=("2024-01-01",), per_day=3)
+    report = archiver.archive(cutoff="2025-01-01 00:00:00")
+
+    assert len(_read_archive(report["files"][0])) == 8
+    assert os.path.getsize(report["files"][0]) > 0
+    store.close()
+
+
+def test_archive_waits_for_rollups(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    rollups = HistoryRollups(store)
+    _seed(store, days=("2024-01-01",), per_day=10)
+    archiver = HistoryArchiver(store, str(tmp_path / "archive"), rollups=rollups)
+
+    report = archiver.archive(cutoff="2025-01-01 00:00:00")  # refreshes rollups first
+
+    assert report["archived"] == 10
+    assert rollups.summary("u0", days=100_000)["spend_by_currency"]["JPY"]["scans"] == 5
+    store.close()
+
+
+def test_corrupt_raw_blob_does_not_stop_export_or_retention(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    _seed(store, days=("2024-01-01",), per_day=5)
+    with store._conn() as con:
+        con.execute("UPDATE history SET raw_blob = ? WHERE id = 2", (b"\x01garbage",))
+        con.commit()
+
+    rows = list(store.iter_rows(batch_rows=2))
+    assert [r["id"] for r in rows] == [1, 2, 3, 4, 5]
+    assert rows[1]["raw"] is None and rows[1]["raw_error"]
+    assert rows[2]["raw"]["qr_info"]["merchant_id"] == "M2"
+
+    report = HistoryArchiver(store, str(tmp_path / "archive")).archive(cutoff="2025-01-01 00:00:00")
+    assert report["archived"] == 5
+    archived = _read_archive(report["files"][0])[1]
+    assert archived["raw"] is None and archived["raw_error"]
+    assert base64.b64decode(archived["raw_blob"]) == b"\x01garbage"  # the stored bytes survive
+    assert list(store.iter_rows()) == []
+    store.close()
@@ -0,0 +1,89 @@
+# tests/test_history_rollups.py
+import time
+from datetime import date
+
+from src.persistence.history_rollups import GLOBAL_SCOPE, HistoryRollups
+from src.persistence.history_store import HistoryStore
+from src.persistence.history_writer import HistoryWriter
+
+TODAY = date.today().isoformat()
+
+
+def _scan(merchant, currency, amount, total_home, level):
+    return {
+        "qr_info": {"merchant_id": merchant, "currency": currency, "amount": amount},
+        "fx_result": {"to_currency": "INR", "total_home": total_home},
+        "risk_result": {"risk_level": level},
+    }
+
+
+def _add(store, user_id, raw, day=TODAY):
+    store.add_many([HistoryStore.make_row(user_id, "text", "QR", None, "INR", None, "", raw, created_at=f"{day} 10:00:00")])
+
+
+def test_refresh_is_incremental_and_counts_each_row_once(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    rollups = HistoryRollups(store, batch_rows=2)
+
+    _add(store, "u1", _scan("M1", "JPY", 1500.0, 860.0, "medium"))
+    _add(store, "u1", {"multiple": True, "items": [
+        _scan("M1", "JPY", 100.0, 66.0, "low"),
+        _scan("M2", "USD", 20.0, 1700.0, "low"),
+        {"error": "bad qr"},
+    ]})
+    _add(store, "u2", _scan("M2", "USD", 5.0, 400.0, "high"))
+    assert rollups.refresh() == 3
+    assert rollups.refresh() == 0  # nothing past the high-water mark
+    _add(store, "u2", _scan("M3", "USD", 1.0, 80.0, "low"))
+    assert rollups.refresh() == 1
+    assert rollups.high_water_mark() == 4
+
+    u1 = rollups.summary("u1")
+    assert u1["spend_by_currency"] == {
+        "JPY": {"scans": 2, "amount": 1600.0, "total_home": 926.0},
+        "USD": {"scans": 1, "amount": 20.0, "total_home": 1700.0},
+    }
+    assert u1["risk_levels"] == {"medium": 1, "low": 2}
+    assert [m["merchant_id"] for m in u1["top_merchants"]] == ["M1", "M2"]
+
+    everyone = rollups.summary(GLOBAL_SCOPE, top=1)
+    assert everyone["spend_by_currency"]["USD"]["scans"] == 3
+    assert everyone["risk_levels"] == {"medium": 1, "low": 3, "high": 1}
+    assert everyone["top_merchants"][0]["merchant_id"] == "M2"
+    assert everyone["top_merchants"][0]["scans"] == 2
+    store.close()
+
+
+def test_summary_window_and_late_catch_up(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    _add(store, "u1", _scan("M1", "JPY", 10.0, 5.0, "low"), day="2001-01-01")
+    _add(store, "u1", _scan("M1", "JPY", 20.0, 10.0, "low"))
+
+    rollups = HistoryRollups(store)  # created after rows already exist
+    assert rollups.refresh() == 2
+
+    recent = rollups.summary("u1", days=7)
+    assert [row["day"] for row in recent["spend_by_day"]] == [TODAY]
+    assert recent["top_merchants"][0]["scans"] == 2  # merchants are all-time
+    assert recent["top_merchants_window"] == "all_time"
+    store.close()
+
+
+def test_writer_notifies_background_refresh(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    rollups = HistoryRollups(store)
+    rollups.start()
+    writer = HistoryWriter(store, flush_ms=5, on_write=rollups.notify)
+
+    for i in range(20):
+        writer.submit("u1", "text", "QR", 1.0, "INR", "low", "", _scan(f"M{i % 3}", "JPY", 1.0, 1.0, "low"))
+    writer.flush()
+
+    deadline = time.monotonic() + 5
+    while rollups.high_water_mark() < 20 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert rollups.summary("u1")["risk_levels"] == {"low": 20}
+
+    writer.close()
+    rollups.stop()
+    store.close()
@@ -0,0 +1,183 @@
+# tests/test_history_store.py
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from src.persistence.history_store import HistoryStore
+from src.persistence.raw_codec import decode_raw, encode_raw
+
+
+def _raw(i):
+    return {"qr_info": {"merchant_id": f"M{i}"}, "risk_result": {"risk_level": "low"}}
+
+
+def test_add_list_get_raw_round_trip(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    store.add("u1", "text", "QR:JP:JPY:1500", 860.75, "INR", "medium", "note", _raw(1))
+    store.add("u1", "text", "QR:JP:JPY:100", None, None, None, None, _raw(2))
+    store.add("u2", "text", "QR:US:USD:5", 415.0, "INR", "low", "", _raw(3))
+
+    rows = store.list("u1")
+    assert [r["input_repr"] for r in rows] == ["QR:JP:JPY:100", "QR:JP:JPY:1500"]
+    assert rows[0]["risk_level"] == "unknown" and rows[0]["total_home"] is None
+    assert store.get_raw(rows[1]["id"]) == _raw(1)
+    assert store.get_raw(999) is None
+    store.close()
+
+
+def test_pool_uses_wal_and_stays_bounded(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), pool_size=3)
+
+    with store._conn() as con:
+        assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def work(i):
+        store.add(f"u{i % 4}", "text", "QR", 1.0, "INR", "low", "", _raw(i))
+        return len(store.list(f"u{i % 4}"))
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(work, range(200)))
+
+    assert store._pool._created <= 3
+    assert sum(len(store.list(f"u{u}", limit=1000)) for u in range(4)) == 200
+    store.close()
+
+
+def _seed_pages(store):
+    rows = []
+    for i in range(25):
+        day = 1 + i // 10  # 10 rows per day: 2025-01-01 .. 2025-01-03
+        raw = {**_raw(i), "qr_info": {"merchant_id": f"M{i}", "currency": "JPY" if i % 2 else "THB"}}
+        rows.append(HistoryStore.make_row(
+            "u1", "text", f"QR{i}", float(i), "INR",
+            "high" if i % 5 == 0 else "low", "", raw,
+            created_at=f"2025-01-0{day} 12:00:{i:02d}",
+        ))
+    rows.append(HistoryStore.make_row("u2", "text", "other", 1.0, "INR", "high", "", _raw(99)))
+    store.add_many(rows)
+
+
+def test_page_walks_every_row_once_newest_first(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    _seed_pages(store)
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = store.page("u1", limit=7, cursor=cursor)
+        seen += [r["input_repr"] for r in rows]
+        if cursor is None:
+            break
+    assert seen == [f"QR{i}" for i in reversed(range(25))]
+    store.close()
+
+
+def test_page_filters(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    _seed_pages(store)
+
+    high, _ = store.page("u1", risk_levels=["high"])
+    assert [r["input_repr"] for r in high] == ["QR20", "QR15", "QR10", "QR5", "QR0"]
+
+    # currency is the scanned currency, not the (constant) home currency
+    jpy_high, _ = store.page("u1", risk_levels=["high", "medium"], currency="jpy")
+    assert [r["input_repr"] for r in jpy_high] == ["QR15", "QR5"]
+    assert store.page("u1", currency="inr")[0] == []
+
+    day2, _ = store.page("u1", date_from="2025-01-02", date_to="2025-01-02")
+    assert [r["input_repr"] for r in day2] == [f"QR{i}" for i in reversed(range(10, 20))]
+
+    # cursor and filters combine
+    first, cursor = store.page("u1", limit=2, risk_levels=["high"])
+    rest, end = store.page("u1", limit=10, cursor=cursor, risk_levels=["high"])
+    assert [r["input_repr"] for r in first + rest] == [r["input_repr"] for r in high]
+    assert end is None
+    store.close()
+
+
+def test_page_rejects_bad_cursor_and_dates(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    for kwargs in ({"cursor": "not-a-cursor"}, {"date_from": "yesterday"}):
+        try:
+            store.page("u1", **kwargs)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"expected ValueError for {kwargs}")
+    store.close()
+
+
+def test_page_uses_keyset_index(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    with store._conn() as con:
+        plan = " ".join(
+            str(row[-1]) for row in con.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM history WHERE user_id = ? AND (created_at, id) < (?, ?)"
+                " ORDER BY created_at DESC, id DESC LIMIT 51",
+                ("u1", "2025-01-01 00:00:00", 1),
+            )
+        )
+    assert "idx_history_user_page" in plan and "TEMP B-TREE" not in plan
+    store.close()
+
+
+def test_raw_codec_round_trip_and_is_compact():
+    raw = {
+        "qr_info": {"merchant_id": "M12345", "country": "JP", "currency": "JPY", "amount": 1500.0},
+        "risk_result": {"risk_level": "medium", "reasons": ["Moderate amount (>= 1000)."]},
+        "message": "Total estimated charge: 860.75 INR — ¥ ok",
+    }
+    blob = encode_raw(raw)
+    assert decode_raw(blob) == raw
+    assert len(blob) < len(json.dumps(raw)) / 2
+    for bad in (b"\x09" + blob[1:], blob[:1] + b"garbage"):
+        try:
+            decode_raw(bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("expected ValueError")
+
+
+def test_migrate_raw_converts_legacy_rows(tmp_path):
+    path = str(tmp_path / "history.db")
+    con = sqlite3.connect(path)  # a database from before raw_blob existed
+    con.execute(
+        "CREATE TABLE history (id INTEGER PRIMARY KEY AUTOINCREMENT, created_at TEXT NOT NULL,"
+        " user_id TEXT NOT NULL, mode TEXT NOT NULL, input_repr TEXT NOT NULL, total_home REAL,"
+        " home_currency TEXT, risk_level TEXT, note TEXT, raw_json TEXT NOT NULL)"
+    )
+    con.executemany(
+        "INSERT INTO history (created_at, user_id, mode, input_repr, raw_json) VALUES (?, 'u1', 'text', 'QR', ?)",
+        [(f"2025-01-01 00:00:{i:02d}", json.dumps(_raw(i), indent=2)) for i in range(7)],
+    )
+    con.commit()
+    con.close()
+
+    store = HistoryStore(path)
+    assert store.get_raw(3) == _raw(2)  # readable before migration
+    store.add("u1", "text", "new", 1.0, "INR", "low", "", _raw(100))
+
+    assert store.migrate_raw(batch_size=3) == 7
+    assert store.migrate_raw() == 0  # idempotent
+    with store._conn() as con:
+        assert con.execute("SELECT COUNT(*) FROM history WHERE raw_blob IS NULL OR raw_json != ''").fetchone()[0] == 0
+    assert [store.get_raw(i) for i in range(1, 9)] == [_raw(i) for i in range(7)] + [_raw(100)]
+    store.close()
+
+
+def test_local_currency_is_stored_and_backfilled(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    jpy = {"qr_info": {"merchant_id": "M1", "currency": "JPY"}, "fx_result": {}}
+    mixed = {"multiple": True, "items": [jpy, {**jpy, "qr_info": {"currency": "THB"}}]}
+    store.add("u1", "text", "single", 1.0, "INR", "low", "", jpy)
+    store.add("u1", "text", "multi-jpy", 1.0, "INR", "low", "", {"multiple": True, "items": [jpy, jpy]})
+    store.add("u1", "text", "mixed", 1.0, "INR", "low", "", mixed)
+    assert [r["local_currency"] for r in store.list("u1")] == ["", "JPY", "JPY"]
+
+    with store._conn() as con:  # rows from before the column existed
+        con.execute("UPDATE history SET local_currency = NULL")
+        con.commit()
+    assert store.page("u1", currency="JPY")[0] == []
+    assert store.backfill_local_currency(batch_size=2) == 3
+    assert [r["input_repr"] for r in store.page("u1", currency="JPY")[0]] == ["multi-jpy", "single"]
+    store.close()
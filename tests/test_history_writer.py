@@ -0,0 +1,75 @@
+# tests/test_history_writer.py
+import threading
+
+from src.persistence.history_store import HistoryStore
+from src.persistence.history_writer import HistoryWriter
+
+
+def _submit(writer, i, user_id="u1"):
+    return writer.submit(user_id, "text", f"QR:{i}", 1.0, "INR", "low", "", {"i": i})
+
+
+class CountingStore(HistoryStore):
+    def __init__(self, path):
+        super().__init__(path)
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def add_many(self, rows):
+        self.gate.wait()
+        self.batches.append(len(rows))
+        return super().add_many(rows)
+
+
+def test_entries_are_written_in_batches(tmp_path):
+    store = CountingStore(str(tmp_path / "history.db"))
+    writer = HistoryWriter(store, batch_rows=100, flush_ms=200)
+
+    for i in range(450):
+        assert _submit(writer, i)
+    assert writer.flush(timeout=5)
+
+    assert sum(store.batches) == 450
+    assert len(store.batches) <= 10  # grouped, not one commit per entry
+    assert max(store.batches) <= 100
+    assert len(store.list("u1", limit=1000)) == 450
+    writer.close()
+
+
+def test_full_queue_applies_back_pressure_then_drops(tmp_path):
+    store = CountingStore(str(tmp_path / "history.db"))
+    store.gate.clear()  # writer stuck on the disk
+    writer = HistoryWriter(store, batch_rows=1, flush_ms=1, max_queue=3, enqueue_timeout=0.05)
+
+    accepted = sum(_submit(writer, i) for i in range(10))
+
+    assert writer.dropped == 10 - accepted
+    assert 3 <= accepted <= 5  # queue capacity + the batch in the writer's hands
+    store.gate.set()
+    writer.close()
+    assert writer.written == accepted
+    assert len(store.list("u1", limit=100)) == accepted
+
+
+def test_close_drains_queue_and_rejects_new_entries(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    writer = HistoryWriter(store, batch_rows=1000, flush_ms=10_000)  # would wait 10s to batch
+
+    for i in range(25):
+        _submit(writer, i)
+    writer.close(timeout=5)
+
+    assert len(store.list("u1", limit=100)) == 25
+    assert _submit(writer, 99) is False
+
+
+def test_flush_writes_partial_batch_without_waiting_out_the_interval(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    writer = HistoryWriter(store, batch_rows=1000, flush_ms=10_000)
+
+    for i in range(5):
+        _submit(writer, i)
+    assert writer.flush(timeout=2)
+    assert len(store.list("u1")) == 5
+    writer.close()
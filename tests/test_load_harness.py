@@ -0,0 +1,80 @@
+# tests/test_load_harness.py
+import pytest
+import requests
+from fastapi.testclient import TestClient
+
+from src.agents import fx_rate_agent
+from src.agents.fx_rate_agent import FXRateAgent, _RATE_CACHE
+from src.api.server import app
+from src.eval.load_test import make_images, parse_mix, percentile, run_load
+from src.eval.upstream_stubs import Faults, UpstreamStubServer, cross_rate
+from src.tools import fx_live_api_tool
+from src.tools import gemini_http_client as gemini
+
+
+@pytest.fixture
+def stubs():
+    server = UpstreamStubServer().start()
+    yield server
+    server.stop()
+
+
+def _route_upstreams(stubs, monkeypatch):
+    # every FX and Gemini call goes to the stand-ins, never the real APIs
+    env = stubs.env()
+    monkeypatch.setattr(fx_rate_agent, "FX_API_URL", env["FX_API_URL"])
+    monkeypatch.setattr(fx_live_api_tool, "API_BASE", env["FX_ER_API_BASE"])
+    monkeypatch.setattr(gemini, "GEMINI_API_BASE", env["GEMINI_API_BASE"])
+    monkeypatch.setattr(gemini, "_GEMINI_COOLDOWN_UNTIL", 0.0)
+    monkeypatch.setenv("GEMINI_API_KEY", "stand-in")
+
+
+def test_stand_ins_serve_fx_and_gemini(stubs, monkeypatch):
+    _route_upstreams(stubs, monkeypatch)
+
+    _RATE_CACHE.pop(("THB", "INR"), None)
+    fx = FXRateAgent().handle(100.0, "THB", "INR")
+    assert fx["provider"] == "exchangerate.host-live"
+    assert fx["rate"] == pytest.approx(cross_rate("THB", "INR"))
+    _RATE_CACHE.pop(("THB", "INR"), None)
+
+    assert fx_live_api_tool.get_live_fx_rate("USD", "JPY") == pytest.approx(151.0)
+    assert gemini.call_gemini("hello").startswith("Stand-in explanation")
+    assert stubs.stats() == {
+        "fx": {"ok": 2, "errors": 0, "rate_limited": 0},
+        "gemini": {"ok": 1, "errors": 0, "rate_limited": 0},
+    }
+
+
+def test_fault_injection(stubs):
+    stubs.faults["gemini"] = Faults(rate_limit_rate=1.0, retry_after=7)
+    stubs.faults["fx"] = Faults(error_rate=1.0, latency_ms=20)
+
+    url = f"{stubs.env()['GEMINI_API_BASE']}/models/m:generateContent"
+    resp = requests.post(url, json={"contents": [{"parts": [{"text": "x"}]}]}, timeout=5)
+    assert resp.status_code == 429 and resp.headers["Retry-After"] == "7"
+
+    resp = requests.get(stubs.env()["FX_API_URL"], params={"from": "JPY", "to": "INR"}, timeout=5)
+    assert resp.status_code == 500
+    assert resp.elapsed.total_seconds() >= 0.02
+    assert stubs.stats()["fx"]["errors"] == 1 and stubs.stats()["gemini"]["rate_limited"] == 1
+
+
+def test_run_load_reports_per_workload_percentiles(stubs, monkeypatch):
+    _route_upstreams(stubs, monkeypatch)
+
+    report = run_load(
+        TestClient(app), parse_mix("text=2,multi=1,image=1"), concurrency=3, duration=30,
+        max_requests=16, images=make_images(2),
+    )
+
+    total = report["total"]
+    assert total["requests"] == 16 and total["ok"] == 16
+    assert sum(w["requests"] for w in report["workloads"].values()) == 16
+    assert report["workloads"]["image"]["endpoint"] == "POST /api/scan-image"
+    assert 0 < total["p50_ms"] <= total["p95_ms"] <= total["p99_ms"]
+    assert stubs.stats()["gemini"]["ok"] > 0  # explanations came from the stand-in
+
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 2.0
+    with pytest.raises(ValueError):
+        parse_mix("text=1,ws=1")
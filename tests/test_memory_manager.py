@@ -0,0 +1,55 @@
+# tests/test_memory_manager.py
+
+import threading
+
+from src.agents.risk_scorer import RiskScorer
+from src.orchestration.memory_manager import SimpleMemoryBank
+
+
+def test_merchant_history_is_per_user():
+    memory = SimpleMemoryBank()
+    memory.add_recent_merchant("M1", "JP", user_id="alice")
+    memory.add_recent_merchant("M1", "JP", user_id="alice")
+
+    assert memory.has_recent_merchant("M1", "alice") is True
+    assert memory.has_recent_merchant("M1", "bob") is False
+    assert memory.get_merchant_stats("M1", "alice")["count"] == 2
+
+    scorer = RiskScorer(memory=memory)
+    alice = scorer.evaluate("M1", "JP", 100.0, user_id="alice")
+    bob = scorer.evaluate("M1", "JP", 100.0, user_id="bob")
+    assert "Merchant seen recently (familiar)." in alice["reasons"]
+    assert "Merchant not seen in your recent history." in bob["reasons"]
+
+
+def test_merchant_and_user_eviction_is_lru():
+    memory = SimpleMemoryBank(max_merchants=2, max_users=2)
+
+    memory.add_recent_merchant("M1", "JP", user_id="u1")
+    memory.add_recent_merchant("M2", "JP", user_id="u1")
+    memory.add_recent_merchant("M1", "JP", user_id="u1")  # refresh M1
+    memory.add_recent_merchant("M3", "JP", user_id="u1")  # evicts M2
+
+    assert [m["merchant_id"] for m in memory.get_recent_merchants("u1")] == ["M3", "M1"]
+
+    memory.add_recent_merchant("M1", "US", user_id="u2")
+    memory.has_recent_merchant("M1", "u1")                # u1 active again
+    memory.add_recent_merchant("M1", "US", user_id="u3")  # evicts idle u2
+
+    assert memory.get_recent_merchants("u2") == []
+    assert memory.has_recent_merchant("M3", "u1") is True
+
+
+def test_in_memory_profile_writes_take_the_user_stripe():
+    bank = SimpleMemoryBank()
+    bank.upsert_profile("u1", {"home_currency": "INR"})
+
+    for write in (lambda: bank.replace_profile("u1", {"home_currency": "USD"}), lambda: bank.delete_profile("u1")):
+        with bank._stripe("u1"):  # a PATCH merge in progress
+            t = threading.Thread(target=write)
+            t.start()
+            t.join(0.05)
+            assert t.is_alive()  # waits for the merge instead of racing it
+        t.join()
+
+    assert bank.find_profile("u1") is None
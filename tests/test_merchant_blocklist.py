@@ -0,0 +1,49 @@
+# tests/test_merchant_blocklist.py
+
+from src.agents.merchant_blocklist import MerchantBlocklist
+from src.agents.risk_rules import compile_rules
+from src.agents.risk_scorer import RiskScorer
+
+
+def _blocklist(tmp_path, ids):
+    src = tmp_path / "blocklist.txt"
+    src.write_text("# bad merchants\n" + "\n".join(ids) + "\n")
+    return MerchantBlocklist.from_path(str(src))
+
+
+def test_lookup_and_deltas(tmp_path):
+    ids = [f"BAD{i:05d}" for i in range(2000)]
+    bl = _blocklist(tmp_path, ids)
+
+    assert all(bl.contains(mid) for mid in ids[::97])
+    assert not any(bl.contains(f"GOOD{i:05d}") for i in range(2000))
+
+    bl.apply_delta(["+NEW1", "-BAD00000"])
+    assert bl.contains("NEW1")
+    assert not bl.contains("BAD00000")
+
+    stats = bl.stats()
+    assert stats["entries"] == 2000
+    assert stats["delta_added"] == 1 and stats["delta_removed"] == 1
+    assert stats["observed_fp_rate"] < 0.05
+    assert stats["bloom_bytes"] > 0
+
+
+def test_cached_bloom_is_reused(tmp_path):
+    bl = _blocklist(tmp_path, ["A1", "B2"])
+    bl.close()
+    assert (tmp_path / "blocklist.txt.idx.bloom").exists()
+
+    reopened = MerchantBlocklist.from_path(str(tmp_path / "blocklist.txt"))
+    assert reopened.contains("B2")
+    assert not reopened.contains("C3")
+
+
+def test_blocked_merchant_raises_risk(tmp_path):
+    scorer = RiskScorer(rules=compile_rules({}), blocklist=_blocklist(tmp_path, ["EVIL"]))
+
+    res = scorer.evaluate("EVIL", "JP", 10.0)
+
+    assert res["risk_level"] == "high"
+    assert "Merchant is on the bad-merchant list." in res["reasons"]
+    assert "Merchant is on the bad-merchant list." not in scorer.evaluate("OK", "JP", 10.0)["reasons"]
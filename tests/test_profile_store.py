@@ -0,0 +1,96 @@
+# tests/test_profile_store.py
+import threading
+
+from src.orchestration.memory_manager import SimpleMemoryBank
+from src.persistence.profile_store import ProfileStore
+
+
+class NoDisk:
+    def connection(self):
+        raise AssertionError("cache hit went to disk")
+
+
+def test_crud_survives_reopen(tmp_path):
+    path = str(tmp_path / "profiles.db")
+    store = ProfileStore(path)
+    assert store.get("u1") is None
+    assert store.seed("u1", {"home_currency": "INR"}) is True
+    assert store.seed("u1", {"home_currency": "USD"}) is False  # seed never overwrites
+    assert store.upsert("u1", {"risk_preference": "low"}) == {"home_currency": "INR", "risk_preference": "low"}
+    store.replace("u2", {"home_currency": "EUR"})
+    store.close()
+
+    store = ProfileStore(path)
+    assert store.get("u1") == {"home_currency": "INR", "risk_preference": "low"}
+    assert store.delete("u2") is True and store.delete("u2") is False
+    assert store.get("u2") is None
+    store.close()
+
+
+def test_cache_hits_skip_disk_and_writes_invalidate(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.db"), cache_size=2)
+    store.seed("u1", {"home_currency": "INR"})
+    store._pool = NoDisk()
+
+    for _ in range(5):
+        assert store.get("u1") == {"home_currency": "INR"}
+    assert store.stats()["hits"] == 5 and store.stats()["misses"] == 0
+
+    store.get("u1")["home_currency"] = "XXX"  # callers get copies
+    assert store.get("u1") == {"home_currency": "INR"}
+
+
+def test_unknown_users_are_cached_and_lru_is_bounded(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.db"), cache_size=2)
+    assert store.get("ghost") is None
+    assert store.get("ghost") is None
+    assert store.stats()["misses"] == 1 and store.stats()["absent"] == 2
+
+    store.upsert("ghost", {"home_currency": "USD"})  # replaces the cached miss
+    assert store.get("ghost") == {"home_currency": "USD"}
+
+    for u in ("a", "b", "c"):
+        store.get(u)
+    assert store.stats()["cached"] == 2
+    store.close()
+
+
+def test_ttl_rereads_other_writers(tmp_path):
+    now = [0.0]
+    path = str(tmp_path / "profiles.db")
+    reader = ProfileStore(path, cache_ttl=5, clock=lambda: now[0])
+    writer = ProfileStore(path)
+    writer.seed("u1", {"home_currency": "INR"})
+    assert reader.get("u1") == {"home_currency": "INR"}
+
+    writer.upsert("u1", {"home_currency": "JPY"})  # another process's write
+    assert reader.get("u1")["home_currency"] == "INR"
+    now[0] = 6
+    assert reader.get("u1")["home_currency"] == "JPY"
+    reader.close()
+    writer.close()
+
+
+def test_concurrent_upserts_merge_all_fields(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.db"))
+
+    def work(i):
+        store.upsert("u1", {f"k{i}": i})
+        store.get("u1")
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert store.get("u1") == {f"k{i}": i for i in range(20)}
+    store.close()
+
+
+def test_memory_bank_delegates_profiles(tmp_path):
+    bank = SimpleMemoryBank(profiles=ProfileStore(str(tmp_path / "profiles.db")))
+    assert bank.get_profile("u1") == {} and bank.find_profile("u1") is None
+    bank.upsert_profile("u1", {"home_currency": "SGD"})
+    assert bank.get_profile("u1") == {"home_currency": "SGD"}
+    assert bank.user_profiles == {}  # nothing kept in the in-process dict
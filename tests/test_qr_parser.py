@@ -23,3 +23,28 @@ def test_basic_qr_parsing():
     if "raw_fields" in result:
         assert isinstance(result["raw_fields"], dict)
         assert "raw" in result["raw_fields"]
+
+
+def test_iter_items_is_lazy_and_isolates_errors():
+    agent = QRParserAgent()
+
+    items = agent.iter_items("QR:JP:JPY:1500,not-a-qr\nQR:US:USD:12")
+    first = next(items)
+    assert first["currency"] == "JPY"
+
+    rest = list(items)
+    assert "error" in rest[0]
+    assert rest[0]["raw_fields"]["raw"] == "not-a-qr"
+    assert rest[1]["currency"] == "USD"
+
+
+def test_multi_qr_ids_are_unique_and_list_repr_is_accepted():
+    agent = QRParserAgent()
+
+    result = agent.handle("['QR:JP:JPY:1500', 'QR:US:USD:12']")
+
+    assert result["multiple"] is True
+    assert result["count"] == 2
+    ids = {item["qr_id"] for item in result["items"]}
+    assert len(ids) == 2
+    assert all(len(i) == 32 for i in ids)
@@ -0,0 +1,63 @@
+# tests/test_replay_history.py
+from src.agents.risk_rules import compile_rules
+from src.eval.replay_history import iter_history_rows, replay
+from src.persistence.history_store import HistoryStore
+
+
+def _scan(merchant_id, country, currency, amount, level, base_home):
+    return {
+        "qr_info": {"merchant_id": merchant_id, "country": country, "currency": currency, "amount": amount},
+        "fx_result": {"base_home": base_home, "total_home": base_home * 1.03 + 11.0},
+        "risk_result": {"risk_score": 0.0, "risk_level": level, "reasons": []},
+    }
+
+
+def _seed(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    store.add("u1", "text", "a", None, "INR", "medium", "", _scan("M1", "JP", "JPY", 1500.0, "medium", 825.0))
+    store.add("u1", "text", "b", None, "INR", "low", "", _scan("M1", "JP", "JPY", 100.0, "low", 55.0))
+    multi = {"items": [
+        _scan("M2", "TH", "THB", 6000.0, "high", 14000.0),
+        {"qr_info": {"error": "bad"}, "error": "bad"},
+    ]}
+    store.add("u2", "text", "c", None, "INR", "high", "", multi)
+    return store.db_path
+
+
+def test_replay_same_rules_reproduces_levels(tmp_path):
+    db = _seed(tmp_path)
+    report = replay(db, compile_rules({}))
+
+    assert report["rows"] == 3
+    assert report["scans"] == 3  # error item skipped
+    assert report["old_levels"] == {"medium": 1, "low": 1, "high": 1}
+    assert report["changed"] == 0
+    assert report["fees"]["max_abs_delta"] == 0.0
+
+
+def test_replay_candidate_rules_and_fees(tmp_path):
+    db = _seed(tmp_path)
+    candidate = compile_rules({"levels": [
+        {"min": 0, "level": "low"},
+        {"min": 20, "level": "medium"},
+        {"min": 100, "level": "high"},
+    ]})
+    report = replay(db, candidate, markup_pct=0.0, network_fee=0.0)
+
+    # 6000 THB: 40 + 25 + 20 = 85 -> medium; repeat M1 small scan: 5 + 5 + 5 = 15 -> low
+    assert report["new_levels"] == {"medium": 2, "low": 1}
+    assert report["transitions"] == {"high->medium": 1}
+    assert report["fees"]["new_total_home"] == 825.0 + 55.0 + 14000.0
+
+
+def test_rows_replay_in_created_at_order(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    scan = _scan("M1", "JP", "JPY", 100.0, "low", 55.0)
+    store.add_many([
+        store.make_row("u1", "text", "late", None, "INR", "low", "", scan, created_at="2026-01-02 09:00:00"),
+        store.make_row("u1", "text", "early", None, "INR", "low", "", scan, created_at="2026-01-01 09:00:00"),
+    ])
+
+    assert [row[1] for row in iter_history_rows(store.db_path, batch_size=1)] == [
+        "2026-01-01 09:00:00", "2026-01-02 09:00:00",
+    ]
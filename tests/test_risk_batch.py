@@ -0,0 +1,71 @@
+# tests/test_risk_batch.py
+
+import random
+
+from src.agents.merchant_blocklist import MerchantBlocklist
+from src.agents.risk_rules import compile_rules
+from src.agents.risk_scorer import RiskScorer
+from src.orchestration.memory_manager import SimpleMemoryBank
+
+
+def test_evaluate_many_matches_scalar_path(tmp_path):
+    memory = SimpleMemoryBank()
+    for mid in ("M1", "M3"):
+        memory.add_recent_merchant(mid, "JP", user_id="u1")
+    src = tmp_path / "bad.txt"
+    src.write_text("M4\n")
+    scorer = RiskScorer(memory=memory, rules=compile_rules({}), blocklist=MerchantBlocklist.from_path(str(src)))
+
+    rng = random.Random(7)
+    amounts = [rng.choice([0.0, 999.99, 1000.0, 4999.5, 5000.0, 12345.0, -1.0]) for _ in range(300)]
+    countries = [rng.choice(["jp", "TH", "US", "ng", "EU"]) for _ in range(300)]
+    merchants = [rng.choice(["M1", "M2", "M3", "M4"]) for _ in range(300)]
+    velocity = {"scans_per_minute": 6, "spend_per_hour": 100.0, "currency": "JPY", "distinct_merchants_per_day": 2}
+
+    batch = scorer.evaluate_many(amounts, countries, merchants, user_id="u1", velocity=velocity)
+    rows = batch.to_dicts(explain="all")
+
+    for i in range(300):
+        expected = scorer.evaluate(merchants[i], countries[i], amounts[i], user_id="u1", velocity=velocity)
+        assert rows[i] == expected
+
+
+def test_reasons_are_lazy_for_unflagged_rows():
+    scorer = RiskScorer(memory=SimpleMemoryBank(), rules=compile_rules({}))
+
+    batch = scorer.evaluate_many([10.0, 9000.0], ["JP", "TH"], ["A", "B"])
+
+    assert batch.levels == ["low", "high"]
+    assert list(batch.flagged()) == [1]
+    rows = batch.to_dicts()
+    assert rows[0]["reasons"] == []
+    assert rows[1]["reasons"][0] == "High amount (>= 5000)."
+
+
+def test_multi_qr_batch_matches_scalar_loop():
+    from src.agents.risk_guard_agent import RiskGuardAgent
+    from src.orchestration.velocity_tracker import VelocityTracker
+
+    items = [
+        {"merchant_id": m, "country": "JP", "currency": "USD", "amount": a}
+        for m, a in [("M1", 400.0), ("M2", 300.0), ("M1", 500.0), ("M3", 20.0), ("M2", 10.0)]
+    ]
+
+    # scalar: score each item, then remember its merchant
+    memory, tracker = SimpleMemoryBank(), VelocityTracker()
+    memory.add_recent_merchant("M3", "JP", user_id="u1")
+    agent = RiskGuardAgent(memory)
+    expected = []
+    for i, it in enumerate(items):
+        velocity = tracker.record("u1", it["merchant_id"], it["currency"], it["amount"], now=100.0 + i)
+        expected.append(agent.handle(it["merchant_id"], it["country"], it["amount"], "u1", velocity))
+        memory.add_recent_merchant(it["merchant_id"], it["country"], "u1")
+
+    memory, tracker = SimpleMemoryBank(), VelocityTracker()
+    memory.add_recent_merchant("M3", "JP", user_id="u1")
+    velocities = [
+        tracker.record("u1", it["merchant_id"], it["currency"], it["amount"], now=100.0 + i)
+        for i, it in enumerate(items)
+    ]
+    assert RiskGuardAgent(memory).handle_many(items, "u1", velocities) == expected
+    assert "High spend in the last hour: 1200.00 USD." in expected[2]["reasons"]
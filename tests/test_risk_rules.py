@@ -0,0 +1,58 @@
+# tests/test_risk_rules.py
+
+import json
+import os
+
+from src.agents.risk_rules import RuleSet, compile_rules
+from src.agents.risk_scorer import RiskScorer
+
+
+def test_default_rules_match_original_thresholds():
+    scorer = RiskScorer(rules=compile_rules({}))
+
+    res = scorer.evaluate("M1", "TH", 5000.0)
+
+    # 40 (amount) + 25 (country) + 10 (no memory)
+    assert res["risk_score"] == 75.0
+    assert res["risk_level"] == "high"
+    assert res["reasons"] == [
+        "High amount (>= 5000).",
+        "Unfamiliar/high-fraud country pattern: TH.",
+        "Merchant history unavailable; using baseline merchant score.",
+    ]
+    assert scorer.evaluate("M1", "JP", 999.99)["risk_score"] == 20.0
+
+
+def test_rule_file_is_hot_swapped_and_bad_files_are_ignored(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"country": {"default_score": 5, "scores": {"JP": 50}}}))
+
+    rules = RuleSet(str(path), check_interval=0)
+    scorer = RiskScorer(rules=rules)
+    assert scorer.evaluate("M1", "JP", 10.0)["risk_score"] == 65.0
+
+    path.write_text(json.dumps({"levels": [{"min": 0, "level": "low"}, {"min": 10, "level": "high"}]}))
+    os.utime(path, (1, 1))
+    assert scorer.evaluate("M1", "JP", 10.0)["risk_level"] == "high"
+
+    path.write_text("{not json")
+    os.utime(path, (2, 2))
+    assert scorer.evaluate("M1", "JP", 10.0)["risk_level"] == "high"
+
+
+def test_spend_thresholds_are_per_currency():
+    scorer = RiskScorer(rules=compile_rules({}))
+
+    def spend_reasons(amount, currency):
+        velocity = {"spend_per_hour": amount, "currency": currency}
+        return [r for r in scorer.evaluate("M1", "JP", 10.0, velocity=velocity)["reasons"] if "spend" in r]
+
+    assert spend_reasons(10000, "JPY") == []  # ~65 USD
+    assert spend_reasons(9999, "USD") == ["High spend in the last hour: 9999.00 USD."]
+    assert spend_reasons(9999, "XXX") == []  # no thresholds for this currency
+
+    # an older flat tier list still applies to every currency
+    flat = compile_rules({"velocity": {"spend_per_hour": [{"min": 10, "score": 20}]}})
+    assert RiskScorer(rules=flat).evaluate(
+        "M1", "JP", 10.0, velocity={"spend_per_hour": 50, "currency": "XXX"}
+    )["risk_score"] == 40.0
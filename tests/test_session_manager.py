@@ -0,0 +1,124 @@
+# tests/test_session_manager.py
+import time
+
+from src.orchestration.session_manager import (
+    InMemorySessionService,
+    Message,
+    MessageRing,
+    SessionState,
+    session_from_dict,
+    session_to_dict,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_idle_sessions_expire_on_access_and_sweep():
+    clock = FakeClock()
+    svc = InMemorySessionService(ttl_seconds=60, max_entries=100, clock=clock)
+    a = svc.create_session()
+    b = svc.create_session()
+
+    clock.now += 45
+    assert svc.get_session(a.session_id) is a  # touch a
+
+    clock.now += 30  # b idle 75s, a idle 30s
+    assert svc.sweep() == 1
+    assert svc.get_session(b.session_id) is None
+    assert svc.get_session(a.session_id) is a
+
+    clock.now += 61
+    assert svc.get_session(a.session_id) is None
+    assert len(svc) == 0
+    assert svc.expired == 2
+
+
+def test_lru_eviction_past_max_entries():
+    svc = InMemorySessionService(ttl_seconds=3600, max_entries=3)
+    s1, s2, s3 = svc.create_session(), svc.create_session(), svc.create_session()
+    svc.get_session(s1.session_id)  # s2 is now least recently used
+
+    s4 = svc.create_session()
+
+    assert len(svc) == 3
+    assert svc.get_session(s2.session_id) is None
+    assert all(svc.get_session(s.session_id) is s for s in (s1, s3, s4))
+    assert svc.evicted == 1
+
+
+def test_byte_accounting_tracks_updates_and_drops():
+    svc = InMemorySessionService(ttl_seconds=3600, max_entries=1)
+    s = svc.create_session()
+    empty = svc.approx_bytes
+    assert empty > 0
+
+    s.add_message("user", "x" * 3000)
+    svc.update_session(s)
+    assert svc.approx_bytes > empty + 3000
+
+    svc.create_session()  # evicts s
+    assert svc.approx_bytes == empty
+
+
+def test_background_sweeper_expires_sessions():
+    svc = InMemorySessionService(ttl_seconds=0.05, max_entries=100)
+    for _ in range(5):
+        svc.create_session()
+
+    svc.start_sweeper(interval=0.02)
+    try:
+        deadline = time.time() + 2
+        while len(svc) and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        svc.stop_sweeper()
+
+    assert len(svc) == 0
+
+
+def test_message_ring_keeps_last_n_and_returns_evicted():
+    ring = MessageRing(3)
+    evicted = [ring.append(Message("user", str(i))) for i in range(5)]
+
+    assert [m.content for m in ring] == ["2", "3", "4"]
+    assert [e.content if e else None for e in evicted] == [None, None, None, "0", "1"]
+
+
+def test_history_is_bounded_with_rolling_summary():
+    state = SessionState(session_id="s1", messages=MessageRing(4))
+    for i in range(50):
+        state.add_message("user", f"User scanned QR: QR:JP:JPY:{i}")
+        state.add_message("assistant", f"reply {i}")
+
+    assert len(state.messages) == 4
+    assert state.summary.scans == 48 and state.summary.replies == 48
+    assert list(state.summary.recent) == [f"User scanned QR: QR:JP:JPY:{i}" for i in (45, 46, 47)]
+
+    text = state.conversation_text().splitlines()
+    assert text[0].startswith("system: (Earlier in this session: 48 scan(s), 48 assistant replies.")
+    assert text[1:] == [
+        "user: User scanned QR: QR:JP:JPY:48", "assistant: reply 48",
+        "user: User scanned QR: QR:JP:JPY:49", "assistant: reply 49",
+    ]
+    assert state.history[0]["role"] == "system" and len(state.history) == 5
+
+
+def test_session_serialization_round_trip():
+    state = SessionState(session_id="s1", messages=MessageRing(2))
+    for i in range(3):
+        state.add_message("user", f"scan {i}")
+
+    loaded = session_from_dict(session_to_dict(state))
+
+    assert loaded.history == state.history
+    assert loaded.summary.scans == 1
+    assert isinstance(state.history, tuple)  # a snapshot: add_message() is how turns get in
+
+    state.clear_history()
+    assert state.history == () and state.conversation_text() == ""
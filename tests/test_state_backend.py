@@ -0,0 +1,165 @@
+# tests/test_state_backend.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.eval.resp_stub_server import RespStubServer
+from src.orchestration.memory_manager import SharedMemoryBank
+from src.orchestration.session_manager import SharedSessionService
+from src.persistence.state_backend import CachedBackend, SQLiteBackend, make_backend
+
+
+@pytest.fixture
+def resp_server():
+    server = RespStubServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backend(request, tmp_path, resp_server):
+    if request.param == "sqlite":
+        b = make_backend(f"sqlite:///{tmp_path / 'state.db'}", cache_ttl=0)
+    else:
+        b = make_backend(resp_server.url, cache_ttl=0)
+    yield b
+    b.close()
+
+
+def test_kv_and_hash_ops(backend):
+    backend.set("k", "v1")
+    assert backend.get("k") == "v1"
+    backend.set("k", "v2", ttl=0.05)
+    assert backend.get("k") == "v2"
+    time.sleep(0.1)
+    assert backend.get("k") is None
+
+    assert backend.hset("h", "a", "1") is True
+    assert backend.hset("h", "a", "2") is False
+    backend.hset("h", "b", "3")
+    assert backend.hget("h", "a") == "2"
+    assert backend.hgetall("h") == {"a": "2", "b": "3"}
+    assert backend.hlen("h") == 2
+    backend.hdel("h", "a")
+    assert backend.hget("h", "a") is None
+
+    backend.delete("h")
+    assert backend.hgetall("h") == {}
+
+
+def test_shared_session_round_trip(backend):
+    svc = SharedSessionService(backend, ttl_seconds=60)
+    state = svc.create_session()
+    state.add_message("user", "scan")
+    state.metadata["trip"] = "JP"
+    svc.update_session(state)
+
+    other_worker = SharedSessionService(backend, ttl_seconds=60)
+    loaded = other_worker.get_session(state.session_id)
+    assert loaded.history == ({"role": "user", "content": "scan"},)
+    assert loaded.metadata == {"trip": "JP"}
+    assert other_worker.get_session("missing") is None
+
+
+def test_shared_memory_bank_caps_per_user(backend):
+    clock = iter(range(1000))
+    bank = SharedMemoryBank(backend, max_merchants=2, clock=lambda: float(next(clock)))
+    bank.upsert_profile("u1", {"home_currency": "INR"})
+    bank.upsert_profile("u1", {"risk_preference": "low"})
+    assert bank.get_profile("u1") == {"home_currency": "INR", "risk_preference": "low"}
+
+    bank.add_recent_merchant("M1", "JP", user_id="u1")
+    bank.add_recent_merchant("M2", "JP", user_id="u1")
+    bank.add_recent_merchant("M1", "JP", user_id="u1")  # refresh M1
+    bank.add_recent_merchant("M3", "JP", user_id="u1")  # evicts M2
+
+    assert [m["merchant_id"] for m in bank.get_recent_merchants("u1")] == ["M3", "M1"]
+    assert bank.get_merchant_stats("M1", "u1")["count"] == 2
+    assert bank.has_recent_merchant("M2", "u1") is False
+    assert bank.has_recent_merchant("M1", "u2") is False
+
+
+def test_read_through_cache_between_workers(tmp_path):
+    path = str(tmp_path / "state.db")
+    worker_a = CachedBackend(SQLiteBackend(path), ttl=0.1)
+    worker_b = CachedBackend(SQLiteBackend(path), ttl=0.1)
+    bank_a, bank_b = SharedMemoryBank(worker_a), SharedMemoryBank(worker_b)
+
+    assert bank_b.has_recent_merchant("M1", "u1") is False  # cached miss
+    bank_a.add_recent_merchant("M1", "JP", user_id="u1")
+
+    assert bank_a.has_recent_merchant("M1", "u1") is True   # own write is visible at once
+    assert bank_b.has_recent_merchant("M1", "u1") is False  # stale until the TTL passes
+    time.sleep(0.15)
+    assert bank_b.has_recent_merchant("M1", "u1") is True
+    assert worker_b.stats()["cache_hits"] >= 1
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    from src.orchestration.session_manager import _SweeperMixin
+    from src.persistence.state_backend import StateBackend
+
+    class NoHashes(StateBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        NoHashes()
+    with pytest.raises(TypeError):
+        type("NoSweep", (_SweeperMixin,), {})()
+
+
+def test_cas_and_expire(backend):
+    assert backend.cas("k", None, "v1") is True
+    assert backend.cas("k", None, "v2") is False  # already present
+    assert backend.cas("k", "stale", "v2") is False
+    assert backend.cas("k", "v1", "v2") is True and backend.get("k") == "v2"
+
+    assert backend.hcas("h", "f", None, "1") is True
+    assert backend.hcas("h", "f", None, "2") is False
+    assert backend.hcas("h", "f", "1", "2") is True and backend.hget("h", "f") == "2"
+
+    backend.expire("h", 0.05)
+    time.sleep(0.1)
+    backend.purge_expired()  # SQLite applies hash expiry here; Redis on its own
+    assert backend.hgetall("h") == {}
+
+
+def test_concurrent_workers_do_not_lose_updates(backend):
+    worker_a, worker_b = SharedSessionService(backend), SharedSessionService(backend)
+    sid = worker_a.create_session().session_id
+    state_a, state_b = worker_a.get_session(sid), worker_b.get_session(sid)
+    state_a.add_message("user", "scan from A")
+    state_b.add_message("user", "scan from B")
+    state_b.metadata["trip"] = "JP"
+    worker_a.update_session(state_a)
+    worker_b.update_session(state_b)  # conflicts with A's save: merged, not overwritten
+
+    stored = worker_a.get_session(sid)
+    assert [m["content"] for m in stored.history] == ["scan from A", "scan from B"]
+    assert stored.metadata == {"trip": "JP"}
+    assert [m["content"] for m in state_b.history] == ["scan from A", "scan from B"]
+
+    banks = [SharedMemoryBank(backend) for _ in range(4)]
+
+    def work(i):
+        bank = banks[i % 4]
+        bank.upsert_profile("u1", {f"pref{i}": i})
+        bank.add_recent_merchant("M1", "JP", user_id="u1")
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(work, range(40)))
+
+    assert len(banks[0].get_profile("u1")) == 40
+    assert banks[0].get_merchant_stats("M1", "u1")["count"] == 40
+    assert banks[0].seed_profile("u1", {}) is False
+
+
+def test_merchant_history_expires(backend):
+    bank = SharedMemoryBank(backend, merchant_ttl=0.05)
+    bank.add_recent_merchant("M1", "JP", user_id="u1")
+    assert bank.has_recent_merchant("M1", "u1")
+    time.sleep(0.1)
+    backend.purge_expired()
+    assert bank.get_recent_merchants("u1") == []
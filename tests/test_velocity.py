@@ -0,0 +1,48 @@
+# tests/test_velocity.py
+
+from src.agents.risk_scorer import RiskScorer
+from src.orchestration.velocity_tracker import (
+    DistinctWindowCounter,
+    SlidingWindowCounter,
+    VelocityTracker,
+)
+
+
+def test_sliding_window_expires_old_buckets():
+    c = SlidingWindowCounter(window_seconds=60, buckets=60)
+    c.add(5, now=1000.0)
+    c.add(3, now=1030.0)
+
+    assert c.total(now=1030.0) == 8
+    assert c.total(now=1060.5) == 3   # first sample fell out
+    assert c.total(now=1200.0) == 0   # whole ring expired
+
+
+def test_distinct_window_counts_each_key_once():
+    d = DistinctWindowCounter(window_seconds=24, buckets=24)
+    d.add("M1", now=0.0)
+    d.add("M2", now=1.0)
+    d.add("M1", now=20.0)  # refresh keeps M1 alive
+
+    assert d.count(now=20.0) == 2
+    assert d.count(now=25.5) == 1     # M2 expired, M1 still inside
+    assert d.count(now=100.0) == 0
+
+
+def test_velocity_features_feed_risk_score():
+    tracker = VelocityTracker()
+    features = None
+    for i in range(12):
+        features = tracker.record("u1", f"M{i}", "USD", 100, now=5000.0 + i)
+
+    assert features["scans_per_minute"] == 12
+    assert features["spend_per_hour"] == 1200
+    assert features["distinct_merchants_per_day"] == 12
+
+    # other users are unaffected
+    assert tracker.record("u2", "M1", "JPY", 10, now=5011.0)["scans_per_minute"] == 1
+
+    res = RiskScorer().evaluate("M1", "JP", 100.0, velocity=features)
+    assert any("scan velocity" in r for r in res["reasons"])
+    assert any("spend in the last hour" in r for r in res["reasons"])
+    assert res["velocity"] == features